@@ -64,6 +64,7 @@ each command has a format:
 '''
 
 import itertools
+import json
 import os
 
 from _pydev_bundle.pydev_imports import _queue
@@ -170,6 +171,10 @@ CMD_GET_DESCRIPTION = 148
 CMD_PROCESS_CREATED = 149
 CMD_SHOW_CYTHON_WARNING = 150
 CMD_LOAD_FULL_VALUE = 151
+CMD_GET_THREAD_STACK = 152
+CMD_GET_VARIABLE_PAGE = 153
+CMD_GET_VARIABLE_BATCH = 154
+CMD_GET_TABLE_WINDOW = 155
 
 CMD_REDIRECT_OUTPUT = 200
 CMD_GET_NEXT_STATEMENT_TARGETS = 201
@@ -233,6 +238,10 @@ ID_TO_MEANING = {
     '149': 'CMD_PROCESS_CREATED',
     '150': 'CMD_SHOW_CYTHON_WARNING',
     '151': 'CMD_LOAD_FULL_VALUE',
+    '152': 'CMD_GET_THREAD_STACK',
+    '153': 'CMD_GET_VARIABLE_PAGE',
+    '154': 'CMD_GET_VARIABLE_BATCH',
+    '155': 'CMD_GET_TABLE_WINDOW',
 
     '200': 'CMD_REDIRECT_OUTPUT',
     '201': 'CMD_GET_NEXT_STATEMENT_TARGETS',
@@ -247,6 +256,10 @@ MAX_IO_MSG_SIZE = 1000  #if the io is too big, we'll not send all (could make th
 
 VERSION_STRING = "@@BUILD_NUMBER@@"
 
+# The formats for the payloads describing threads, frames and variables (negotiated with CMD_VERSION).
+PAYLOAD_XML = 'XML'
+PAYLOAD_JSON = 'JSON'  # plain dicts/lists (serialized as JSON only when written to a real socket)
+
 from _pydev_bundle._pydev_filesystem_encoding import getfilesystemencoding
 file_system_encoding = getfilesystemencoding()
 
@@ -354,6 +367,11 @@ class ReaderThread(PyDBDaemonThread):
 
     def _on_run(self):
         self._stop_trace()
+        recv_command = getattr(self.sock, 'recv_command', None)
+        if recv_command is not None:
+            # The socket hands over the commands directly (e.g. ptvsd's in-process one).
+            self._read_commands(recv_command)
+            return
         read_buffer = ""
         try:
 
@@ -398,6 +416,26 @@ class ReaderThread(PyDBDaemonThread):
             self.handle_except()
 
 
+    def _read_commands(self, recv_command):
+        try:
+            while not self.killReceived:
+                command = recv_command()
+                if command is None:
+                    self.handle_except()
+                    break
+                cmd_id, seq, text = command
+                try:
+                    pydev_log.debug('Received command: %s %s\n' % (ID_TO_MEANING.get(str(cmd_id), '???'), command,))
+                    self.process_command(cmd_id, seq, text)
+                except:
+                    traceback.print_exc()
+                    sys.stderr.write("Can't process net command: %s\n" % (command,))
+                    sys.stderr.flush()
+
+        except:
+            traceback.print_exc()
+            self.handle_except()
+
     def handle_except(self):
         self.global_debugger_holder.global_dbg.finish_debugging_session()
 
@@ -431,6 +469,7 @@ class WriterThread(PyDBDaemonThread):
 
         self._stop_trace()
         get_has_timeout = sys.hexversion >= 0x02030000 # 2.3 onwards have it.
+        send_command = getattr(self.sock, 'send_command', None)  # skips the line protocol
         try:
             while True:
                 try:
@@ -456,21 +495,32 @@ class WriterThread(PyDBDaemonThread):
                     #when liberating the thread here, we could have errors because we were shutting down
                     #but the thread was still not liberated
                     return
-                out = cmd.outgoing
-
-                if DebugInfoHolder.DEBUG_TRACE_LEVEL >= 1:
-                    out_message = 'sending cmd --> '
-                    out_message += "%20s" % ID_TO_MEANING.get(out[:3], 'UNKNOWN')
-                    out_message += ' '
-                    out_message += unquote(unquote(out)).replace('\n', ' ')
-                    try:
-                        sys.stderr.write('%s\n' % (out_message,))
-                    except:
-                        pass
-
-                if IS_PY3K:
-                    out = bytearray(out, 'utf-8')
-                self.sock.send(out) #TODO: this does not guarantee that all message are sent (and jython does not have a send all)
+                if send_command is not None:
+                    if DebugInfoHolder.DEBUG_TRACE_LEVEL >= 1:
+                        try:
+                            sys.stderr.write('sending cmd --> %20s %s\n' % (ID_TO_MEANING.get(str(cmd.id), 'UNKNOWN'), cmd.text))
+                        except:
+                            pass
+                    text = cmd.text
+                    if text.__class__ not in (dict, list):
+                        text = to_string(text)
+                    send_command(int(cmd.id), int(cmd.seq), text)
+                else:
+                    out = cmd.outgoing
+
+                    if DebugInfoHolder.DEBUG_TRACE_LEVEL >= 1:
+                        out_message = 'sending cmd --> '
+                        out_message += "%20s" % ID_TO_MEANING.get(out[:3], 'UNKNOWN')
+                        out_message += ' '
+                        out_message += unquote(unquote(out)).replace('\n', ' ')
+                        try:
+                            sys.stderr.write('%s\n' % (out_message,))
+                        except:
+                            pass
+
+                    if IS_PY3K:
+                        out = bytearray(out, 'utf-8')
+                    self.sock.send(out) #TODO: this does not guarantee that all message are sent (and jython does not have a send all)
                 if cmd.id == CMD_EXIT:
                     break
                 if time is None:
@@ -583,20 +633,39 @@ class NetCommand:
             seq = NetCommand.next_seq
         self.seq = seq
         self.text = text
+
+    def __getattr__(self, name):
+        # The quoted line is only built when actually written to a socket.
+        if name != 'outgoing':
+            raise AttributeError(name)
+        text = self.text
+        if text.__class__ in (dict, list):
+            text = json.dumps(text)
         encoded = quote(to_string(text), '/<>_=" \t')
-        self.outgoing = '%s\t%s\t%s\n' % (id, seq, encoded)
+        self.outgoing = '%s\t%s\t%s\n' % (self.id, self.seq, encoded)
+        return self.outgoing
 
 #=======================================================================================================================
 # NetCommandFactory
 #=======================================================================================================================
 class NetCommandFactory:
 
+    payload_format = PAYLOAD_XML
+    # How many frames go with a suspend message (None means all of them).
+    suspend_frames_limit = None
+    # The top frame's locals go with a suspend message if there are at most this many (None means never).
+    suspend_locals_limit = None
+
     def _thread_to_xml(self, thread):
         """ thread information as XML """
         name = pydevd_xml.make_valid_xml_value(thread.getName())
         cmdText = '<thread name="%s" id="%s" />' % (quote(name), get_thread_id(thread))
         return cmdText
 
+    def _thread_to_dict(self, thread):
+        """ thread information for PAYLOAD_JSON """
+        return {'name': thread.getName(), 'id': get_thread_id(thread)}
+
     def make_error_message(self, seq, text):
         cmd = NetCommand(CMD_ERROR, seq, text)
         if DebugInfoHolder.DEBUG_TRACE_LEVEL > 2:
@@ -604,6 +673,8 @@ class NetCommandFactory:
         return cmd
 
     def make_thread_created_message(self, thread):
+        if self.payload_format == PAYLOAD_JSON:
+            return NetCommand(CMD_THREAD_CREATE, 0, {'thread': [self._thread_to_dict(thread)]})
         cmdText = "<xml>" + self._thread_to_xml(thread) + "</xml>"
         return NetCommand(CMD_THREAD_CREATE, 0, cmdText)
 
@@ -627,6 +698,10 @@ class NetCommandFactory:
         """ returns thread listing as XML """
         try:
             threads = threading.enumerate()
+            if self.payload_format == PAYLOAD_JSON:
+                return NetCommand(CMD_RETURN, seq, {'thread': [
+                    self._thread_to_dict(thread) for thread in threads
+                    if is_thread_alive(thread) and not getattr(thread, 'is_pydev_daemon_thread', False)]})
             cmd_text = ["<xml>"]
             append = cmd_text.append
             for thread in threads:
@@ -652,6 +727,9 @@ class NetCommandFactory:
                 v = v[0:MAX_IO_MSG_SIZE]
                 v += '...'
 
+            if self.payload_format == PAYLOAD_JSON:
+                return NetCommand(str(CMD_WRITE_TO_CONSOLE), 0, {'io': {'s': v, 'ctx': str(ctx)}})
+
             v = pydevd_xml.make_valid_xml_value(quote(v, '/>_= \t'))
             return NetCommand(str(CMD_WRITE_TO_CONSOLE), 0, '<xml><io s="%s" ctx="%s"/></xml>' % (v, ctx))
         except:
@@ -659,6 +737,9 @@ class NetCommandFactory:
 
     def make_version_message(self, seq):
         try:
+            if self.payload_format != PAYLOAD_XML:
+                # Let the client know the payload format was accepted.
+                return NetCommand(CMD_VERSION, seq, '%s\t%s' % (VERSION_STRING, self.payload_format))
             return NetCommand(CMD_VERSION, seq, VERSION_STRING)
         except:
             return self.make_error_message(seq, get_exception_traceback_str())
@@ -669,13 +750,20 @@ class NetCommandFactory:
         except:
             return self.make_error_message(0, get_exception_traceback_str())
 
-    def make_thread_suspend_str(self, thread_id, frame, stop_reason, message, suspend_type="trace"):
+    def make_thread_suspend_str(self, thread_id, frame, stop_reason, message, suspend_type="trace", start=0, levels=None,
+                                locals_limit=None):
         """ <xml>
             <thread id="id" stop_reason="reason">
                     <frame id="id" name="functionName " file="file" line="line">
                     <var variable stuffff....
                 </frame>
             </thread>
+
+            If levels is given only that many frames (after skipping start) are
+            sent, and the thread gets a frame_count attribute with the total.
+
+            If locals_limit is given the locals of the frame are sent too (in a
+            <locals> element of the first frame), if there are no more than that.
         """
         cmd_text_list = ["<xml>"]
         append = cmd_text_list.append
@@ -684,11 +772,88 @@ class NetCommandFactory:
         if message:
             message = make_valid_xml_value(message)
 
-        append('<thread id="%s" stop_reason="%s" message="%s" suspend_type="%s">' % (thread_id, stop_reason, message, suspend_type))
+        append('<thread id="%s" stop_reason="%s" message="%s" suspend_type="%s"' % (thread_id, stop_reason, message, suspend_type))
+        if levels is not None:
+            append(' frame_count="%s"' % (self._count_frames(frame),))
+        append('>')
+
+        variables = self._get_suspended_locals(frame, locals_limit, pydevd_xml.frame_vars_to_xml)
+        if variables is not None:
+            variables = '<locals>%s</locals>' % (variables,)
+        for my_id, my_name, myFile, myLine in self._iter_suspended_frames(frame, start, levels):
+            #the variables of the other frames are all gotten 'on-demand'
+            append('<frame id="%s" name="%s" ' % (my_id , make_valid_xml_value(my_name)))
+            append('file="%s" line="%s">' % (quote(myFile, '/>_= \t'), myLine))
+            if variables is not None:
+                append(variables)
+                variables = None
+            append("</frame>")
+
+        append("</thread></xml>")
+        return ''.join(cmd_text_list)
+
+    def make_thread_suspend_payload(self, thread_id, frame, stop_reason, message, suspend_type="trace", start=0, levels=None,
+                                    locals_limit=None):
+        """ the PAYLOAD_JSON counterpart of make_thread_suspend_str (values are not quoted) """
+        frames = [{'id': my_id, 'name': my_name, 'file': myFile, 'line': int(myLine)}
+                  for my_id, my_name, myFile, myLine in self._iter_suspended_frames(frame, start, levels)]
+        variables = self._get_suspended_locals(frame, locals_limit, pydevd_xml.frame_vars_to_dicts)
+        if frames and variables is not None:
+            frames[0]['locals'] = variables
+        thread = {
+            'id': thread_id,
+            'stop_reason': stop_reason,
+            'message': message,
+            'suspend_type': suspend_type,
+            'frame': frames,
+        }
+        if levels is not None:
+            thread['frame_count'] = self._count_frames(frame)
+        return {'thread': thread}
+
+    def _get_suspended_locals(self, frame, locals_limit, frame_vars_to):
+        """ the locals of the frame (converted by frame_vars_to), or None if there are more than locals_limit """
+        if locals_limit is None or frame is None:
+            return None
+        try:
+            f_locals = frame.f_locals
+            if len(f_locals) > locals_limit:
+                return None
+            return frame_vars_to(f_locals, pydevconsole.get_ipython_hidden_vars())
+        except:
+            traceback.print_exc()
+            return None
+
+    def _count_frames(self, frame):
+        """ the number of frames _iter_suspended_frames would yield (without formatting them) """
+        count = 0
+        curr_frame = frame
+        while curr_frame:
+            if curr_frame.f_code is None or curr_frame.f_code.co_name is None:
+                break #Iron Python sometimes does not have it!
+            count += 1
+            curr_frame = curr_frame.f_back
+        return count
+
+    def _iter_suspended_frames(self, frame, start=0, levels=None):
+        """ yields (id, name, file, line) for the frame and the frames it was called from
 
+        The first start frames are skipped and at most levels frames (all if None) are yielded.
+        """
         curr_frame = frame
         try:
+            while curr_frame and start > 0:
+                if curr_frame.f_code is None or curr_frame.f_code.co_name is None:
+                    return #Iron Python sometimes does not have it!
+                start -= 1
+                curr_frame = curr_frame.f_back
+
             while curr_frame:
+                if levels is not None:
+                    if levels <= 0:
+                        break
+                    levels -= 1
+
                 #print cmdText
                 my_id = id(curr_frame)
                 #print "id is ", my_id
@@ -716,27 +881,37 @@ class NetCommandFactory:
                 myLine = str(curr_frame.f_lineno)
                 #print "line is ", myLine
 
-                #the variables are all gotten 'on-demand'
-                #variables = pydevd_xml.frame_vars_to_xml(curr_frame.f_locals)
-
-                variables = ''
-                append('<frame id="%s" name="%s" ' % (my_id , make_valid_xml_value(my_name)))
-                append('file="%s" line="%s">' % (quote(myFile, '/>_= \t'), myLine))
-                append(variables)
-                append("</frame>")
+                yield my_id, my_name, myFile, myLine
                 curr_frame = curr_frame.f_back
         except :
             traceback.print_exc()
 
-        append("</thread></xml>")
-        return ''.join(cmd_text_list)
-
     def make_thread_suspend_message(self, thread_id, frame, stop_reason, message, suspend_type):
+        # Only the top frames are sent (if negotiated), the rest is fetched with CMD_GET_THREAD_STACK.
+        # The locals of the top frame go with it too (if negotiated and there are not too many).
+        levels = self.suspend_frames_limit
+        locals_limit = self.suspend_locals_limit
         try:
-            return NetCommand(CMD_THREAD_SUSPEND, 0, self.make_thread_suspend_str(thread_id, frame, stop_reason, message, suspend_type))
+            if self.payload_format == PAYLOAD_JSON:
+                return NetCommand(CMD_THREAD_SUSPEND, 0, self.make_thread_suspend_payload(
+                    thread_id, frame, stop_reason, message, suspend_type, levels=levels, locals_limit=locals_limit))
+            return NetCommand(CMD_THREAD_SUSPEND, 0, self.make_thread_suspend_str(
+                thread_id, frame, stop_reason, message, suspend_type, levels=levels, locals_limit=locals_limit))
         except:
             return self.make_error_message(0, get_exception_traceback_str())
 
+    def make_get_thread_stack_message(self, seq, thread_id, frame, start, levels):
+        """ the frames [start:start + levels] of a suspended thread (levels=None means the rest) """
+        try:
+            if levels is None:
+                levels = self._count_frames(frame)
+            args = (thread_id, frame, CMD_GET_THREAD_STACK, '', 'trace', start, levels)
+            if self.payload_format == PAYLOAD_JSON:
+                return NetCommand(CMD_GET_THREAD_STACK, seq, self.make_thread_suspend_payload(*args))
+            return NetCommand(CMD_GET_THREAD_STACK, seq, self.make_thread_suspend_str(*args))
+        except:
+            return self.make_error_message(seq, get_exception_traceback_str())
+
     def make_thread_run_message(self, id, reason):
         try:
             return NetCommand(CMD_THREAD_RUN, 0, str(id) + "\t" + str(reason))
@@ -750,6 +925,18 @@ class NetCommandFactory:
             return self.make_error_message(seq, get_exception_traceback_str())
 
 
+    def make_get_variable_batch_message(self, seq, payload):
+        try:
+            return NetCommand(CMD_GET_VARIABLE_BATCH, seq, payload)
+        except Exception:
+            return self.make_error_message(seq, get_exception_traceback_str())
+
+    def make_get_table_window_message(self, seq, payload):
+        try:
+            return NetCommand(CMD_GET_TABLE_WINDOW, seq, payload)
+        except Exception:
+            return self.make_error_message(seq, get_exception_traceback_str())
+
     def make_get_array_message(self, seq, payload):
         try:
             return NetCommand(CMD_GET_ARRAY, seq, payload)
@@ -893,6 +1080,9 @@ class InternalThreadCommand:
     get posted to PyDB.cmdQueue.
     """
 
+    # The format for the values the command produces, if it was given one (see pydevd_xml.get_value_format).
+    value_format = None
+
     def can_be_executed_by(self, thread_id):
         '''By default, it must be in the same thread to be executed
         '''
@@ -1019,35 +1209,60 @@ class InternalSetNextStatementThread(InternalThreadCommand):
             t.additional_info.pydev_message = str(self.seq)
 
 
+def _get_variable_items(type_name, val_dict):
+    ''' the (name, value) pairs of the resolved children of a variable, in the order they are shown '''
+    if val_dict.__class__ == list:
+        # A page of items (already in order).
+        return val_dict
+    # assume properly ordered if resolver returns 'OrderedDict'
+    # check type as string to support OrderedDict backport for older Python
+    keys = dict_keys(val_dict)
+    if not (type_name == "OrderedDict" or val_dict.__class__.__name__ == "OrderedDict" or IS_PY36_OR_GREATER):
+        keys.sort(key=compare_object_attrs_key)
+    return [(k, val_dict[k]) for k in keys]
+
+
 #=======================================================================================================================
 # InternalGetVariable
 #=======================================================================================================================
 class InternalGetVariable(InternalThreadCommand):
     """ gets the value of a variable """
-    def __init__(self, seq, thread_id, frame_id, scope, attrs):
+    def __init__(self, seq, thread_id, frame_id, scope, attrs, filter=None, start=0, count=None):
         self.sequence = seq
         self.thread_id = thread_id
         self.frame_id = frame_id
         self.scope = scope
         self.attributes = attrs
+        # Only used for CMD_GET_VARIABLE_PAGE (see pydevd_vars.resolve_compound_variable_page).
+        self.filter = filter
+        self.start = start
+        self.count = count
 
     def do_it(self, dbg):
         """ Converts request into python variable """
         try:
-            xml = StringIO.StringIO()
-            xml.write("<xml>")
-            _typeName, val_dict = pydevd_vars.resolve_compound_variable_fields(self.thread_id, self.frame_id, self.scope, self.attributes)
+            if self.filter is None:
+                _typeName, val_dict = pydevd_vars.resolve_compound_variable_fields(self.thread_id, self.frame_id, self.scope, self.attributes)
+            else:
+                _typeName, val_dict = pydevd_vars.resolve_compound_variable_page(
+                    self.thread_id, self.frame_id, self.scope, self.attributes, self.filter, self.start, self.count)
             if val_dict is None:
                 val_dict = {}
 
-            # assume properly ordered if resolver returns 'OrderedDict'
-            # check type as string to support OrderedDict backport for older Python
-            keys = dict_keys(val_dict)
-            if not (_typeName == "OrderedDict" or val_dict.__class__.__name__ == "OrderedDict" or IS_PY36_OR_GREATER):
-                keys.sort(key=compare_object_attrs_key)
+            items = _get_variable_items(_typeName, val_dict)
+
+            if dbg.cmd_factory.payload_format == PAYLOAD_JSON:
+                variables = []
+                for k, val in items:
+                    evaluate_full_value = pydevd_xml.should_evaluate_full_value(val)
+                    variables.append(pydevd_xml.var_to_dict(val, k, evaluate_full_value=evaluate_full_value))
+                cmd = dbg.cmd_factory.make_get_variable_message(self.sequence, {'var': variables})
+                dbg.writer.add_command(cmd)
+                return
 
-            for k in keys:
-                val = val_dict[k]
+            xml = StringIO.StringIO()
+            xml.write("<xml>")
+            for k, val in items:
                 evaluate_full_value = pydevd_xml.should_evaluate_full_value(val)
                 xml.write(pydevd_xml.var_to_xml(val, k, evaluate_full_value=evaluate_full_value))
 
@@ -1061,6 +1276,80 @@ class InternalGetVariable(InternalThreadCommand):
             dbg.writer.add_command(cmd)
 
 
+#=======================================================================================================================
+# InternalGetVariableBatch
+#=======================================================================================================================
+class InternalGetVariableBatch(InternalThreadCommand):
+    """ gets several variables and expression values of a frame at once
+
+    Each item is either {"var": [scope, attr, ...]} (the children, as with CMD_GET_FRAME when there are no
+    attributes and CMD_GET_VARIABLE otherwise) or {"evaluate": expression} (as with CMD_EVALUATE_EXPRESSION).
+    There is one result per item: {"var": [...]} or {"error": message} when that item failed.
+    """
+    def __init__(self, seq, thread_id, frame_id, items):
+        self.sequence = seq
+        self.thread_id = thread_id
+        self.frame_id = frame_id
+        self.items = items
+
+    def _get_item(self, item, to_dict):
+        if 'evaluate' in item:
+            expression = item['evaluate']
+            result = pydevd_vars.evaluate_expression(self.thread_id, self.frame_id, expression, False)
+            return [to_dict(result, expression, True)]
+
+        path = item['var']
+        scope, attrs = path[0], '\t'.join(path[1:])
+        if scope == 'FRAME' and not attrs:
+            frame = pydevd_vars.find_frame(self.thread_id, self.frame_id)
+            if frame is None:
+                raise ValueError("Frame not found: %s from thread: %s" % (self.frame_id, self.thread_id))
+            try:
+                hidden_ns = pydevconsole.get_ipython_hidden_vars()
+                if to_dict is pydevd_xml.var_to_dict:
+                    return pydevd_xml.frame_vars_to_dicts(frame.f_locals, hidden_ns)
+                return [pydevd_xml.frame_vars_to_xml(frame.f_locals, hidden_ns)]
+            finally:
+                del frame
+
+        type_name, val_dict = pydevd_vars.resolve_compound_variable_fields(self.thread_id, self.frame_id, scope, attrs)
+        variables = []
+        for k, val in _get_variable_items(type_name, val_dict or {}):
+            evaluate_full_value = pydevd_xml.should_evaluate_full_value(val)
+            variables.append(to_dict(val, k, evaluate_full_value=evaluate_full_value))
+        return variables
+
+    def do_it(self, dbg):
+        try:
+            is_json = dbg.cmd_factory.payload_format == PAYLOAD_JSON
+            to_dict = pydevd_xml.var_to_dict if is_json else pydevd_xml.var_to_xml
+            results = []
+            for item in self.items:
+                try:
+                    results.append({'var': self._get_item(item, to_dict)})
+                except Exception:
+                    results.append({'error': get_exception_traceback_str()})
+
+            if is_json:
+                cmd = dbg.cmd_factory.make_get_variable_batch_message(self.sequence, {'result': results})
+            else:
+                xml = StringIO.StringIO()
+                xml.write("<xml>")
+                for result in results:
+                    if 'error' in result:
+                        xml.write('<result error="%s" />' % (pydevd_xml.make_valid_xml_value(quote(result['error'], '/>_= \t')),))
+                    else:
+                        xml.write("<result>%s</result>" % ("".join(result['var']),))
+                xml.write("</xml>")
+                cmd = dbg.cmd_factory.make_get_variable_batch_message(self.sequence, xml.getvalue())
+                xml.close()
+            dbg.writer.add_command(cmd)
+        except Exception:
+            cmd = dbg.cmd_factory.make_error_message(
+                self.sequence, "Error resolving variables %s" % (get_exception_traceback_str(),))
+            dbg.writer.add_command(cmd)
+
+
 #=======================================================================================================================
 # InternalGetArray
 #=======================================================================================================================
@@ -1082,13 +1371,58 @@ class InternalGetArray(InternalThreadCommand):
         try:
             frame = pydevd_vars.find_frame(self.thread_id, self.frame_id)
             var = pydevd_vars.eval_in_context(self.name, frame.f_globals, frame.f_locals)
-            xml = pydevd_vars.table_like_struct_to_xml(var, self.name, self.roffset, self.coffset, self.rows, self.cols, self.format )
+            base64_cells = bool((self.value_format or {}).get('base64'))
+            xml = pydevd_vars.table_like_struct_to_xml(var, self.name, self.roffset, self.coffset, self.rows, self.cols, self.format,
+                                                       base64_cells)
             cmd = dbg.cmd_factory.make_get_array_message(self.sequence, xml)
             dbg.writer.add_command(cmd)
         except:
             cmd = dbg.cmd_factory.make_error_message(self.sequence, "Error resolving array: " + get_exception_traceback_str())
             dbg.writer.add_command(cmd)
 
+#=======================================================================================================================
+# InternalGetTableWindow
+#=======================================================================================================================
+class InternalGetTableWindow(InternalThreadCommand):
+    """ gets some rows and columns of a DataFrame, Series or ndarray (see pydevd_vars.table_window)
+
+    The args are {"expression": ..., "startRow": ..., "rowCount": ..., "startColumn": ..., "columnCount": ...,
+    "stats": ..., "floatFormat": ...} (only the expression is required).  The reply is JSON whatever the payload format.
+    """
+    def __init__(self, seq, thread_id, frame_id, args):
+        self.sequence = seq
+        self.thread_id = thread_id
+        self.frame_id = frame_id
+        self.args = args
+
+    def do_it(self, dbg):
+        try:
+            args = self.args
+            frame = pydevd_vars.find_frame(self.thread_id, self.frame_id)
+            if frame is None:
+                raise ValueError("Frame not found: %s from thread: %s" % (self.frame_id, self.thread_id))
+            try:
+                table = pydevd_vars.eval_in_context(args['expression'], frame.f_globals, frame.f_locals)
+            finally:
+                del frame
+            if isinstance(table, pydevd_xml.ExceptionOnEvaluate):
+                error = table.result
+                if isinstance(error, BaseException):
+                    error = '%s: %s' % (error.__class__.__name__, error)
+                raise ValueError('Error evaluating %s: %s' % (args['expression'], error))
+            window = pydevd_vars.table_window(
+                table,
+                int(args.get('startRow', 0)), int(args.get('rowCount', pydevd_vars.MAX_SLICE_SIZE)),
+                int(args.get('startColumn', 0)), int(args.get('columnCount', pydevd_vars.MAXIMUM_ARRAY_SIZE)),
+                stats=bool(args.get('stats')),
+                float_format=args.get('floatFormat'),
+                hex_ints=bool((self.value_format or {}).get('hex')))
+            cmd = dbg.cmd_factory.make_get_table_window_message(self.sequence, window)
+            dbg.writer.add_command(cmd)
+        except Exception:
+            cmd = dbg.cmd_factory.make_error_message(self.sequence, "Error getting table window: " + get_exception_traceback_str())
+            dbg.writer.add_command(cmd)
+
 #=======================================================================================================================
 # InternalChangeVariable
 #=======================================================================================================================
@@ -1132,6 +1466,12 @@ class InternalGetFrame(InternalThreadCommand):
             frame = pydevd_vars.find_frame(self.thread_id, self.frame_id)
             if frame is not None:
                 hidden_ns = pydevconsole.get_ipython_hidden_vars()
+                if dbg.cmd_factory.payload_format == PAYLOAD_JSON:
+                    variables = pydevd_xml.frame_vars_to_dicts(frame.f_locals, hidden_ns)
+                    del frame
+                    cmd = dbg.cmd_factory.make_get_frame_message(self.sequence, {'var': variables})
+                    dbg.writer.add_command(cmd)
+                    return
                 xml = "<xml>"
                 xml += pydevd_xml.frame_vars_to_xml(frame.f_locals, hidden_ns)
                 del frame
@@ -1147,6 +1487,31 @@ class InternalGetFrame(InternalThreadCommand):
             cmd = dbg.cmd_factory.make_error_message(self.sequence, "Error resolving frame: %s from thread: %s" % (self.frame_id, self.thread_id))
             dbg.writer.add_command(cmd)
 
+#=======================================================================================================================
+# InternalGetThreadStack
+#=======================================================================================================================
+class InternalGetThreadStack(InternalThreadCommand):
+    """ gets a range of the frames of a suspended thread """
+    def __init__(self, seq, thread_id, frame_id, start, levels):
+        self.sequence = seq
+        self.thread_id = thread_id
+        self.frame_id = frame_id  # the top frame (as sent with the suspend message)
+        self.start = start
+        self.levels = levels
+
+    def do_it(self, dbg):
+        try:
+            frame = pydevd_vars.find_frame(self.thread_id, self.frame_id)
+            if frame is not None:
+                cmd = dbg.cmd_factory.make_get_thread_stack_message(self.sequence, self.thread_id, frame, self.start, self.levels)
+                del frame
+            else:
+                cmd = dbg.cmd_factory.make_error_message(self.sequence, "Frame not found: %s from thread: %s" % (self.frame_id, self.thread_id))
+            dbg.writer.add_command(cmd)
+        except:
+            cmd = dbg.cmd_factory.make_error_message(self.sequence, "Error getting stack of thread: %s" % (self.thread_id,))
+            dbg.writer.add_command(cmd)
+
 #=======================================================================================================================
 # InternalGetNextStatementTargets
 #=======================================================================================================================
@@ -1208,6 +1573,11 @@ class InternalEvaluateExpression(InternalThreadCommand):
             result = pydevd_vars.evaluate_expression(self.thread_id, self.frame_id, self.expression, self.doExec)
             if self.temp_name != "":
                 pydevd_vars.change_attr_expression(self.thread_id, self.frame_id, self.temp_name, self.expression, dbg, result)
+            if dbg.cmd_factory.payload_format == PAYLOAD_JSON:
+                variables = [pydevd_xml.var_to_dict(result, self.expression, self.doTrim)]
+                cmd = dbg.cmd_factory.make_evaluate_expression_message(self.sequence, {'var': variables})
+                dbg.writer.add_command(cmd)
+                return
             xml = "<xml>"
             xml += pydevd_xml.var_to_xml(result, self.expression, self.doTrim)
             xml += "</xml>"
@@ -1528,7 +1898,7 @@ class InternalLoadFullValue(InternalThreadCommand):
                 if len(variable) > 0:
                     if '\t' in variable:  # there are attributes beyond scope
                         scope, attrs = variable.split('\t', 1)
-                        name = attrs[0]
+                        name = attrs.split('\t')[-1]
                     else:
                         scope, attrs = (variable, None)
                         name = scope
@@ -1554,12 +1924,15 @@ class AbstractGetValueAsyncThread(PyDBDaemonThread):
         self.seq = seq
         self.var_objs = var_objects
         self.cancel_event = threading.Event()
+        # The values are in the format of the command that started the thread.
+        self.value_format = pydevd_xml.get_value_format()
 
     def send_result(self, xml):
         raise NotImplementedError()
 
     def _on_run(self):
         start = time.time()
+        pydevd_xml.set_value_format(self.value_format)
         xml = StringIO.StringIO()
         xml.write("<xml>")
         for (var_obj, name) in self.var_objs:
@@ -112,6 +112,11 @@ IS_PYCHARM = False
 LOAD_VALUES_ASYNC = os.getenv('PYDEVD_LOAD_VALUES_ASYNC', 'False') == 'True'
 DEFAULT_VALUE = "__pydevd_value_async"
 ASYNC_EVAL_TIMEOUT_SEC = 60
+# The values of a frame's variables are only computed for this long when they are sent (see
+# pydevd_xml.frame_vars_to_xml), after which the rest are sent as DEFAULT_VALUE, to be loaded later (CMD_LOAD_FULL_VALUE).
+FRAME_VARS_TIME_BUDGET_SEC = 0.5
+# The values of (non-builtin) types whose values took longer than this are sent as DEFAULT_VALUE from then on.
+VALUE_TIME_BUDGET_SEC = 0.1
 NEXT_VALUE_SEPARATOR = "__pydev_val__"
 BUILTINS_MODULE_NAME = '__builtin__' if IS_PY2 else 'builtins'
 SHOW_DEBUG_INFO_ENV = os.getenv('PYCHARM_DEBUG') == 'True' or os.getenv('PYDEV_DEBUG') == 'True'
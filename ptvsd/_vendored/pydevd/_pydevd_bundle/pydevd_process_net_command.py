@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import traceback
@@ -19,11 +20,26 @@ from _pydevd_bundle.pydevd_comm import CMD_RUN, CMD_VERSION, CMD_LIST_THREADS, C
     CMD_EVALUATE_CONSOLE_EXPRESSION, InternalEvaluateConsoleExpression, InternalConsoleGetCompletions, \
     CMD_RUN_CUSTOM_OPERATION, InternalRunCustomOperation, CMD_IGNORE_THROWN_EXCEPTION_AT, CMD_ENABLE_DONT_TRACE, \
     CMD_SHOW_RETURN_VALUES, ID_TO_MEANING, CMD_GET_DESCRIPTION, InternalGetDescription, InternalLoadFullValue, \
-    CMD_LOAD_FULL_VALUE, CMD_REDIRECT_OUTPUT, CMD_GET_NEXT_STATEMENT_TARGETS, InternalGetNextStatementTargets, CMD_SET_PROJECT_ROOTS
+    CMD_LOAD_FULL_VALUE, CMD_REDIRECT_OUTPUT, CMD_GET_NEXT_STATEMENT_TARGETS, InternalGetNextStatementTargets, CMD_SET_PROJECT_ROOTS, \
+    PAYLOAD_XML, PAYLOAD_JSON, CMD_GET_THREAD_STACK, InternalGetThreadStack, CMD_GET_VARIABLE_PAGE, \
+    CMD_GET_VARIABLE_BATCH, InternalGetVariableBatch, CMD_GET_TABLE_WINDOW, InternalGetTableWindow
 from _pydevd_bundle.pydevd_constants import get_thread_id, IS_PY3K, DebugInfoHolder, dict_keys, STATE_RUN, \
     NEXT_VALUE_SEPARATOR
 from _pydevd_bundle.pydevd_additional_thread_info import set_additional_thread_info
 
+def _split_value_format(text):
+    '''
+    Commands that produce values may start with the format for them (a JSON object, e.g. {"hex": true}), which
+    is given to the internal command (see pydevd_xml.get_value_format).
+
+    @return: the format (or None) and the rest of the text
+    '''
+    if text.startswith('{'):
+        value_format, text = text.split('\t', 1)
+        return json.loads(value_format), text
+    return None, text
+
+
 def process_net_command(py_db, cmd_id, seq, text):
     '''Processes a command received from the Java side
 
@@ -56,6 +72,15 @@ def process_net_command(py_db, cmd_id, seq, text):
                 # Breakpoints can be grouped by 'LINE' or by 'ID'.
                 breakpoints_by = 'LINE'
 
+                # Threads, frames and variables can be sent as 'XML' or 'JSON'.
+                payload_format = PAYLOAD_XML
+
+                # Only this many frames are sent on suspend (the rest via CMD_GET_THREAD_STACK).
+                suspend_frames_limit = ''
+
+                # The top frame's locals are sent on suspend if there are at most this many (never if empty).
+                suspend_locals_limit = ''
+
                 splitted = text.split('\t')
                 if len(splitted) == 1:
                     _local_version = splitted
@@ -66,11 +91,28 @@ def process_net_command(py_db, cmd_id, seq, text):
                 elif len(splitted) == 3:
                     _local_version, ide_os, breakpoints_by = splitted
 
+                elif len(splitted) == 4:
+                    _local_version, ide_os, breakpoints_by, payload_format = splitted
+
+                elif len(splitted) == 5:
+                    _local_version, ide_os, breakpoints_by, payload_format, suspend_frames_limit = splitted
+
+                elif len(splitted) == 6:
+                    _local_version, ide_os, breakpoints_by, payload_format, suspend_frames_limit, suspend_locals_limit = splitted
+
                 if breakpoints_by == 'ID':
                     py_db._set_breakpoints_with_id = True
                 else:
                     py_db._set_breakpoints_with_id = False
 
+                if payload_format == PAYLOAD_JSON:
+                    py_db.cmd_factory.payload_format = PAYLOAD_JSON
+                else:
+                    py_db.cmd_factory.payload_format = PAYLOAD_XML
+
+                py_db.cmd_factory.suspend_frames_limit = int(suspend_frames_limit) if suspend_frames_limit else None
+                py_db.cmd_factory.suspend_locals_limit = int(suspend_locals_limit) if suspend_locals_limit else None
+
                 pydevd_file_utils.set_ide_os(ide_os)
 
                 cmd = py_db.cmd_factory.make_version_message(seq)
@@ -169,6 +211,7 @@ def process_net_command(py_db, cmd_id, seq, text):
                 # we received some command to get a variable
                 # the text is: thread_id\tframe_id\tFRAME|GLOBAL\tattributes*
                 try:
+                    value_format, text = _split_value_format(text)
                     thread_id, frame_id, scopeattrs = text.split('\t', 2)
 
                     if scopeattrs.find('\t') != -1:  # there are attributes beyond scope
@@ -177,6 +220,37 @@ def process_net_command(py_db, cmd_id, seq, text):
                         scope, attrs = (scopeattrs, None)
 
                     int_cmd = InternalGetVariable(seq, thread_id, frame_id, scope, attrs)
+                    int_cmd.value_format = value_format
+                    py_db.post_internal_command(int_cmd, thread_id)
+
+                except:
+                    traceback.print_exc()
+
+            elif cmd_id == CMD_GET_VARIABLE_PAGE:
+                # like CMD_GET_VARIABLE, but only some of the children
+                # the text is: thread_id\tframe_id\tFRAME|GLOBAL\tindexed|named\tstart\tcount\tattributes*
+                # (an empty count means all of them)
+                try:
+                    value_format, text = _split_value_format(text)
+                    thread_id, frame_id, scope, filter, start, count, attrs = text.split('\t', 6)
+                    count = int(count) if count else None
+
+                    int_cmd = InternalGetVariable(seq, thread_id, frame_id, scope, attrs or None, filter, int(start), count)
+                    int_cmd.value_format = value_format
+                    py_db.post_internal_command(int_cmd, thread_id)
+
+                except:
+                    traceback.print_exc()
+
+            elif cmd_id == CMD_GET_VARIABLE_BATCH:
+                # several variables and expressions of a frame in one go
+                # the text is: thread_id\tframe_id\titems (a JSON list, see InternalGetVariableBatch)
+                try:
+                    value_format, text = _split_value_format(text)
+                    thread_id, frame_id, items = text.split('\t', 2)
+
+                    int_cmd = InternalGetVariableBatch(seq, thread_id, frame_id, json.loads(items))
+                    int_cmd.value_format = value_format
                     py_db.post_internal_command(int_cmd, thread_id)
 
                 except:
@@ -185,7 +259,9 @@ def process_net_command(py_db, cmd_id, seq, text):
             elif cmd_id == CMD_GET_ARRAY:
                 # we received some command to get an array variable
                 # the text is: thread_id\tframe_id\tFRAME|GLOBAL\tname\ttemp\troffs\tcoffs\trows\tcols\tformat
+                # (a value format of {"base64": true} asks for numeric cells as one base64 block)
                 try:
+                    value_format, text = _split_value_format(text)
                     roffset, coffset, rows, cols, format, thread_id, frame_id, scopeattrs  = text.split('\t', 7)
 
                     if scopeattrs.find('\t') != -1:  # there are attributes beyond scope
@@ -194,6 +270,21 @@ def process_net_command(py_db, cmd_id, seq, text):
                         scope, attrs = (scopeattrs, None)
 
                     int_cmd = InternalGetArray(seq, roffset, coffset, rows, cols, format, thread_id, frame_id, scope, attrs)
+                    int_cmd.value_format = value_format
+                    py_db.post_internal_command(int_cmd, thread_id)
+
+                except:
+                    traceback.print_exc()
+
+            elif cmd_id == CMD_GET_TABLE_WINDOW:
+                # some rows and columns of a DataFrame, Series or ndarray
+                # the text is: thread_id\tframe_id\targs (a JSON object, see InternalGetTableWindow)
+                try:
+                    value_format, text = _split_value_format(text)
+                    thread_id, frame_id, args = text.split('\t', 2)
+
+                    int_cmd = InternalGetTableWindow(seq, thread_id, frame_id, json.loads(args))
+                    int_cmd.value_format = value_format
                     py_db.post_internal_command(int_cmd, thread_id)
 
                 except:
@@ -215,10 +306,12 @@ def process_net_command(py_db, cmd_id, seq, text):
 
             elif cmd_id == CMD_LOAD_FULL_VALUE:
                 try:
+                    value_format, text = _split_value_format(text)
                     thread_id, frame_id, scopeattrs = text.split('\t', 2)
                     vars = scopeattrs.split(NEXT_VALUE_SEPARATOR)
 
                     int_cmd = InternalLoadFullValue(seq, thread_id, frame_id, vars)
+                    int_cmd.value_format = value_format
                     py_db.post_internal_command(int_cmd, thread_id)
                 except:
                     traceback.print_exc()
@@ -244,9 +337,18 @@ def process_net_command(py_db, cmd_id, seq, text):
                     traceback.print_exc()
 
             elif cmd_id == CMD_GET_FRAME:
+                value_format, text = _split_value_format(text)
                 thread_id, frame_id, scope = text.split('\t', 2)
 
                 int_cmd = InternalGetFrame(seq, thread_id, frame_id)
+                int_cmd.value_format = value_format
+                py_db.post_internal_command(int_cmd, thread_id)
+
+            elif cmd_id == CMD_GET_THREAD_STACK:
+                thread_id, frame_id, start, levels = text.split('\t', 3)
+                levels = int(levels) if levels else None
+
+                int_cmd = InternalGetThreadStack(seq, thread_id, frame_id, int(start), levels)
                 py_db.post_internal_command(int_cmd, thread_id)
 
             elif cmd_id == CMD_SET_BREAK:
@@ -394,12 +496,14 @@ def process_net_command(py_db, cmd_id, seq, text):
                 #command to evaluate the given expression
                 #text is: thread\tstackframe\tLOCAL\texpression
                 temp_name = ""
+                value_format, text = _split_value_format(text)
                 try:
                     thread_id, frame_id, scope, expression, trim, temp_name = text.split('\t', 5)
                 except ValueError:
                     thread_id, frame_id, scope, expression, trim = text.split('\t', 4)
                 int_cmd = InternalEvaluateExpression(seq, thread_id, frame_id, expression,
                     cmd_id == CMD_EXEC_EXPRESSION, int(trim) == 1, temp_name)
+                int_cmd.value_format = value_format
                 py_db.post_internal_command(int_cmd, thread_id)
 
             elif cmd_id == CMD_CONSOLE_EXEC:
@@ -3,6 +3,7 @@ try:
 except:
     import io as StringIO
 import traceback
+from itertools import islice
 from os.path import basename
 
 from _pydevd_bundle import pydevd_constants
@@ -56,9 +57,21 @@ except:
 
 #=======================================================================================================================
 # See: pydevd_extension_api module for resolver interface
+#
+# Resolvers for containers with many items may also provide (to page through them without enumerating all of them):
+#     get_indexed_count(var) -> the number of items
+#     get_indexed_range(var, start, count) -> [(name, item)] for the items [start:start + count] (count=None for all)
+#     get_named_dictionary(var) -> the other children (what get_dictionary() returns besides the items)
 #=======================================================================================================================
 
 
+def _islice_range(var, start, count):
+    stop = None if count is None else start + count
+    if var.__class__ in (list, tuple):
+        return var[start:stop]
+    return islice(var, start, stop)
+
+
 #=======================================================================================================================
 # DefaultResolver
 #=======================================================================================================================
@@ -242,6 +255,19 @@ class DictResolver:
         ret.update(additional_fields)
         return ret
 
+    def get_indexed_count(self, dict):
+        return len(dict)
+
+    def get_indexed_range(self, dict, start, count):
+        stop = None if count is None else start + count
+        return [('%s (%s)' % (self.key_to_str(key), id(key)), val)
+                for key, val in islice(dict_iter_items(dict), start, stop)]
+
+    def get_named_dictionary(self, dict):
+        ret = {'__len__': len(dict)}
+        ret.update(defaultResolver.get_dictionary(dict))
+        return ret
+
 
 #=======================================================================================================================
 # TupleResolver
@@ -281,6 +307,18 @@ class TupleResolver: #to enumerate tuples and lists
         d.update(additional_fields)
         return d
 
+    def get_indexed_count(self, var):
+        return len(var)
+
+    def get_indexed_range(self, var, start, count):
+        format_str = '%0' + str(int(len(str(len(var))))) + 'd'
+        return [(format_str % i, item) for i, item in enumerate(_islice_range(var, start, count), start)]
+
+    def get_named_dictionary(self, var):
+        d = {'__len__': len(var)}
+        d.update(defaultResolver.get_dictionary(var))
+        return d
+
 
 
 #=======================================================================================================================
@@ -324,6 +362,17 @@ class SetResolver:
         d.update(additional_fields)
         return d
 
+    def get_indexed_count(self, var):
+        return len(var)
+
+    def get_indexed_range(self, var, start, count):
+        return [(str(id(item)), item) for item in _islice_range(var, start, count)]
+
+    def get_named_dictionary(self, var):
+        d = {'__len__': len(var)}
+        d.update(defaultResolver.get_dictionary(var))
+        return d
+
 
 #=======================================================================================================================
 # InstanceResolver
@@ -433,6 +482,11 @@ class DequeResolver(TupleResolver):
         d['maxlen'] = getattr(var, 'maxlen', None)
         return d
 
+    def get_named_dictionary(self, var):
+        d = TupleResolver.get_named_dictionary(self, var)
+        d['maxlen'] = getattr(var, 'maxlen', None)
+        return d
+
 
 #=======================================================================================================================
 # OrderedDictResolver
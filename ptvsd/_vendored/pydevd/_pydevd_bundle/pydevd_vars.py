@@ -1,7 +1,9 @@
 """ pydevd_vars deals with variables:
     resolution/conversion to XML.
 """
+import base64
 import pickle
+from collections import OrderedDict
 from _pydevd_bundle.pydevd_constants import get_frame, get_thread_id, xrange
 
 from _pydevd_bundle.pydevd_custom_frames import get_custom_frame
@@ -22,6 +24,11 @@ from _pydevd_bundle.pydevd_utils import to_string
 
 SENTINEL_VALUE = []
 
+# The code compiled for the most recently evaluated expressions is reused (up to this many of them).
+COMPILED_EXPRESSIONS_CACHE_SIZE = 256
+_compiled_expressions = OrderedDict()  # (expression, mode) -> code, least recently used first
+_compiled_expressions_lock = threading.Lock()
+
 # ------------------------------------------------------------------------------------------------------ class for errors
 
 class VariableError(RuntimeError): pass
@@ -252,6 +259,32 @@ def resolve_compound_variable_fields(thread_id, frame_id, scope, attrs):
         traceback.print_exc()
 
 
+def resolve_compound_variable_page(thread_id, frame_id, scope, attrs, filter, start, count):
+    """
+    Like resolve_compound_variable_fields, but only for some of the fields
+
+    :param filter: 'indexed' for the items of a container (those in [start:start + count], count=None for all)
+            or 'named' for its other fields (any other value means all fields)
+    :return: the type name and either a list of (name, value) for the items or a dictionary of the fields
+    """
+
+    var = getVariable(thread_id, frame_id, scope, attrs)
+
+    try:
+        _type, _typeName, resolver = get_type(var)
+        if filter == 'indexed':
+            if not hasattr(resolver, 'get_indexed_range'):
+                return _typeName, []
+            return _typeName, resolver.get_indexed_range(var, start, count)
+        if filter == 'named' and hasattr(resolver, 'get_named_dictionary'):
+            return _typeName, resolver.get_named_dictionary(var)
+        return _typeName, resolver.get_dictionary(var)
+    except:
+        sys.stderr.write('Error evaluating: thread_id: %s\nframe_id: %s\nscope: %s\nattrs: %s\n' % (
+            thread_id, frame_id, scope, attrs,))
+        traceback.print_exc()
+
+
 def resolve_var_object(var, attrs):
     """
     Resolve variable's attribute
@@ -314,10 +347,32 @@ def custom_operation(thread_id, frame_id, scope, attrs, style, code_or_file, ope
         traceback.print_exc()
 
 
+def compile_expression(expression, mode='eval'):
+    '''
+    Same as compile(expression, '<string>', mode), but the code objects are reused (hovering or expanding
+    variables evaluates the same expressions over and over).
+    '''
+    key = (expression, mode)
+    with _compiled_expressions_lock:
+        code = _compiled_expressions.pop(key, None)
+        if code is not None:
+            _compiled_expressions[key] = code
+            return code
+
+    # Compile errors are not cached (they are raised every time).
+    code = compile(expression, '<string>', mode)
+    with _compiled_expressions_lock:
+        _compiled_expressions[key] = code
+        while len(_compiled_expressions) > COMPILED_EXPRESSIONS_CACHE_SIZE:
+            _compiled_expressions.popitem(last=False)
+    return code
+
+
 def eval_in_context(expression, globals, locals):
     result = None
     try:
-        result = eval(expression, globals, locals)
+        # eval() ignores leading blanks in strings (but not compile()).
+        result = eval(compile_expression(expression.lstrip(' \t')), globals, locals)
     except Exception:
         s = StringIO()
         traceback.print_exc(file=s)
@@ -373,7 +428,7 @@ def evaluate_expression(thread_id, frame_id, expression, doExec):
             try:
                 # try to make it an eval (if it is an eval we can print it, otherwise we'll exec it and
                 # it will have whatever the user actually did)
-                compiled = compile(expression, '<string>', 'eval')
+                compiled = compile_expression(expression)
             except:
                 Exec(expression, updated_globals, frame.f_locals)
                 pydevd_save_locals.save_locals(frame)
@@ -438,7 +493,10 @@ MAXIMUM_ARRAY_SIZE = 100
 MAX_SLICE_SIZE = 1000
 
 
-def table_like_struct_to_xml(array, name, roffset, coffset, rows, cols, format):
+def table_like_struct_to_xml(array, name, roffset, coffset, rows, cols, format, base64_cells=False):
+    '''
+    @param base64_cells: if True the cells of numeric arrays are sent as their raw bytes (see array_to_xml)
+    '''
     _, type_name, _ = get_type(array)
     if type_name == 'ndarray':
         array, metaxml, r, c, f = array_to_meta_xml(array, name, format)
@@ -447,7 +505,7 @@ def table_like_struct_to_xml(array, name, roffset, coffset, rows, cols, format):
         if rows == -1 and cols == -1:
             rows = r
             cols = c
-        xml += array_to_xml(array, roffset, coffset, rows, cols, format)
+        xml += array_to_xml(array, roffset, coffset, rows, cols, format, base64_cells)
     elif type_name == 'DataFrame':
         xml = dataframe_to_xml(array, name, roffset, coffset, rows, cols, format)
     else:
@@ -456,8 +514,12 @@ def table_like_struct_to_xml(array, name, roffset, coffset, rows, cols, format):
     return "<xml>%s</xml>" % xml
 
 
-def array_to_xml(array, roffset, coffset, rows, cols, format):
-    xml = ""
+def array_to_xml(array, roffset, coffset, rows, cols, format, base64_cells=False):
+    '''
+    The cells are sent as <var> elements of their text (in the given format), row by row.  With base64_cells, the
+    cells of numeric arrays are sent as the base64 of their bytes instead (in C order), in the <arraydata> element,
+    which also has the dtype (e.g. "<f8").
+    '''
     rows = min(rows, MAXIMUM_ARRAY_SIZE)
     cols = min(cols, MAXIMUM_ARRAY_SIZE)
 
@@ -478,27 +540,38 @@ def array_to_xml(array, roffset, coffset, rows, cols, format):
             array = array[roffset:]
             rows = min(rows, len(array))
 
-    xml += "<arraydata rows=\"%s\" cols=\"%s\"/>" % (rows, cols)
+    window = _array_window(array, rows, cols)
+    if base64_cells and window.dtype.kind in 'biufc':
+        data = base64.b64encode(window.copy(order='C').tobytes()).decode('ascii')
+        return "<arraydata rows=\"%s\" cols=\"%s\" dtype=\"%s\">%s</arraydata>" % (rows, cols, window.dtype.str, data)
+
+    if window.dtype.kind in 'biu' or window.dtype == 'float64':
+        # The Python scalars print the same as the numpy ones, and are a lot faster to format.
+        values = window.tolist()
+    else:
+        values = window
+    cells = [[format % value for value in row] for row in values]
+
+    xml = ["<arraydata rows=\"%s\" cols=\"%s\"/>" % (rows, cols)]
     for row in xrange(rows):
-        xml += "<row index=\"%s\"/>" % to_string(row)
-        for col in xrange(cols):
-            value = array
-            if rows == 1 or cols == 1:
-                if rows == 1 and cols == 1:
-                    value = array[0]
-                else:
-                    if rows == 1:
-                        dim = col
-                    else:
-                        dim = row
-                    value = array[dim]
-                    if "ndarray" in str(type(value)):
-                        value = value[0]
-            else:
-                value = array[row][col]
-            value = format % value
-            xml += var_to_xml(value, '')
-    return xml
+        xml.append("<row index=\"%s\"/>" % to_string(row))
+        xml.append(_texts_to_xml(cells[row]))
+    return ''.join(xml)
+
+
+def _array_window(array, rows, cols):
+    ''' the rows x cols cells of the (sliced) array shown by array_to_xml, as a 2-D array '''
+    if rows == 1 or cols == 1:
+        # The items of a row or column (the first item of each, for 2-D arrays).
+        cells = array[:cols if rows == 1 else rows]
+        if len(cells.shape) > 1:
+            cells = cells[:, 0]
+        return cells.reshape((rows, cols))
+    return array[:rows, :cols]
+
+
+def _texts_to_xml(texts):
+    return ''.join([var_to_xml(text, '') for text in texts])
 
 
 def array_to_meta_xml(array, name, format):
@@ -639,3 +712,154 @@ def dataframe_to_xml(df, name, roffset, coffset, rows, cols, format):
             value = col_formats[col] % value
             xml += var_to_xml(value, '')
     return xml
+
+
+# Cell texts longer than this are cut (with '...') in table windows.
+TABLE_CELL_MAX_LENGTH = 100
+
+
+def table_window(table, start_row=0, row_count=MAX_SLICE_SIZE, start_col=0, col_count=MAXIMUM_ARRAY_SIZE, stats=False,
+                 float_format=None, hex_ints=False):
+    '''
+    The cells in some rows and columns of a DataFrame, Series or (1-D or 2-D) ndarray, as a dict (for JSON):
+
+        {"rows": all rows, "columns": all columns, "startRow": ..., "startColumn": ...,
+         "rowLabels": [...], "columnHeaders": [{"label": ..., "type": dtype, "stats": {...}}, ...],
+         "cells": [[text, ...], ...]}
+
+    At most MAX_SLICE_SIZE rows and MAXIMUM_ARRAY_SIZE columns are sent, and only the cells in them are read and
+    formatted (a column at a time), so the work and memory do not depend on the size of the table.  The stats of a
+    column (with stats=True) are its count of values and of nulls, and for numbers their min, max, mean and std; these
+    are for the whole column.
+
+    @param float_format: e.g. '%.5f' (by default floats are shown as by str)
+    @param hex_ints: whether integers are shown in hex
+    '''
+    _, type_name, _ = get_type(table)
+    if type_name == 'DataFrame':
+        num_rows, num_cols = table.shape
+        get_column = lambda col: table.iloc[:, col]
+        get_label = lambda col: table.columns[col]
+    elif type_name == 'Series':
+        num_rows, num_cols = len(table), 1
+        get_column = lambda col: table
+        get_label = lambda col: '' if table.name is None else table.name
+    elif type_name == 'ndarray' and len(table.shape) in (1, 2):
+        if len(table.shape) == 1:
+            num_rows, num_cols = len(table), 1
+            get_column = lambda col: table
+        else:
+            num_rows, num_cols = table.shape
+            get_column = lambda col: table[:, col]
+        get_label = lambda col: col
+    else:
+        raise ValueError('Not a DataFrame, Series or 1-D or 2-D ndarray: %s' % (type_name,))
+
+    start_row = max(0, min(start_row, num_rows))
+    start_col = max(0, min(start_col, num_cols))
+    end_row = min(num_rows, start_row + max(0, min(row_count, MAX_SLICE_SIZE)))
+    end_col = min(num_cols, start_col + max(0, min(col_count, MAXIMUM_ARRAY_SIZE)))
+
+    if type_name == 'ndarray':
+        row_labels = [str(row) for row in xrange(start_row, end_row)]
+    else:
+        row_labels = [_table_label(label) for label in table.index[start_row:end_row]]
+
+    headers = []
+    columns = []
+    for col in xrange(start_col, end_col):
+        column = get_column(col)
+        kind = column.dtype.kind
+        header = {'label': _table_label(get_label(col)), 'type': str(column.dtype)}
+        if stats:
+            header['stats'] = _table_column_stats(column, kind)
+        headers.append(header)
+        if type_name == 'ndarray':
+            values = column[start_row:end_row].tolist()
+        else:
+            values = column.iloc[start_row:end_row].tolist()
+        columns.append(_table_column_texts(values, kind, float_format, hex_ints))
+
+    if columns:
+        cells = [list(row) for row in zip(*columns)]
+    else:
+        cells = [[] for _ in row_labels]
+    return {
+        'rows': num_rows,
+        'columns': num_cols,
+        'startRow': start_row,
+        'startColumn': start_col,
+        'rowLabels': row_labels,
+        'columnHeaders': headers,
+        'cells': cells,
+    }
+
+
+def _table_label(label):
+    # As dataframe_to_xml shows them.
+    if isinstance(label, tuple):
+        return '/'.join(map(str, label))
+    return str(label)
+
+
+def _table_column_texts(values, kind, float_format, hex_ints):
+    if kind == 'f' and float_format:
+        format = float_format
+    elif kind in 'iu':
+        format = '%#x' if hex_ints else '%d'
+    else:
+        format = None
+    if format is not None:
+        try:
+            return [format % value for value in values]
+        except (TypeError, ValueError):
+            # e.g. a bad float_format, or missing values in a nullable integer column
+            pass
+    return [_table_cell_text(value) for value in values]
+
+
+def _table_cell_text(value):
+    try:
+        text = str(value)
+    except Exception:
+        text = '<error getting text: %s>' % (sys.exc_info()[1].__class__.__name__,)
+    if len(text) > TABLE_CELL_MAX_LENGTH:
+        text = text[:TABLE_CELL_MAX_LENGTH - 3] + '...'
+    return text
+
+
+def _table_column_stats(column, kind):
+    import numpy as np
+
+    if hasattr(column, 'isnull'):  # Series
+        nulls = int(column.isnull().sum())
+        values = column.dropna() if kind in 'biuf' and nulls else column
+        values = values.values if kind in 'biuf' else None
+    elif kind == 'f':
+        valid = ~np.isnan(column)
+        nulls = len(column) - int(valid.sum())
+        values = column[valid] if nulls else column
+    elif kind == 'O':
+        nulls = sum(1 for value in column if value is None)
+        values = None
+    else:
+        nulls = 0
+        values = column if kind in 'biu' else None
+
+    result = {'count': len(column) - nulls, 'nulls': nulls}
+    if values is not None and kind in 'biuf' and len(values):
+        if kind == 'b':
+            values = values.astype('int8')
+        result['min'] = _table_stat(values.min())
+        result['max'] = _table_stat(values.max())
+        result['mean'] = _table_stat(values.mean())
+        result['std'] = _table_stat(values.std(ddof=1)) if len(values) > 1 else None
+    return result
+
+
+def _table_stat(value):
+    # numpy scalars as Python numbers, and nan/inf as None (they are not valid JSON).
+    value = value.item() if hasattr(value, 'item') else value
+    if isinstance(value, float) and (value != value or value in (float('inf'), float('-inf'))):
+        return None
+    return value
@@ -5,8 +5,10 @@ from _pydevd_bundle import pydevd_resolver
 import sys
 from _pydevd_bundle.pydevd_constants import dict_iter_items, dict_keys, IS_PY3K, \
     BUILTINS_MODULE_NAME, MAXIMUM_VARIABLE_REPRESENTATION_SIZE, RETURN_VALUES_DICT, LOAD_VALUES_ASYNC, \
-    DEFAULT_VALUE
+    DEFAULT_VALUE, FRAME_VARS_TIME_BUDGET_SEC, VALUE_TIME_BUDGET_SEC
 from _pydev_bundle.pydev_imports import quote
+from _pydev_imps._pydev_saved_modules import threading
+from _pydev_imps._pydev_saved_modules import time
 from _pydevd_bundle.pydevd_extension_api import TypeResolveProvider, StrPresentationProvider
 
 try:
@@ -21,6 +23,22 @@ def make_valid_xml_value(s):
     return s.replace("&", "&amp;").replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
 
 
+# The format (a dict, e.g. {'hex': True}) for the values shown by the command being run by the current thread, if
+# the command has one.  It is up to the StrPresentationProviders to follow it.
+_value_format = threading.local()
+
+
+def get_value_format():
+    return getattr(_value_format, 'value', None)
+
+
+def set_value_format(value_format):
+    ''' sets the format for the current thread and returns the previous one '''
+    old = getattr(_value_format, 'value', None)
+    _value_format.value = value_format
+    return old
+
+
 class ExceptionOnEvaluate:
     def __init__(self, result):
         self.result = result
@@ -227,6 +245,18 @@ def should_evaluate_full_value(val):
     return not LOAD_VALUES_ASYNC or (is_builtin(type(val)) and not isinstance(val, (list, tuple, dict)))
 
 
+# Builtin containers with up to this many items are computed even once the frame's time budget is spent.
+SMALL_CONTAINER_SIZE = 100
+
+
+def _is_simple_value(val):
+    if not is_builtin(type(val)):
+        return False
+    if isinstance(val, (list, tuple, dict)):
+        return len(val) <= SMALL_CONTAINER_SIZE
+    return True
+
+
 def return_values_from_dict_to_xml(return_dict):
     res = ""
     for name, val in dict_iter_items(return_dict):
@@ -234,19 +264,58 @@ def return_values_from_dict_to_xml(return_dict):
     return res
 
 
-def frame_vars_to_xml(frame_f_locals, hidden_ns=None):
-    """ dumps frame variables to XML
-    <var name="var_name" scope="local" type="type" value="value"/>
-    """
-    xml = ""
+# The (non-builtin) types whose values took longer than VALUE_TIME_BUDGET_SEC to compute (up to this many), since
+# a thread was last resumed.
+SLOW_VALUE_TYPES_SIZE = 256
+_slow_value_types = {}
+_slow_value_types_lock = threading.Lock()
+
+
+def _is_slow_value_type(val_type):
+    with _slow_value_types_lock:
+        return val_type in _slow_value_types
+
+
+def _add_slow_value_type(val_type):
+    with _slow_value_types_lock:
+        if len(_slow_value_types) >= SLOW_VALUE_TYPES_SIZE:
+            _slow_value_types.clear()
+        _slow_value_types[val_type] = True
 
+
+def forget_slow_value_types():
+    """ called when a thread is resumed: a value that was slow to compute (e.g. on a cold cache) may not be anymore """
+    with _slow_value_types_lock:
+        _slow_value_types.clear()
+
+
+def _iter_frame_vars(frame_f_locals, hidden_ns, to_var):
+    """ yields (whether it is a return value, to_var(val, name, attribute, evaluate_full_value)) for the frame variables,
+    where the attribute is None, 'isRetVal' or 'isIPythonHidden'
+
+    The values of simple builtin types (and small builtin containers) are always computed.  Other values are not (they
+    are left to be loaded later, see should_evaluate_full_value) once FRAME_VARS_TIME_BUDGET_SEC is spent, or if their
+    type was slow since a thread was last resumed.
+    """
     keys = dict_keys(frame_f_locals)
     if hasattr(keys, 'sort'):
         keys.sort()  # Python 3.0 does not have it
     else:
         keys = sorted(keys)  # Jython 2.1 does not have it
 
-    return_values_xml = ''
+    deadline = time.time() + FRAME_VARS_TIME_BUDGET_SEC
+
+    def get_var(val, name, attribute, eval_full_val):
+        if not eval_full_val or _is_simple_value(val):
+            return to_var(val, name, attribute, eval_full_val)
+        val_type = type(val)
+        start = time.time()
+        if start > deadline or _is_slow_value_type(val_type):
+            return to_var(val, name, attribute, False)
+        var = to_var(val, name, attribute, True)
+        if time.time() - start > VALUE_TIME_BUDGET_SEC and not is_builtin(val_type):
+            _add_slow_value_type(val_type)
+        return var
 
     for k in keys:
         try:
@@ -255,24 +324,54 @@ def frame_vars_to_xml(frame_f_locals, hidden_ns=None):
 
             if k == RETURN_VALUES_DICT:
                 for name, val in dict_iter_items(v):
-                    return_values_xml += var_to_xml(val, name, additional_in_xml=' isRetVal="True"')
+                    yield True, get_var(val, name, 'isRetVal', True)
 
+            elif hidden_ns is not None and k in hidden_ns:
+                yield False, get_var(v, str(k), 'isIPythonHidden', eval_full_val)
             else:
-                if hidden_ns is not None and k in hidden_ns:
-                    xml += var_to_xml(v, str(k), additional_in_xml=' isIPythonHidden="True"',
-                                      evaluate_full_value=eval_full_val)
-                else:
-                    xml += var_to_xml(v, str(k), evaluate_full_value=eval_full_val)
+                yield False, get_var(v, str(k), None, eval_full_val)
         except Exception:
             traceback.print_exc()
             pydev_log.error("Unexpected error, recovered safely.\n")
 
+
+def frame_vars_to_xml(frame_f_locals, hidden_ns=None):
+    """ dumps frame variables to XML
+    <var name="var_name" scope="local" type="type" value="value"/>
+    """
+    def to_var(val, name, attribute, evaluate_full_value):
+        additional_in_xml = ' %s="True"' % (attribute,) if attribute else ''
+        return var_to_xml(val, name, additional_in_xml=additional_in_xml, evaluate_full_value=evaluate_full_value)
+
+    return ''.join(_frame_vars_return_values_first(frame_f_locals, hidden_ns, to_var))
+
+
+def frame_vars_to_dicts(frame_f_locals, hidden_ns=None):
+    """ frame variables as a list of dicts (the PAYLOAD_JSON counterpart of frame_vars_to_xml) """
+    def to_var(val, name, attribute, evaluate_full_value):
+        additional = {attribute: True} if attribute else None
+        return var_to_dict(val, name, additional=additional, evaluate_full_value=evaluate_full_value)
+
+    return _frame_vars_return_values_first(frame_f_locals, hidden_ns, to_var)
+
+
+def _frame_vars_return_values_first(frame_f_locals, hidden_ns, to_var):
+    return_values = []
+    variables = []
+    for is_return_value, var in _iter_frame_vars(frame_f_locals, hidden_ns, to_var):
+        if is_return_value:
+            return_values.append(var)
+        else:
+            variables.append(var)
     # Show return values as the first entry.
-    return return_values_xml + xml
+    return return_values + variables
 
 
-def var_to_xml(val, name, doTrim=True, additional_in_xml='', evaluate_full_value=True):
-    """ single variable or dictionary to xml representation """
+def _var_fields(val, name, doTrim=True, evaluate_full_value=True):
+    """ returns (name, type name, type qualifier, value, is exception on eval, is container, indexed count) for a variable
+
+    The indexed count is the number of items of containers whose resolver can page through them (None otherwise).
+    """
 
     try:
         # This should be faster than isinstance (but we have to protect against not having a '__class__' attribute).
@@ -326,6 +425,28 @@ def var_to_xml(val, name, doTrim=True, additional_in_xml='', evaluate_full_value
             except:
                 value = 'Unable to get repr for %s' % v.__class__
 
+    if value:
+        # cannot be too big... communication may not handle it.
+        if len(value) > MAXIMUM_VARIABLE_REPRESENTATION_SIZE and doTrim:
+            value = value[0:MAXIMUM_VARIABLE_REPRESENTATION_SIZE]
+            value += '...'
+
+    indexed_count = None
+    if resolver is not None and hasattr(resolver, 'get_indexed_count'):
+        try:
+            indexed_count = resolver.get_indexed_count(v)
+        except:
+            pass
+
+    return name, typeName, type_qualifier, value, is_exception_on_eval, resolver is not None, indexed_count
+
+
+def var_to_xml(val, name, doTrim=True, additional_in_xml='', evaluate_full_value=True):
+    """ single variable or dictionary to xml representation """
+
+    name, typeName, type_qualifier, value, is_exception_on_eval, is_container, indexed_count = _var_fields(
+        val, name, doTrim, evaluate_full_value)
+
     try:
         name = quote(name, '/>_= ')  # TODO: Fix PY-5834 without using quote
     except:
@@ -339,11 +460,6 @@ def var_to_xml(val, name, doTrim=True, additional_in_xml='', evaluate_full_value
         xml_qualifier = ''
 
     if value:
-        # cannot be too big... communication may not handle it.
-        if len(value) > MAXIMUM_VARIABLE_REPRESENTATION_SIZE and doTrim:
-            value = value[0:MAXIMUM_VARIABLE_REPRESENTATION_SIZE]
-            value += '...'
-
         # fix to work with unicode values
         try:
             if not IS_PY3K:
@@ -362,9 +478,43 @@ def var_to_xml(val, name, doTrim=True, additional_in_xml='', evaluate_full_value
     if is_exception_on_eval:
         xml_container = ' isErrorOnEval="True"'
     else:
-        if resolver is not None:
+        if is_container:
             xml_container = ' isContainer="True"'
+            if indexed_count is not None:
+                xml_container += ' indexedVariables="%s"' % (indexed_count,)
         else:
             xml_container = ''
 
     return ''.join((xml, xml_qualifier, xml_value, xml_container, additional_in_xml, ' />\n'))
+
+
+def var_to_dict(val, name, doTrim=True, additional=None, evaluate_full_value=True):
+    """ single variable to a dict (the PAYLOAD_JSON counterpart of var_to_xml), values are not quoted """
+
+    name, typeName, type_qualifier, value, is_exception_on_eval, is_container, indexed_count = _var_fields(
+        val, name, doTrim, evaluate_full_value)
+
+    var = {'name': _to_text(name), 'type': _to_text(typeName)}
+    if type_qualifier:
+        var['qualifier'] = _to_text(type_qualifier)
+    if value:
+        var['value'] = _to_text(value)
+    if is_exception_on_eval:
+        var['isErrorOnEval'] = True
+    elif is_container:
+        var['isContainer'] = True
+        if indexed_count is not None:
+            var['indexedVariables'] = indexed_count
+    if additional:
+        var.update(additional)
+    return var
+
+
+def _to_text(s):
+    if not IS_PY3K:
+        if s.__class__ == str:
+            return s.decode('utf-8', 'replace')
+        return s
+    if s.__class__ == bytes:
+        return s.decode('utf-8', 'replace')
+    return s
@@ -25,7 +25,7 @@ from _pydev_imps._pydev_saved_modules import thread
 from _pydevd_bundle import pydevd_io, pydevd_vm_type
 import pydevd_tracing
 from _pydevd_bundle import pydevd_utils
-from _pydevd_bundle import pydevd_vars
+from _pydevd_bundle import pydevd_vars, pydevd_xml
 from _pydevd_bundle.pydevd_additional_thread_info import set_additional_thread_info
 from _pydevd_bundle.pydevd_breakpoints import ExceptionBreakpoint
 from _pydevd_bundle.pydevd_comm import CMD_SET_BREAK, CMD_SET_NEXT_STATEMENT, CMD_STEP_INTO, CMD_STEP_OVER, \
@@ -574,7 +574,15 @@ class PyDB:
 
                             if int_cmd.can_be_executed_by(curr_thread_id):
                                 pydevd_log(2, "processing internal command ", str(int_cmd))
-                                int_cmd.do_it(self)
+                                value_format = getattr(int_cmd, 'value_format', None)
+                                if value_format is None:
+                                    int_cmd.do_it(self)
+                                else:
+                                    old_value_format = pydevd_xml.set_value_format(value_format)
+                                    try:
+                                        int_cmd.do_it(self)
+                                    finally:
+                                        pydevd_xml.set_value_format(old_value_format)
                             else:
                                 pydevd_log(2, "NOT processing internal command ", str(int_cmd))
                                 cmdsToReadd.append(int_cmd)
@@ -813,6 +821,7 @@ class PyDB:
             time.sleep(0.01)
 
         self.cancel_async_evaluation(get_thread_id(thread), str(id(frame)))
+        pydevd_xml.forget_slow_value_types()
 
         # process any stepping instructions
         if info.pydev_step_cmd == CMD_STEP_INTO or info.pydev_step_cmd == CMD_STEP_INTO_MY_CODE:
@@ -1,6 +1,11 @@
+import warnings
+
 from _pydevd_bundle.pydevd_extension_api import TypeResolveProvider
 from _pydevd_bundle.pydevd_resolver import defaultResolver, MAX_ITEMS_TO_HANDLE, TOO_LARGE_ATTR, TOO_LARGE_MSG
-from .pydevd_helpers import find_mod_attr
+from .pydevd_helpers import find_cached_module, find_mod_attr
+
+# The stats of arrays with more items than this are not computed (may be changed).
+STATS_MAX_SIZE = 1024 * 1024
 
 
 # =======================================================================================================================
@@ -12,6 +17,48 @@ class NdArrayResolver: pass
 class NdArrayItemsContainer: pass
 
 
+class NdArrayStats(object):
+    '''
+    The 'stats' child of an ndarray: they are only computed when it is expanded (see NdArrayStatsResolveProvider).
+    '''
+
+    NAMES = ('min', 'max', 'mean', 'nan_count')
+
+    def __init__(self, array):
+        self.array = array
+
+    def __repr__(self):
+        return 'min, max, mean, NaN count'
+
+    def compute(self):
+        array = self.array
+        if array.size > STATS_MAX_SIZE:
+            return self._all('ndarray too big, calculating stats would slow down debugging')
+        if array.size == 0:
+            return self._all('array is empty')
+        kind = array.dtype.kind
+        if kind not in 'biufc':
+            return self._all('not a numeric object')
+
+        np = find_cached_module('numpy')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with np.errstate(all='ignore'):
+                if kind == 'f':
+                    # Not NaN unless all of them are.
+                    stats = {'min': np.nanmin(array), 'max': np.nanmax(array), 'mean': np.nanmean(array)}
+                else:
+                    stats = {'min': array.min(), 'max': array.max(), 'mean': array.mean()}
+                if kind in 'fc':
+                    stats['nan_count'] = int(np.count_nonzero(np.isnan(array)))
+                else:
+                    stats['nan_count'] = 0
+        return stats
+
+    def _all(self, msg):
+        return dict((name, msg) for name in self.NAMES)
+
+
 class NDArrayTypeResolveProvider(object):
     def can_provide(self, type_object, type_name):
         nd_array = find_mod_attr('numpy', 'ndarray')
@@ -45,6 +92,8 @@ class NDArrayTypeResolveProvider(object):
             return obj.dtype
         if attribute == 'size':
             return obj.size
+        if attribute == 'stats':
+            return NdArrayStats(obj)
         if attribute.startswith('['):
             container = NdArrayItemsContainer()
             i = 0
@@ -61,27 +110,32 @@ class NDArrayTypeResolveProvider(object):
     def get_dictionary(self, obj):
         ret = dict()
         ret['__internals__'] = defaultResolver.get_dictionary(obj)
-        if obj.size > 1024 * 1024:
-            ret['min'] = 'ndarray too big, calculating min would slow down debugging'
-            ret['max'] = 'ndarray too big, calculating max would slow down debugging'
-        elif obj.size == 0:
-            ret['min'] = 'array is empty'
-            ret['max'] = 'array is empty'
-        else:
-            if self.is_numeric(obj):
-                ret['min'] = obj.min()
-                ret['max'] = obj.max()
-            else:
-                ret['min'] = 'not a numeric object'
-                ret['max'] = 'not a numeric object'
+        # min and max are with the other stats (only computed if expanded).
         ret['shape'] = obj.shape
         ret['dtype'] = obj.dtype
         ret['size'] = obj.size
+        ret['stats'] = NdArrayStats(obj)
         ret['[0:%s] ' % (len(obj))] = list(obj[0:MAX_ITEMS_TO_HANDLE])
         return ret
 
 
+class NdArrayStatsResolveProvider(object):
+    '''
+       Computes the stats of an ndarray (vectorized) when they are expanded
+    '''
+
+    def can_provide(self, type_object, type_name):
+        return issubclass(type_object, NdArrayStats)
+
+    def resolve(self, obj, attribute):
+        return obj.compute().get(attribute)
+
+    def get_dictionary(self, obj):
+        return obj.compute()
+
+
 import sys
 
 if not sys.platform.startswith("java"):
     TypeResolveProvider.register(NDArrayTypeResolveProvider)
+    TypeResolveProvider.register(NdArrayStatsResolveProvider)
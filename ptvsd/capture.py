@@ -0,0 +1,156 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See LICENSE in the project root
+# for license information.
+
+"""Recording of a debug session's traffic, for replaying it offline.
+
+A capture holds every DAP message between the client and the adapter
+and every command between the adapter and pydevd, in order and
+timestamped.  Set PTVSD_CAPTURE to a filename to record a session.
+
+The file starts with MAGIC, a version byte and the session's start
+time (a double).  Then each message is a RECORD header (seconds since
+the start, the flags and the payload size) followed by the payload:
+the JSON body for DAP messages and a JSON [cmd_id, seq, args] array
+for pydevd commands.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import json
+import os
+import struct
+import threading
+import time
+
+
+CAPTURE_FILE = os.environ.get('PTVSD_CAPTURE')
+
+MAGIC = b'PTVSDCAP'
+VERSION = 1
+HEADER = struct.Struct('<8sBd')
+RECORD = struct.Struct('<dBI')
+
+STREAM_DAP = 0
+STREAM_PYDEVD = 1
+STREAMS = (STREAM_DAP, STREAM_PYDEVD)
+
+# flags
+_STREAM_MASK = 0x0f
+_INBOUND = 0x10  # sent to the adapter (by the client or by pydevd)
+
+
+# "message" is the decoded DAP message (a dict) or pydevd's
+# (cmd_id, seq, args).
+Record = collections.namedtuple('Record', 'time stream inbound message')
+
+
+class Recorder(object):
+    """Writes a capture to a binary file object.
+
+    It is safe to use from multiple threads.  Each record is flushed as
+    soon as it is written so that little is lost if the process is
+    killed.
+    """
+
+    @classmethod
+    def open(cls, filename):
+        """Return a recorder for a new capture file."""
+        return cls(open(filename, 'wb'), owned=True)
+
+    def __init__(self, file, owned=False):
+        self._file = file
+        self._owned = owned
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._closed = False
+        self._file.write(HEADER.pack(MAGIC, VERSION, self._start))
+        self._file.flush()
+
+    def record_dap(self, inbound, content):
+        """Record a DAP message, given its JSON body."""
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        self._write(STREAM_DAP, inbound, content)
+
+    def record_pydevd(self, inbound, cmd_id, seq, args):
+        """Record a command sent to or received from pydevd."""
+        payload = json.dumps([int(cmd_id), int(seq), args],
+                             separators=(',', ':'))
+        self._write(STREAM_PYDEVD, inbound, payload.encode('utf-8'))
+
+    def close(self):
+        # TODO: docstring
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._owned:
+                self._file.close()
+            else:
+                self._file.flush()
+
+    # internal methods
+
+    def _write(self, stream, inbound, payload):
+        flags = stream | (_INBOUND if inbound else 0)
+        with self._lock:
+            if self._closed:
+                return
+            header = RECORD.pack(time.time() - self._start, flags,
+                                 len(payload))
+            self._file.write(header + payload)
+            self._file.flush()
+
+
+def from_env():
+    """Return a recorder for PTVSD_CAPTURE (or None if it isn't set)."""
+    if not CAPTURE_FILE:
+        return None
+    return Recorder.open(CAPTURE_FILE)
+
+
+def read_start_time(file):
+    """Return the session start time from the capture's header.
+
+    The file must be positioned at its start.  ValueError is raised
+    if it is not a capture that this version can read.
+    """
+    data = file.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError('not a ptvsd capture (too short)')
+    magic, version, start = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError('not a ptvsd capture')
+    if version != VERSION:
+        raise ValueError('unsupported capture version {}'.format(version))
+    return start
+
+
+def iter_records(file):
+    """Yield each Record in a capture file (opened in binary mode)."""
+    read_start_time(file)
+    while True:
+        data = file.read(RECORD.size)
+        if not data:
+            return
+        if len(data) < RECORD.size:
+            raise ValueError('truncated capture record')
+        elapsed, flags, size = RECORD.unpack(data)
+        payload = file.read(size)
+        if len(payload) < size:
+            raise ValueError('truncated capture record')
+        stream = flags & _STREAM_MASK
+        if stream not in STREAMS:
+            raise ValueError('unsupported capture stream {}'.format(stream))
+        message = json.loads(payload.decode('utf-8'))
+        if stream == STREAM_PYDEVD:
+            message = tuple(message)
+        yield Record(elapsed, stream, bool(flags & _INBOUND), message)
+
+
+def load(filename):
+    """Return the list of records in a capture file."""
+    with open(filename, 'rb') as file:
+        return list(iter_records(file))
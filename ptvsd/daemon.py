@@ -5,6 +5,7 @@ import threading
 from ptvsd import wrapper
 from ptvsd.socket import (
     close_socket, create_server, create_client, connect, Address)
+from .capture import from_env as capture_from_env
 from .exit_handlers import (
     ExitHandlers, UnsupportedSignalError,
     kill_current_proc)
@@ -471,10 +472,13 @@ class Daemon(DaemonBase):
 
     def __init__(self, wait_for_user=_wait_for_user,
                  notify_session_debugger_ready=None,
+                 capture=None,
                  **kwargs):
         super(Daemon, self).__init__(wait_for_user, **kwargs)
 
         self._notify_session_debugger_ready = notify_session_debugger_ready
+        # A capture.Recorder (by default one for PTVSD_CAPTURE, if set).
+        self._capture = capture
 
     @property
     def pydevd(self):
@@ -483,18 +487,29 @@ class Daemon(DaemonBase):
     # internal methods
 
     def _start(self):
+        if self._capture is None:
+            self._capture = capture_from_env()
         return wrapper.PydevdSocket(
             self._handle_pydevd_message,
             self._handle_pydevd_close,
             self._getpeername,
             self._getsockname,
+            capture=self._capture,
         )
 
+    def _close(self):
+        super(Daemon, self)._close()
+        if self._capture is not None:
+            self._capture.close()
+
     def _start_session(self, threadname, **kwargs):
         super(Daemon, self)._start_session(
             threadname,
             pydevd_notify=self.pydevd.pydevd_notify,
             pydevd_request=self.pydevd.pydevd_request,
+            pydevd_cancel=self.pydevd.pydevd_cancel,
+            pydevd_stats=self.pydevd.request_stats,
+            capture=self._capture,
             **kwargs
         )
 
@@ -4,23 +4,43 @@
 
 from __future__ import print_function, with_statement, absolute_import
 
+import collections
+import os
 import sys
 import threading
+import time
 import traceback
 from ptvsd.reraise import reraise
 
 
+# Callbacks in a higher-priority lane always run before those in lower
+# ones (and they run in order within a lane).
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+PRIORITY_NAMES = ('high', 'normal', 'low')
+
+# Set to "asyncio" to run the adapter's loop on asyncio (Python 3 only).
+EVENT_LOOP = os.environ.get('PTVSD_EVENT_LOOP', 'thread')
+
+
 class Future(object):
     # TODO: docstring
 
-    def __init__(self, loop):
+    def __init__(self, loop, priority=PRIORITY_NORMAL):
         self._lock = threading.Lock()
         self._loop = loop
+        self._priority = priority
         self._done = False
         self._observed = False
         self._done_callbacks = []
         self._exc_info = None
 
+    @property
+    def priority(self):
+        return self._priority
+
     def __del__(self):
         if self._lock:
             with self._lock:
@@ -58,7 +78,7 @@ class Future(object):
             for cb in callbacks:
                 cb(self)
 
-        self._loop.call_soon(invoke_callbacks)
+        self._loop.call_soon(invoke_callbacks, priority=self._priority)
 
     def set_exc_info(self, exc_info):
         # TODO: docstring
@@ -71,7 +91,7 @@ class Future(object):
             for cb in callbacks:
                 cb(self)
 
-        self._loop.call_soon(invoke_callbacks)
+        self._loop.call_soon(invoke_callbacks, priority=self._priority)
 
     def add_done_callback(self, callback):
         # TODO: docstring
@@ -87,41 +107,214 @@ class Future(object):
             self._done_callbacks.remove(callback)
 
 
-class EventLoop(object):
-    # TODO: docstring
+class _Lanes(object):
+    """The per-priority queues of callbacks, with instrumentation.
+
+    This is not thread-safe; the owner must serialize access.
+    """
 
     def __init__(self):
-        self._queue = []
-        self._lock = threading.Lock()
-        self._event = threading.Event()
-        self._event.set()
+        self._queues = tuple(collections.deque() for _ in PRIORITIES)
+        self._counters = [
+            {
+                'calls': 0,
+                'max_depth': 0,
+                'wait_total': 0.0,
+                'wait_max': 0.0,
+                'run_total': 0.0,
+                'run_max': 0.0,
+            }
+            for _ in PRIORITIES
+        ]
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues)
+
+    def push(self, priority, f, args):
+        queue = self._queues[priority]
+        queue.append((f, args, time.time()))
+        counters = self._counters[priority]
+        if len(queue) > counters['max_depth']:
+            counters['max_depth'] = len(queue)
+
+    def pop(self):
+        """Return (priority, f, args) for the next callback (or None)."""
+        for priority, queue in enumerate(self._queues):
+            if queue:
+                f, args, queued = queue.popleft()
+                self._counters[priority]['calls'] += 1
+                self._record(priority, 'wait', time.time() - queued)
+                return priority, f, args
+        return None
+
+    def record_run(self, priority, elapsed):
+        self._record(priority, 'run', elapsed)
+
+    def stats(self):
+        stats = {}
+        for priority, counters in enumerate(self._counters):
+            lane = dict(counters)
+            lane['depth'] = len(self._queues[priority])
+            stats[PRIORITY_NAMES[priority]] = lane
+        return stats
+
+    def _record(self, priority, kind, elapsed):
+        counters = self._counters[priority]
+        counters[kind + '_total'] += elapsed
+        if elapsed > counters[kind + '_max']:
+            counters[kind + '_max'] = elapsed
+
+
+def _call_soon_args(kwargs):
+    priority = kwargs.pop('priority', PRIORITY_NORMAL)
+    if kwargs:
+        raise TypeError('unexpected keyword arguments {!r}'.format(kwargs))
+    if priority not in PRIORITIES:
+        raise ValueError('unsupported priority {!r}'.format(priority))
+    return priority
 
+
+class EventLoop(object):
+    """Runs callbacks on the thread that calls run_forever().
+
+    The loop sleeps until a callback is submitted.  Callbacks are run one
+    at a time, in order, from the highest-priority lane that has any.
+    The stats property reports, per lane, how many callbacks ran, how
+    long they waited in the queue and how long they took.
+    """
+
+    def __init__(self):
+        self._lanes = _Lanes()
+        self._cond = threading.Condition()
         self._stop = False
 
-    def create_future(self):
-        return Future(self)
+    @property
+    def stats(self):
+        """A snapshot of the per-lane counters (times are in seconds)."""
+        with self._cond:
+            return self._lanes.stats()
+
+    def create_future(self, priority=PRIORITY_NORMAL):
+        return Future(self, priority)
 
     def run_forever(self):
-        while not self._stop:
-            if not self._event.wait(timeout=0.1):
-                continue
-            with self._lock:
-                queue = self._queue
-                self._queue = []
-                self._event.clear()
-            for (f, args) in queue:
+        lanes = self._lanes
+        while True:
+            with self._cond:
+                while not self._stop and not len(lanes):
+                    self._cond.wait()
+                if self._stop:
+                    return
+                priority, f, args = lanes.pop()
+            start = time.time()
+            try:
                 f(*args)
+            finally:
+                elapsed = time.time() - start
+                with self._cond:
+                    lanes.record_run(priority, elapsed)
 
     def stop(self):
-        self._stop = True
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def call_soon(self, f, *args, **kwargs):
+        priority = _call_soon_args(kwargs)
+        with self._cond:
+            self._lanes.push(priority, f, args)
+            self._cond.notify_all()
+
+    def call_soon_threadsafe(self, f, *args, **kwargs):
+        return self.call_soon(f, *args, **kwargs)
+
 
-    def call_soon(self, f, *args):
+class AsyncioEventLoop(object):
+    """An EventLoop that runs its callbacks on an asyncio loop.
+
+    The priority lanes and the instrumentation are the same as for
+    EventLoop.  One callback is run per turn of the asyncio loop, so
+    other asyncio work interleaves with ours.
+    """
+
+    def __init__(self, loop=None):
+        import asyncio
+        self._own_loop = loop is None
+        if loop is None:
+            loop = asyncio.new_event_loop()
+        self._loop = loop
+        self._lanes = _Lanes()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._stopping = False
+
+    @property
+    def asyncio_loop(self):
+        return self._loop
+
+    @property
+    def stats(self):
+        """A snapshot of the per-lane counters (times are in seconds)."""
+        with self._lock:
+            return self._lanes.stats()
+
+    def create_future(self, priority=PRIORITY_NORMAL):
+        return Future(self, priority)
+
+    def run_forever(self):
+        import asyncio
+        asyncio.set_event_loop(self._loop)
         with self._lock:
-            self._queue.append((f, args))
-            self._event.set()
+            if self._stopping:
+                return
+        try:
+            self._loop.run_forever()
+        finally:
+            if self._own_loop:
+                self._loop.close()
 
-    def call_soon_threadsafe(self, f, *args):
-        return self.call_soon(f, *args)
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def call_soon(self, f, *args, **kwargs):
+        priority = _call_soon_args(kwargs)
+        with self._lock:
+            self._lanes.push(priority, f, args)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._loop.call_soon_threadsafe(self._run_one)
+
+    def call_soon_threadsafe(self, f, *args, **kwargs):
+        return self.call_soon(f, *args, **kwargs)
+
+    def _run_one(self):
+        with self._lock:
+            if self._stopping:
+                return
+            priority, f, args = self._lanes.pop()
+        start = time.time()
+        try:
+            f(*args)
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                self._lanes.record_run(priority, elapsed)
+                more = len(self._lanes) > 0
+                self._scheduled = more
+            if more:
+                self._loop.call_soon(self._run_one)
+
+
+def new_event_loop(kind=None):
+    """Return a new EventLoop ("thread") or AsyncioEventLoop ("asyncio")."""
+    if kind is None:
+        kind = EVENT_LOOP
+    if kind == 'asyncio' and sys.version_info >= (3, 4):
+        return AsyncioEventLoop()
+    return EventLoop()
 
 
 class Result(object):
@@ -11,12 +11,13 @@ from __future__ import print_function, with_statement, absolute_import
 # the main thread. This will cause issues when the thread goes away
 # after attach completes.
 
+import collections
 import errno
 import itertools
 import json
 import os
 import os.path
-from socket import create_connection
+from socket import create_connection, timeout as socket_timeout
 import sys
 import time
 import traceback
@@ -36,6 +37,30 @@ TIMEOUT = os.environ.get('PTVSD_SOCKET_TIMEOUT')
 if TIMEOUT:
     TIMEOUT = float(TIMEOUT)
 
+# The minimum number of bytes requested from the socket at a time.
+READ_SIZE = 64 * 1024
+# The read buffer grows to fit large messages; past this size it is
+# shrunk again once they have been read.
+MAX_IDLE_READ_BUFFER = 16 * READ_SIZE
+
+# The default number of messages that may wait for the writer thread.
+MAX_PENDING = 1000
+# The most messages that the writer thread sends in a single write.
+MAX_FLUSH = 500
+# The most buffers passed to one sendmsg() call (IOV_MAX is often 1024).
+MAX_IOVECS = 512
+
+# How long the writer thread waits before retrying a write that would
+# have blocked.
+RETRY_DELAY = 0.01  # seconds
+
+# How long closing waits for queued messages to be written.
+FLUSH_TIMEOUT = 5  # seconds
+
+# What happens when the outbound queue is full.
+OVERFLOW_BLOCK = 'block'  # wait until the writer makes room
+OVERFLOW_DROP_EVENTS = 'drop-events'  # discard events (not responses)
+
 
 if sys.version_info[0] >= 3:
     from encodings import ascii
@@ -50,6 +75,235 @@ else:
         pass
 
 
+if sys.version_info[0] >= 3:
+    def _decode_utf8(buf, start, end):
+        # str() decodes straight from the buffer (no intermediate copy).
+        view = memoryview(buf)
+        try:
+            return str(view[start:end], 'utf-8', 'replace')
+        finally:
+            del view
+else:
+    def _decode_utf8(buf, start, end):
+        data = buffer(buf, start, end - start)  # noqa
+        return data[:].decode('utf-8', 'replace')
+
+
+def _is_disconnected(exc):
+    # Failed writes to a closed socket are ignored.
+    if isinstance(exc, BrokenPipeError):
+        return True
+    if isinstance(exc, (OSError, IOError)):
+        return exc.errno in (errno.EPIPE, errno.ESHUTDOWN,
+                             errno.ENOTCONN, errno.EBADF)
+    return False
+
+
+def _is_retryable(exc):
+    # A slow reader makes a write time out (or, if the socket doesn't
+    # block, fail with EAGAIN); nothing was lost so it can be retried.
+    if isinstance(exc, socket_timeout):
+        return True
+    if isinstance(exc, (OSError, IOError)):
+        return exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR,
+                             errno.ENOBUFS)
+    return False
+
+
+def _send_all(sock, buffers, retry=None):
+    """Write all the buffers to the socket, in as few calls as possible.
+
+    If a write times out then "retry" is called with the exception; the
+    write is tried again if it returns True.  Returns the number of bytes
+    written.
+    """
+    sendmsg = getattr(sock, 'sendmsg', None)
+    if sendmsg is not None:
+        def write(index):
+            return sendmsg(buffers[index:index + MAX_IOVECS])
+    else:
+        data = b''.join(buffers)
+        send = getattr(sock, 'send', None)
+        if send is None:
+            sock.sendall(data)
+            return len(data)
+        # Unlike sendall(), send() tells us how much was written before
+        # a timeout.
+        buffers = [data]
+
+        def write(index):
+            return send(buffers[index])
+
+    total = 0
+    index = 0
+    while index < len(buffers):
+        try:
+            sent = write(index)
+        except Exception as exc:
+            if retry is None or not _is_retryable(exc) or not retry(exc):
+                raise
+            continue
+        total += sent
+        # Skip past what was sent (a partial write is possible).
+        while index < len(buffers) and sent >= len(buffers[index]):
+            sent -= len(buffers[index])
+            index += 1
+        if sent:
+            buffers[index] = buffers[index][sent:]
+    return total
+
+
+class OutboundQueue(object):
+    """Writes messages to a socket on a dedicated thread.
+
+    Producers never touch the socket.  Whatever has piled up while the
+    writer was busy is sent with a single (vectored) write.  If the queue
+    is full then the "overflow" policy applies.  If a write fails then
+    the error is printed and later messages are dropped.
+    """
+
+    def __init__(self, socket, maxsize=MAX_PENDING, overflow=OVERFLOW_BLOCK):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_EVENTS):
+            raise ValueError('unsupported overflow policy {!r}'
+                             .format(overflow))
+        # See the note about threading at the top of the module.
+        import threading
+        from ._util import new_hidden_thread
+
+        self._socket = socket
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._pending = collections.deque()
+        self._writing = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        self._abandoned = False
+        self._counters = {
+            'queued': 0,
+            'dropped': 0,
+            'written': 0,
+            'bytes': 0,
+            'flushes': 0,
+            'retries': 0,
+            'max_depth': 0,
+            'max_flush': 0,
+        }
+
+        self._thread = new_hidden_thread(
+            target=self._run,
+            name='ipcjson.writer',
+        )
+        self._thread.start()
+
+    @property
+    def stats(self):
+        """A snapshot of the queue's counters."""
+        with self._cond:
+            stats = dict(self._counters)
+            stats['depth'] = len(self._pending)
+        return stats
+
+    def put(self, data, droppable=False):
+        """Queue the buffers to be written together.
+
+        Returns False if the data was dropped (including once the queue
+        is closed or a write failed).
+        """
+        with self._cond:
+            while len(self._pending) >= self._maxsize and not self._closing:
+                if droppable and self._overflow == OVERFLOW_DROP_EVENTS:
+                    self._counters['dropped'] += 1
+                    return False
+                self._cond.wait()
+            if self._closing:
+                return False
+            self._pending.append(data)
+            self._counters['queued'] += 1
+            depth = len(self._pending)
+            if depth > self._counters['max_depth']:
+                self._counters['max_depth'] = depth
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written.
+
+        Returns False if that did not happen in time.
+        """
+        if timeout is not None:
+            end = time.time() + timeout
+        with self._cond:
+            while self._pending or self._writing:
+                if not self._thread.is_alive():
+                    break
+                if timeout is None:
+                    self._cond.wait()
+                else:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Write the remaining messages and stop the writer thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # Stop retrying writes that the other end isn't reading.
+            with self._cond:
+                self._abandoned = True
+
+    def _retry(self, exc):
+        with self._cond:
+            if self._abandoned:
+                return False
+            self._counters['retries'] += 1
+        if not isinstance(exc, socket_timeout):
+            time.sleep(RETRY_DELAY)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch = []
+                while self._pending and len(batch) < MAX_FLUSH:
+                    batch.append(self._pending.popleft())
+                self._writing = len(batch)
+                self._cond.notify_all()
+
+            buffers = [buf for data in batch for buf in data]
+            try:
+                written = _send_all(self._socket, buffers, self._retry)
+            except Exception as exc:
+                # The producers are unrelated threads (e.g. the pydevd
+                # reader), so the error is reported here, only once.
+                if not _is_disconnected(exc):
+                    _trace('Error ', traceback.format_exc)
+                    traceback.print_exc(file=sys.__stderr__)
+                with self._cond:
+                    self._closing = True
+                    self._pending.clear()
+                    self._writing = 0
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._writing = 0
+                self._counters['written'] += len(batch)
+                self._counters['bytes'] += written
+                self._counters['flushes'] += 1
+                if len(batch) > self._counters['max_flush']:
+                    self._counters['max_flush'] = len(batch)
+                self._cond.notify_all()
+
+
 def _trace(*msg):
     if _TRACE:
         _TRACE(''.join(_str_or_call(m) for m in msg) + '\n')
@@ -83,6 +337,9 @@ class SocketIO(object):
         socket = kwargs.pop('socket', None)
         own_socket = kwargs.pop('own_socket', True)
         logfile = kwargs.pop('logfile', None)
+        capture = kwargs.pop('capture', None)
+        max_pending = kwargs.pop('max_pending', None)
+        overflow = kwargs.pop('overflow', OVERFLOW_BLOCK)
         if socket is None:
             if port is None:
                 raise ValueError(
@@ -92,11 +349,29 @@ class SocketIO(object):
             own_socket = True
         super(SocketIO, self).__init__(*args, **kwargs)
 
-        self.__buffer = to_bytes('')
+        self.__buffer = bytearray(READ_SIZE)
+        self.__start = 0  # the first unread byte in the buffer
+        self.__end = 0  # the end of the received data in the buffer
         self.__port = port
         self.__socket = socket
+        self.__recv_into = getattr(socket, 'recv_into', None)
         self.__own_socket = own_socket
         self.__logfile = logfile
+        # A capture.Recorder, if the session is being recorded.
+        self.__capture = capture
+        # If "max_pending" is set then messages are written by a
+        # dedicated thread rather than the one that sends them.
+        if max_pending is None:
+            self.__outbound = None
+        else:
+            self.__outbound = OutboundQueue(socket, max_pending, overflow)
+
+    @property
+    def outbound_stats(self):
+        """The outbound queue's counters (None if there isn't a queue)."""
+        if self.__outbound is None:
+            return None
+        return self.__outbound.stats
 
     def _send(self, **payload):
         # TODO: docstring
@@ -108,17 +383,85 @@ class SocketIO(object):
             self.__logfile.write(content)
             self.__logfile.write('\n'.encode('utf-8'))
             self.__logfile.flush()
+        if self.__capture is not None:
+            self.__capture.record_dap(False, content)
+        if self.__outbound is not None:
+            droppable = payload.get('type') == 'event'
+            self.__outbound.put([headers, content], droppable)
+            return
         try:
-            self.__socket.send(headers)
-            self.__socket.send(content)
-        except BrokenPipeError:
-            pass
-        except OSError as exc:
-            if exc.errno in (errno.EPIPE, errno.ESHUTDOWN):  # BrokenPipeError
-                pass
-            elif exc.errno not in (errno.ENOTCONN, errno.EBADF):
+            _send_all(self.__socket, [headers, content])
+        except Exception as exc:
+            if not _is_disconnected(exc):
                 raise
 
+    def _flush_outbound(self, timeout=None):
+        """Wait until all queued messages have been written."""
+        if self.__outbound is None:
+            return True
+        return self.__outbound.flush(timeout)
+
+    def _close_outbound(self, timeout=None):
+        """Write any queued messages and stop the writer thread."""
+        if self.__outbound is not None:
+            self.__outbound.close(timeout)
+
+    def _buffered_recv(self, needed=1):
+        """Read from the socket until at least "needed" bytes are buffered.
+
+        Returns False if the socket is closed before that happens.  The
+        data is read directly into the buffer (via recv_into()), which
+        grows as necessary, so large messages are not repeatedly copied.
+        """
+        while self.__end - self.__start < needed:
+            self._make_room(needed)
+            view = memoryview(self.__buffer)
+            try:
+                if self.__recv_into is not None:
+                    count = self.__recv_into(view[self.__end:])
+                else:
+                    data = self.__socket.recv(len(view) - self.__end)
+                    count = len(data)
+                    view[self.__end:self.__end + count] = data
+            finally:
+                del view
+            if not count:
+                return False
+            self.__end += count
+        return True
+
+    def _make_room(self, needed):
+        """Ensure the buffer has room for "needed" bytes and a full read."""
+        size = len(self.__buffer)
+        unread = self.__end - self.__start
+        wanted = max(needed, unread) + READ_SIZE
+        shrink = size > MAX_IDLE_READ_BUFFER and wanted <= MAX_IDLE_READ_BUFFER
+        room = size - self.__end >= READ_SIZE and size - self.__start >= needed
+        if room and not shrink:
+            return
+
+        if shrink:
+            # Don't hold on to the memory a large message needed.
+            size = READ_SIZE
+            while size < wanted:
+                size *= 2
+            buffer = bytearray(size)
+            buffer[:unread] = self.__buffer[self.__start:self.__end]
+            self.__buffer = buffer
+        elif unread and self.__start:
+            # Move the unread bytes to the front of the buffer.
+            view = memoryview(self.__buffer)
+            try:
+                view[:unread] = view[self.__start:self.__end]
+            finally:
+                del view
+        self.__start, self.__end = 0, unread
+
+        if size < wanted:
+            while size < wanted:
+                size *= 2
+            self.__buffer.extend(bytearray(size - len(self.__buffer)))
+
     def _buffered_read_line_as_ascii(self):
         """Return the next line from the buffer as a string.
 
@@ -126,40 +469,42 @@ class SocketIO(object):
         ascii decoded, newline chars are excluded from the return value.
         Blocks until: newline chars are read OR socket is closed.
         """
-        newline = '\r\n'.encode('ascii')
-        while newline not in self.__buffer:
-            temp = self.__socket.recv(1024)
-            if not temp:
+        newline = b'\r\n'
+        index = self.__buffer.find(newline, self.__start, self.__end)
+        while index < 0:
+            # Only re-scan the newly read bytes (and a possible partial
+            # newline at the end of the old ones).  Note that reading
+            # may move the unread bytes to the front of the buffer.
+            scanned = max(0, self.__end - self.__start - 1)
+            if not self._buffered_recv(self.__end - self.__start + 1):
                 break
-            self.__buffer += temp
+            index = self.__buffer.find(newline, self.__start + scanned,
+                                       self.__end)
 
-        if not self.__buffer:
+        if self.__start == self.__end:
             return None
 
-        try:
-            index = self.__buffer.index(newline)
-        except ValueError:
+        if index < 0:
             raise InvalidHeaderError('Header line not terminated')
 
-        line = self.__buffer[:index]
-        self.__buffer = self.__buffer[index+len(newline):]
+        line = self.__buffer[self.__start:index]
+        self.__start = index + len(newline)
         return line.decode('ascii', 'replace')
 
     def _buffered_read_as_utf8(self, length):
-        # TODO: docstring
-        while len(self.__buffer) < length:
-            temp = self.__socket.recv(1024)
-            if not temp:
-                break
-            self.__buffer += temp
+        """Return the next "length" bytes from the buffer, utf-8 decoded.
 
-        if len(self.__buffer) < length:
+        Blocks until: that many bytes are read OR socket is closed.
+        """
+        self._buffered_recv(length)
+        available = self.__end - self.__start
+        if available < length:
             raise InvalidContentError(
-                    'Expected to read {} bytes of content, but only read {} bytes.'.format(length, len(self.__buffer)))  # noqa
+                    'Expected to read {} bytes of content, but only read {} bytes.'.format(length, available))  # noqa
 
-        content = self.__buffer[:length]
-        self.__buffer = self.__buffer[length:]
-        return content.decode('utf-8', 'replace')
+        start = self.__start
+        self.__start += length
+        return _decode_utf8(self.__buffer, start, start + length)
 
     def _wait_for_message(self):
         # TODO: docstring
@@ -201,6 +546,8 @@ class SocketIO(object):
 
         # read content, utf-8 encoded
         content = self._buffered_read_as_utf8(length)
+        if self.__capture is not None:
+            self.__capture.record_dap(True, content)
         try:
             msg = json.loads(content)
             self._receive_message(msg)
@@ -211,6 +558,7 @@ class SocketIO(object):
 
     def _close(self):
         # TODO: docstring
+        self._close_outbound(FLUSH_TIMEOUT)
         if self.__own_socket:
             self.__socket.close()
 
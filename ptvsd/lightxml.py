@@ -0,0 +1,112 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See LICENSE in the project root
+# for license information.
+
+"""A compact XML element tree, for the XML pydevd sends.
+
+pydevd only ever sends small, regular documents, e.g.:
+
+    <xml><var name="x" type="int" value="int%253A%25201" /></xml>
+    <xml><thread id="..." ...><frame id="..." ... /></thread></xml>
+
+The document is parsed by ElementTree's C parser and the Element
+wrappers (which only have __slots__) are created when a node is actually
+touched.
+Element.iter_elements() streams the children without keeping the
+wrappers around.
+
+Malformed documents (e.g. a traceback where XML was expected) raise
+ValueError.
+"""
+
+from __future__ import print_function, with_statement, absolute_import
+
+import sys
+
+
+if sys.version_info >= (3, 0):
+    # This uses the C accelerator when available.
+    import xml.etree.ElementTree as ElementTree
+
+    def _to_source(text):
+        if isinstance(text, bytes):
+            return text.decode('utf-8')
+        return text
+else:
+    try:
+        import xml.etree.cElementTree as ElementTree
+    except ImportError:
+        import xml.etree.ElementTree as ElementTree
+
+    def _to_source(text):
+        # ElementTree only takes (UTF-8) bytes on Python 2.
+        if isinstance(text, unicode):  # noqa
+            return text.encode('utf-8')
+        return text
+
+
+class Element(object):
+    """An XML element.
+
+    Attributes are looked up with element['name'] (None if missing) and
+    children with get_elements()/iter_elements() or as Python attributes
+    (element.thread).
+    """
+
+    __slots__ = ('_element',)
+
+    def __init__(self, element):
+        self._element = element
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(type(self).__name__, self.name)
+
+    @property
+    def name(self):
+        return self._element.tag
+
+    @property
+    def attributes(self):
+        return self._element.attrib
+
+    def __getitem__(self, key):
+        return self._element.get(key)
+
+    def get(self, key, default=None):
+        return self._element.get(key, default)
+
+    def iter_elements(self, name=None):
+        """Yield the child elements (with the given name), one by one."""
+        for child in self._element:
+            if name is None or child.tag == name:
+                yield Element(child)
+
+    def get_elements(self, name=None):
+        return list(self.iter_elements(name))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        children = self.get_elements(name)
+        if not children:
+            raise AttributeError(
+                '<{}> has no child <{}>'.format(self.name, name))
+        if len(children) == 1:
+            return children[0]
+        return children
+
+    def __len__(self):
+        return len(self._element)
+
+    def __bool__(self):
+        # An element without children is still there.
+        return True
+    __nonzero__ = __bool__
+
+
+def parse(text):
+    """Return the root element of the document."""
+    try:
+        return Element(ElementTree.fromstring(_to_source(text)))
+    except ElementTree.ParseError as exc:
+        raise ValueError('malformed XML: {}'.format(exc))
@@ -3,6 +3,10 @@
 # for license information.
 
 import sys
+try:
+    from time import perf_counter as clock
+except ImportError:
+    from time import time as clock
 
 
 # Py3 compat - alias unicode to str, and xrange to range
@@ -70,23 +74,82 @@ class SafeRepr(object):
     maxother_outer = 2 ** 16
     maxother_inner = 30
 
+    # numpy arrays and pandas objects (only looked for if their module
+    # is already imported) with more items than this are shown as their
+    # type, shape and first few items, which does not depend on their
+    # size.  Smaller ones use their own repr.
+    array_types = [
+        ('numpy', 'ndarray'),
+        ('pandas', 'DataFrame'),
+        ('pandas', 'Series'),
+    ]
+    maxarray = 1000
+
+    # The whole repr stops (with '...') once it is this many characters
+    # long or has taken this many seconds (not for raw values).
+    maxtotal = 2 ** 17
+    maxtime = 0.5
+
     convert_to_hex = False
     raw_value = False
 
+    # How to repr each type (see _get_type_info), up to this many types.
+    # Subclasses that change the types above need their own cache.
+    _type_info_cache = {}
+    _type_info_cache_size = 1024
+
+    # What _is_long_iter needs to do for a type.
+    _LONG_NEVER = 0  # nothing, it is never long
+    _LONG_STR = 1  # check the length of the string
+    _LONG_ITER = 2  # check the items
+
     def __call__(self, obj):
         try:
-            return ''.join(self._repr(obj, 0))
+            parts = self._repr(obj, 0)
+            if not self.raw_value:
+                parts = self._limit(parts)
+            return ''.join(parts)
         except Exception:
             try:
                 return 'An exception was raised: %r' % sys.exc_info()[1]
             except Exception:
                 return 'An exception was raised'
 
-    def _repr(self, obj, level):
-        '''Returns an iterable of the parts in the final repr string.'''
+    def _limit(self, parts):
+        # The parts are produced as they are consumed, so no more work
+        # is done once the budget is spent.  The time is only checked
+        # every few parts, since most of them are quick.
+        remaining = self.maxtotal
+        deadline = clock() + self.maxtime
+        for i, p in enumerate(parts):
+            yield p
+            remaining -= len(p)
+            if remaining < 0 or (i & 7 == 7 and clock() > deadline):
+                yield '...'
+                return
 
+    def _get_type_info(self, obj_type):
+        '''Returns (repr method name, its extra args, long iter check)
+        for the instances of obj_type.'''
+
+        try:
+            return self._type_info_cache[obj_type]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable type.
+            return self._make_type_info(obj_type)
+
+        info = self._make_type_info(obj_type)
+        cache = self._type_info_cache
+        if len(cache) >= self._type_info_cache_size:
+            cache.clear()
+        cache[obj_type] = info
+        return info
+
+    def _make_type_info(self, obj_type):
         try:
-            obj_repr = type(obj).__repr__
+            obj_repr = obj_type.__repr__
         except Exception:
             obj_repr = None
 
@@ -97,20 +160,63 @@ class SafeRepr(object):
             except Exception:
                 return obj_repr is r
 
+        def is_a(t):
+            try:
+                return issubclass(obj_type, t)
+            except Exception:
+                return False
+
+        for mod_name, attr in self.array_types:
+            t = getattr(sys.modules.get(mod_name), attr, None)
+            if t is not None and is_a(t):
+                return '_repr_array', (), self._LONG_NEVER
+
+        # Strings have their own limits (and do not nest).
+        if is_a(self.string_types):
+            long_iter = self._LONG_STR
+        # If it's not an instance of these collection types then it is
+        # fine. Note: this is a fix for
+        # https://github.com/Microsoft/ptvsd/issues/406
+        elif not is_a(self.long_iter_types):
+            long_iter = self._LONG_NEVER
+        # xrange reprs fine regardless of length.
+        elif is_a(xrange):
+            long_iter = self._LONG_NEVER
+        else:
+            long_iter = self._LONG_ITER
+            # numpy and scipy collections (ndarray etc) have
+            # self-truncating repr, so they're always safe.
+            try:
+                module = obj_type.__module__.partition('.')[0]
+                if module in ('numpy', 'scipy'):
+                    long_iter = self._LONG_NEVER
+            except Exception:
+                pass
+
         for t, prefix, suffix, comma in self.collection_types:
-            if isinstance(obj, t) and has_obj_repr(t):
-                return self._repr_iter(obj, level, prefix, suffix, comma)
+            if is_a(t) and has_obj_repr(t):
+                return '_repr_iter', (prefix, suffix, comma), long_iter
 
         for t, prefix, suffix, item_prefix, item_sep, item_suffix in self.dict_types:  # noqa
-            if isinstance(obj, t) and has_obj_repr(t):
-                return self._repr_dict(obj, level, prefix, suffix,
-                                       item_prefix, item_sep, item_suffix)
+            if is_a(t) and has_obj_repr(t):
+                return ('_repr_dict',
+                        (prefix, suffix, item_prefix, item_sep, item_suffix),
+                        long_iter)
 
         for t in self.string_types:
-            if isinstance(obj, t) and has_obj_repr(t):
-                return self._repr_str(obj, level)
+            if is_a(t) and has_obj_repr(t):
+                return '_repr_str', (), long_iter
+
+        return None, (), long_iter
 
-        if self._is_long_iter(obj):
+    def _repr(self, obj, level):
+        '''Returns an iterable of the parts in the final repr string.'''
+
+        method, args, long_iter = self._get_type_info(type(obj))
+        if method is not None:
+            return getattr(self, method)(obj, level, *args)
+
+        if long_iter != self._LONG_NEVER and self._is_long_iter(obj):
             return self._repr_long_iter(obj)
 
         return self._repr_other(obj, level)
@@ -119,21 +225,11 @@ class SafeRepr(object):
     # maxlimits, and is therefore unsafe to repr().
     def _is_long_iter(self, obj, level=0):
         try:
-            # Strings have their own limits (and do not nest). Because
-            # they don't have __iter__ in 2.x, this check goes before
-            # the next one.
-            if isinstance(obj, self.string_types):
-                return len(obj) > self.maxstring_inner
-
-            # If it's not an iterable (and not a string), it's fine.
-            if not hasattr(obj, '__iter__'):
-                return False
-
-            # If it's not an instance of these collection types then it
-            # is fine. Note: this is a fix for
-            # https://github.com/Microsoft/ptvsd/issues/406
-            if not isinstance(obj, self.long_iter_types):
+            long_iter = self._get_type_info(type(obj))[2]
+            if long_iter == self._LONG_NEVER:
                 return False
+            if long_iter == self._LONG_STR:
+                return len(obj) > self.maxstring_inner
 
             # Iterable is its own iterator - this is a one-off iterable
             # like generator or enumerate(). We can't really count that,
@@ -142,19 +238,6 @@ class SafeRepr(object):
             if obj is iter(obj):
                 return False
 
-            # xrange reprs fine regardless of length.
-            if isinstance(obj, xrange):
-                return False
-
-            # numpy and scipy collections (ndarray etc) have
-            # self-truncating repr, so they're always safe.
-            try:
-                module = type(obj).__module__.partition('.')[0]
-                if module in ('numpy', 'scipy'):
-                    return False
-            except Exception:
-                pass
-
             # Iterables that nest too deep are considered long.
             if level >= len(self.maxcollection):
                 return True
@@ -259,6 +342,30 @@ class SafeRepr(object):
 
         yield suffix
 
+    def _repr_array(self, obj, level):
+        try:
+            if self.raw_value or obj.size <= self.maxarray:
+                return self._repr_other(obj, level)
+            count = self.maxcollection[-1]
+            if hasattr(obj, 'columns'):  # DataFrame
+                info = 'shape=%r' % (obj.shape,)
+                items = list(obj.columns[:count])
+            elif hasattr(obj, 'iloc'):  # Series
+                info = 'shape=%r, dtype=%s' % (obj.shape, obj.dtype)
+                items = obj.iloc[:count].tolist()
+            else:
+                info = 'shape=%r, dtype=%s' % (obj.shape, obj.dtype)
+                items = obj.flat[:count].tolist()
+            prefix = '%s(%s): ' % (type(obj).__name__, info)
+        except Exception:
+            return self._repr_other(obj, level)
+        return self._repr_array_preview(prefix, items, level)
+
+    def _repr_array_preview(self, prefix, items, level):
+        yield prefix
+        for p in self._repr_iter(items, level + 1, '[', ']'):
+            yield p
+
     def _repr_str(self, obj, level):
         return self._repr_obj(obj, level,
                               self.maxstring_inner, self.maxstring_outer)
@@ -4,17 +4,25 @@
 
 from __future__ import print_function, absolute_import
 
-import contextlib
+import collections
 import errno
+import heapq
 import io
+import json
+import math
 import os
 import platform
 import pydevd_file_utils
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 import re
 import site
 import socket
 import sys
 import threading
+import time
 import traceback
 try:
     import urllib
@@ -26,19 +34,20 @@ try:
 except Exception:
     pass
 import warnings
-from xml.sax import SAXParseException
 
 import _pydevd_bundle.pydevd_comm as pydevd_comm  # noqa
+import _pydevd_bundle.pydevd_constants as pydevd_constants  # noqa
 import _pydevd_bundle.pydevd_extension_api as pydevd_extapi  # noqa
 import _pydevd_bundle.pydevd_extension_utils as pydevd_extutil  # noqa
 import _pydevd_bundle.pydevd_frame as pydevd_frame # noqa
+import _pydevd_bundle.pydevd_xml as pydevd_xml  # noqa
 #from _pydevd_bundle.pydevd_comm import pydevd_log
 from _pydevd_bundle.pydevd_additional_thread_info import PyDBAdditionalThreadInfo # noqa
 
 from ptvsd import _util
 import ptvsd.ipcjson as ipcjson  # noqa
 import ptvsd.futures as futures  # noqa
-import ptvsd.untangle as untangle  # noqa
+import ptvsd.lightxml as lightxml  # noqa
 from ptvsd.pathutils import PathUnNormcase  # noqa
 from ptvsd.safe_repr import SafeRepr  # noqa
 from ptvsd.version import __version__  # noqa
@@ -47,6 +56,72 @@ from ptvsd.socket import TimeoutError  # noqa
 
 WAIT_FOR_THREAD_FINISH_TIMEOUT = 1  # seconds
 
+# Each write of program output is sent as its own event, as long as
+# no more than OUTPUT_EVENT_BURST events have gone out recently (the
+# allowance is refilled at OUTPUT_EVENT_RATE events per second).
+OUTPUT_EVENT_RATE = 100  # events per second
+OUTPUT_EVENT_BURST = 100  # events
+# Past that, writes are coalesced and sent once this many characters
+# are buffered...
+OUTPUT_FLUSH_SIZE = 16 * 1024
+# ...or this long after the first buffered write, whichever comes first.
+OUTPUT_FLUSH_DELAY = 0.05  # seconds
+# Writes that do not fit under this cap are dropped.
+OUTPUT_MAX_BUFFERED = 1024 * 1024  # characters
+
+# What to do with dropped output.
+OUTPUT_OVERFLOW_DROP = 'drop'  # silently (but count it)
+OUTPUT_OVERFLOW_SUMMARIZE = 'summarize'  # send a note in its place
+
+# How long to wait for pydevd to reply to a request (None means forever,
+# which is the default).  Evaluations run user code, so they get longer.
+PYDEVD_REQUEST_TIMEOUT = None  # seconds
+PYDEVD_REQUEST_TIMEOUTS = {
+    pydevd_comm.CMD_GET_FRAME: 30,
+    pydevd_comm.CMD_GET_THREAD_STACK: 30,
+    pydevd_comm.CMD_GET_VARIABLE: 30,
+    pydevd_comm.CMD_GET_VARIABLE_PAGE: 30,
+    pydevd_comm.CMD_GET_ARRAY: 30,
+    pydevd_comm.CMD_GET_COMPLETIONS: 30,
+    pydevd_comm.CMD_EVALUATE_EXPRESSION: 60,
+    pydevd_comm.CMD_EXEC_EXPRESSION: 60,
+    pydevd_comm.CMD_GET_VARIABLE_BATCH: 60,
+    pydevd_comm.CMD_GET_TABLE_WINDOW: 60,
+    pydevd_comm.CMD_LOAD_FULL_VALUE: 60,
+}
+# pydevd only sends this many frames with a suspend message.  Deeper
+# frames are fetched (CMD_GET_THREAD_STACK), at least this many at a
+# time, when a stackTrace request needs them.
+STACK_PAGE_SIZE = 20
+# With the PrefetchLocals debug option, pydevd also sends the locals of
+# the top frame when a thread is suspended, if there are no more than
+# this many.
+SUSPEND_LOCALS_LIMIT = 100
+# variables responses are kept until the thread is resumed (or code is
+# run that may change variables), up to this many per thread.
+VARIABLES_CACHE_SIZE = 1000
+# Hovering over a name or an attribute chain is assumed not to change
+# anything, so the results are cached like variables responses.
+HOVER_CACHED_EXPRESSION = re.compile(r'[^\W\d]\w*(\.[^\W\d]\w*)*$', re.UNICODE)
+# The watch expressions evaluated while a thread was last stopped (up to
+# this many) are fetched along with the locals when a frame's scopes are
+# requested.  Only the ones shaped like HOVER_CACHED_EXPRESSION are, so
+# that nothing is run that the user did not ask for.
+WATCH_EXPRESSIONS_SIZE = 100
+# pydevd sends this as the value of variables that took too long to get
+# (see FRAME_VARS_TIME_BUDGET_SEC in pydevd).  They are shown as lazy
+# variables, whose one child (the variable with its value, loaded with
+# CMD_LOAD_FULL_VALUE) is listed under the variable's ID followed by
+# LAZY_VALUE.
+LAZY_VALUE = object()
+# The arguments of a ptvsd_tableWindow request that are passed to pydevd
+# (CMD_GET_TABLE_WINDOW).
+TABLE_WINDOW_ARGS = ('expression', 'startRow', 'rowCount', 'startColumn',
+                     'columnCount', 'stats', 'floatFormat')
+# Late replies to abandoned requests are dropped.  This is how many of
+# their seqs are remembered.
+PYDEVD_MAX_ABANDONED = 1000
+
 
 debug = _util.debug
 
@@ -84,12 +159,14 @@ class SafeReprPresentationProvider(pydevd_extapi.StrPresentationProvider):
     """
     Computes string representation of Python values by delegating them
     to SafeRepr.
-    """
 
-    _lock = threading.Lock()
+    The values are in the format of the pydevd request they are for
+    (see pydevd_xml.get_value_format), so requests in different formats
+    can be handled at the same time.
+    """
 
     def __init__(self):
-        self.set_format({})
+        self._reprs = {}  # (hex, rawString) -> SafeRepr
 
     def can_provide(self, type_object, type_name):
         """Implements StrPresentationProvider."""
@@ -97,27 +174,19 @@ class SafeReprPresentationProvider(pydevd_extapi.StrPresentationProvider):
 
     def get_str(self, val):
         """Implements StrPresentationProvider."""
-        return self._repr(val)
+        return self.get_repr(pydevd_xml.get_value_format() or {})(val)
 
-    def set_format(self, fmt):
-        """
-        Use fmt for all future formatting operations done by this provider.
-        """
+    def get_repr(self, fmt):
+        """Return the SafeRepr for the given format."""
+        key = (bool(fmt.get('hex', False)), bool(fmt.get('rawString', False)))
+        try:
+            return self._reprs[key]
+        except KeyError:
+            pass
         safe_repr = SafeRepr()
-        safe_repr.convert_to_hex = fmt.get('hex', False)
-        safe_repr.raw_value = fmt.get('rawString', False)
-        self._repr = safe_repr
-
-    @contextlib.contextmanager
-    def using_format(self, fmt):
-        """
-        Returns a context manager that invokes set_format(fmt) on enter,
-        and restores the old format on exit.
-        """
-        old_repr = self._repr
-        self.set_format(fmt)
-        yield
-        self._repr = old_repr
+        safe_repr.convert_to_hex, safe_repr.raw_value = key
+        # SafeRepr keeps no state between calls, so it can be shared.
+        return self._reprs.setdefault(key, safe_repr)
 
 
 # Do not access directly - use safe_repr_provider() instead!
@@ -173,12 +242,137 @@ class UnsupportedPyDevdCommandError(Exception):
         self.cmdid = cmdid
 
 
+class PydevdRequestError(Exception):
+    """pydevd's reply to a request will not be waited for."""
+
+
+class PydevdRequestTimeoutError(PydevdRequestError):
+
+    def __init__(self, cmdid, timeout):
+        msg = 'pydevd did not reply to command {} within {}s'.format(
+            cmdid, timeout)
+        super(PydevdRequestTimeoutError, self).__init__(msg)
+        self.cmdid = cmdid
+        self.timeout = timeout
+
+
+class PydevdRequestCancelledError(PydevdRequestError):
+
+    def __init__(self, cmdid):
+        msg = 'request for pydevd command {} was cancelled'.format(cmdid)
+        super(PydevdRequestCancelledError, self).__init__(msg)
+        self.cmdid = cmdid
+
+
 def unquote(s):
     if s is None:
         return None
     return urllib.unquote(s)
 
 
+# pydevd responses about threads, frames and variables are either XML
+# (the default) or, if negotiated via CMD_VERSION, plain dicts (or JSON
+# text when they go through the line protocol).  These helpers return
+# the same dicts either way, with the values already unquoted.
+
+def _load_pydevd_payload(args):
+    if isinstance(args, dict):
+        return args
+    if args.startswith('{'):
+        return json.loads(args)
+    return lightxml.parse(args)
+
+
+def _xml_var_to_dict(xvar):
+    var = {
+        'name': unquote(xvar['name']),
+        'type': unquote(xvar['type']),
+        'value': unquote(xvar['value']),
+    }
+    if xvar['qualifier']:
+        var['qualifier'] = xvar['qualifier']
+    for flag in ('isContainer', 'isErrorOnEval', 'isRetVal'):
+        if xvar[flag] == 'True':
+            var[flag] = True
+    if xvar['indexedVariables']:
+        var['indexedVariables'] = int(xvar['indexedVariables'])
+    return var
+
+
+def parse_pydevd_vars(args):
+    """Return the list of variables in a pydevd response."""
+    payload = _load_pydevd_payload(args)
+    if isinstance(payload, dict):
+        return payload.get('var', [])
+    return [_xml_var_to_dict(xvar) for xvar in payload.iter_elements('var')]
+
+
+def parse_pydevd_threads(args):
+    """Return the list of threads in a pydevd response."""
+    payload = _load_pydevd_payload(args)
+    if isinstance(payload, dict):
+        return payload.get('thread', [])
+    return [{'id': xthread['id'], 'name': unquote(xthread['name'])}
+            for xthread in payload.iter_elements('thread')]
+
+
+def parse_pydevd_io(args):
+    """Return the program output in a pydevd CMD_WRITE_TO_CONSOLE."""
+    payload = _load_pydevd_payload(args)
+    if isinstance(payload, dict):
+        return payload['io']
+    return {'s': unquote(payload.io['s']), 'ctx': payload.io['ctx']}
+
+
+def parse_pydevd_suspend(args):
+    """Return the suspended thread (and its frames) in a pydevd event.
+
+    This also parses the replies to CMD_GET_THREAD_STACK.  If pydevd
+    sent only some of the frames then "frame_count" is the total.  If it
+    sent the locals of the top frame then they are in its "locals" (as
+    with parse_pydevd_vars).
+    """
+    payload = _load_pydevd_payload(args)
+    if isinstance(payload, dict):
+        return payload['thread']
+    xthread = payload.thread
+    thread = {
+        'id': xthread['id'],
+        'stop_reason': int(xthread['stop_reason']),
+        'frame': [{'id': int(xframe['id']),
+                   'name': unquote(xframe['name']),
+                   'file': unquote(xframe['file']),
+                   'line': int(xframe['line'])}
+                  for xframe in xthread.iter_elements('frame')],
+    }
+    if xthread['frame_count']:
+        thread['frame_count'] = int(xthread['frame_count'])
+    for frame, xframe in zip(thread['frame'], xthread.iter_elements('frame')):
+        for xlocals in xframe.iter_elements('locals'):
+            frame['locals'] = [_xml_var_to_dict(xvar)
+                               for xvar in xlocals.iter_elements('var')]
+    return thread
+
+
+def parse_pydevd_batch(args):
+    """Return the results in a reply to CMD_GET_VARIABLE_BATCH.
+
+    There is one for each requested item: a list of variables (as with
+    parse_pydevd_vars), or None if pydevd could not get it.
+    """
+    payload = _load_pydevd_payload(args)
+    if isinstance(payload, dict):
+        return [result.get('var') for result in payload.get('result', [])]
+    return [None if xresult['error'] else
+            [_xml_var_to_dict(xvar) for xvar in xresult.iter_elements('var')]
+            for xresult in payload.iter_elements('result')]
+
+
+# The errors raised by the above helpers for malformed payloads (both
+# lightxml and json raise ValueError).
+PAYLOAD_ERRORS = (ValueError,)
+
+
 class IDMap(object):
     """Maps VSCode entities to corresponding pydevd entities by ID.
 
@@ -231,8 +425,7 @@ class IDMap(object):
             if callable(pydevd_id):
                 pydevd_id = pydevd_id(vscode_id)
             self._next_id += 1
-            self._vscode_to_pydevd[vscode_id] = pydevd_id
-            self._pydevd_to_vscode[pydevd_id] = vscode_id
+            self._add(pydevd_id, vscode_id)
         return vscode_id
 
     def remove(self, pydevd_id=None, vscode_id=None):
@@ -242,8 +435,17 @@ class IDMap(object):
                 pydevd_id = self._vscode_to_pydevd[vscode_id]
             elif vscode_id is None:
                 vscode_id = self._pydevd_to_vscode[pydevd_id]
-            del self._vscode_to_pydevd[vscode_id]
-            del self._pydevd_to_vscode[pydevd_id]
+            self._remove(pydevd_id, vscode_id)
+
+    def _add(self, pydevd_id, vscode_id):
+        # Called with the lock held.
+        self._vscode_to_pydevd[vscode_id] = pydevd_id
+        self._pydevd_to_vscode[pydevd_id] = vscode_id
+
+    def _remove(self, pydevd_id, vscode_id):
+        # Called with the lock held.
+        del self._vscode_to_pydevd[vscode_id]
+        del self._pydevd_to_vscode[pydevd_id]
 
     def to_pydevd(self, vscode_id):
         # TODO: docstring
@@ -272,6 +474,41 @@ class IDMap(object):
         return ids
 
 
+class ScopedIDMap(IDMap):
+    """An IDMap whose pydevd IDs are tuples that start with a scope.
+
+    The IDs are also kept by scope (the pydevd thread ID, for frames and
+    variables), so that all the IDs of a scope can be removed without
+    going through those of the other scopes.
+    """
+
+    def __init__(self):
+        super(ScopedIDMap, self).__init__()
+        self._scopes = {}  # scope -> set of VSCode IDs
+
+    def remove_scope(self, scope):
+        """Remove all the IDs in the given scope."""
+        with self._lock:
+            vscode_ids = self._scopes.pop(scope, ())
+            for vscode_id in vscode_ids:
+                pydevd_id = self._vscode_to_pydevd.pop(vscode_id)
+                # It may have been added again (under another ID).
+                if self._pydevd_to_vscode.get(pydevd_id) == vscode_id:
+                    del self._pydevd_to_vscode[pydevd_id]
+        return len(vscode_ids)
+
+    def _add(self, pydevd_id, vscode_id):
+        super(ScopedIDMap, self)._add(pydevd_id, vscode_id)
+        self._scopes.setdefault(pydevd_id[0], set()).add(vscode_id)
+
+    def _remove(self, pydevd_id, vscode_id):
+        super(ScopedIDMap, self)._remove(pydevd_id, vscode_id)
+        vscode_ids = self._scopes[pydevd_id[0]]
+        vscode_ids.discard(vscode_id)
+        if not vscode_ids:
+            del self._scopes[pydevd_id[0]]
+
+
 class ExceptionInfo(object):
     # TODO: docstring
 
@@ -282,6 +519,124 @@ class ExceptionInfo(object):
         self.source = source
 
 
+class SuspendedStack(object):
+    """The frames of a suspended thread received from pydevd so far.
+
+    pydevd sends only the top frames with the suspend message.  The
+    rest are added as they are fetched, so "frames" is always a prefix
+    of the thread's stack (of "frame_count" frames).  "user_frames" are
+    the ones among them that are not internal.
+
+    The DAP frames built for stackTrace responses are kept in
+    "dap_frames", keyed by pydevd frame ID and format, since they stay
+    valid until the thread is resumed (and this object is dropped).
+    Likewise the variables responses are kept in "dap_variables" (in
+    the order they were added), but these are also dropped when code is
+    run that may change them.  The watch results fetched along with a
+    frame's locals are kept there too, until they are used.
+
+    "prefetched" maps the pydevd IDs of the frames whose locals were
+    fetched ahead to a future that is done once they are in the cache.
+    """
+
+    def __init__(self, frames, frame_count, is_user_frame):
+        self.frames = []
+        self.user_frames = []
+        self.frame_count = frame_count
+        self.dap_frames = {}
+        self.dap_variables = collections.OrderedDict()
+        self.prefetched = {}
+        self._is_user_frame = is_user_frame
+        self.extend(frames)
+
+    @property
+    def complete(self):
+        return len(self.frames) >= self.frame_count
+
+    @property
+    def total_user_frames(self):
+        # The frames not fetched yet are counted as user frames.
+        missing = max(self.frame_count - len(self.frames), 0)
+        return len(self.user_frames) + missing
+
+    def extend(self, frames):
+        # TODO: docstring
+        self.frames.extend(frames)
+        self.user_frames.extend(f for f in frames if self._is_user_frame(f))
+
+
+class LatencyHistogram(object):
+    """Counts durations (in seconds) in exponentially sized buckets.
+
+    Percentiles are approximate: each is the upper bound of the bucket
+    it falls in (capped at the slowest duration seen).
+    """
+
+    # The first bucket is for everything under 100us.  Each of the rest
+    # goes up to twice the previous one, and the last is open-ended.
+    FIRST_BUCKET = 0.0001
+    NUM_BUCKETS = 24
+
+    def __init__(self):
+        self._counts = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        # TODO: docstring
+        if elapsed <= self.FIRST_BUCKET:
+            index = 0
+        else:
+            index = int(math.ceil(math.log(elapsed / self.FIRST_BUCKET, 2)))
+            index = min(index, self.NUM_BUCKETS - 1)
+        self._counts[index] += 1
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def percentile(self, pct):
+        """Return the duration under which pct percent of them fall."""
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * pct / 100.0)))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                break
+        if index == self.NUM_BUCKETS - 1:
+            return self.max
+        return min(self.FIRST_BUCKET * 2 ** index, self.max)
+
+    @property
+    def stats(self):
+        """A snapshot of the count, mean, max and percentiles."""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class _PydevdSocketReader(io.RawIOBase):
+    """A raw stream over PydevdSocket.recv_into()."""
+
+    def __init__(self, sock):
+        super(_PydevdSocketReader, self).__init__()
+        self._sock = sock
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        return self._sock.recv_into(buf)
+
+
 class PydevdSocket(object):
     """A dummy socket-like object for communicating with pydevd.
 
@@ -289,23 +644,52 @@ class PydevdSocket(object):
     callback.  It also provides an interface to send notifications and
     requests to pydevd; for requests, the reply can be asynchronously
     awaited.
+
+    By default commands are passed to and from pydevd as objects, through
+    recv_command() and send_command().  If "structured" is False then
+    they go through an OS pipe using the pydevd line protocol instead.
+
+    Requests may time out or be cancelled, in which case any late reply
+    is dropped.  The time each command takes to be answered is tracked
+    (see request_stats()).
     """
 
-    def __init__(self, handle_msg, handle_close, getpeername, getsockname):
+    def __init__(self, handle_msg, handle_close, getpeername, getsockname,
+                 structured=True, capture=None):
         #self.log = open('pydevd.log', 'w')
         self._handle_msg = handle_msg
         self._handle_close = handle_close
         self._getpeername = getpeername
         self._getsockname = getsockname
+        # A capture.Recorder, if the session is being recorded.
+        self._capture = capture
 
         self.lock = threading.Lock()
         self.seq = 1000000000
-        self.pipe_r, self.pipe_w = os.pipe()
+        if structured:
+            self.pipe_r = self.pipe_w = None
+            self._commands = queue.Queue()
+            self._unread = b''  # for recv() on the structured path
+        else:
+            self.pipe_r, self.pipe_w = os.pipe()
+            self._commands = None
+            # pydevd only uses these when they are set.
+            self.recv_command = self.send_command = None
+        # seq -> (loop, fut, cmd_id, start)
         self.requests = {}
+        self._deadlines = []  # a heap of (deadline, seq, timeout)
+        self._abandoned = collections.OrderedDict()  # seq -> cmd_id
+        self._command_stats = {}
+        self._wakeup = threading.Condition(self.lock)
+        self._watchdog = None
 
         self._closed = False
         self._closing = False
 
+    @property
+    def structured(self):
+        return self._commands is not None
+
     def close(self):
         """Mark the socket as closed and release any resources."""
         if self._closing:
@@ -316,6 +700,11 @@ class PydevdSocket(object):
                 return
             self._closing = True
 
+            # Stop the watchdog.
+            self._wakeup.notify_all()
+            if self._commands is not None:
+                # Wake up the reader.
+                self._commands.put(None)
             if self.pipe_w is not None:
                 pipe_w = self.pipe_w
                 self.pipe_w = None
@@ -348,12 +737,35 @@ class PydevdSocket(object):
         """Return the socket's own address."""
         return self._getsockname()
 
+    def recv_command(self):
+        """Return the next (cmd_id, seq, args) sent to pydevd.
+
+        This is where pydevd gets requests when "structured" is set.
+        None is returned once the socket is closed.
+        """
+        command = self._commands.get()
+        if command is None:
+            # Make sure any later calls see it too.
+            self._commands.put(None)
+        return command
+
     def recv(self, count):
         """Return the requested number of bytes.
 
         This is where the "socket" sends requests to pydevd.  The data
         must follow the pydevd line protocol.
         """
+        if self._commands is not None:
+            # Fall back to the line protocol for pydevd's sake.
+            if not self._unread:
+                command = self.recv_command()
+                if command is None:
+                    return b''
+                line = self._format_line(*command)
+                self._unread = line.encode('utf8')
+            data = self._unread[:count]
+            self._unread = self._unread[count:]
+            return data
         pipe_r = self.pipe_r
         if pipe_r is None:
             return b''
@@ -363,6 +775,10 @@ class PydevdSocket(object):
         return data
 
     def recv_into(self, buf):
+        if self._commands is not None:
+            data = self.recv(len(buf))
+            buf[:len(data)] = data
+            return len(data)
         pipe_r = self.pipe_r
         if pipe_r is None:
             return 0
@@ -391,49 +807,222 @@ class PydevdSocket(object):
         #self.log.write('<<<[' + data + ']\n\n')
         #self.log.flush()
         cmd_id, seq, args = data.split('\t', 2)
-        cmd_id = int(cmd_id)
-        seq = int(seq)
-        _util.log_pydevd_msg(cmd_id, seq, args, inbound=True)
-        with self.lock:
-            loop, fut = self.requests.pop(seq, (None, None))
-        if fut is None:
-            self._handle_msg(cmd_id, seq, args)
-        else:
-            loop.call_soon_threadsafe(fut.set_result, (cmd_id, seq, args))
+        self._handle_command(int(cmd_id), int(seq), args)
         return result
 
-    def makefile(self, *args, **kwargs):
-        """Return a file-like wrapper around the socket."""
-        return os.fdopen(self.pipe_r)
+    def send_command(self, cmd_id, seq, args):
+        """Handle the given command from pydevd.
+
+        This is the structured alternative to send(), so the args are
+        not quoted.
+        """
+        if isinstance(args, bytes):
+            args = args.decode('utf8')
+        self._handle_command(cmd_id, seq, args)
+
+    def makefile(self, mode='r', *args, **kwargs):
+        """Return a file-like wrapper around the socket.
+
+        Reading it yields the pydevd line protocol, the same as recv().
+        A binary file is returned if "b" is in the mode.
+        """
+        if self._commands is None:
+            return os.fdopen(self.pipe_r, mode)
+        reader = io.BufferedReader(_PydevdSocketReader(self))
+        if 'b' in mode:
+            return reader
+        return io.TextIOWrapper(reader, encoding='utf8')
 
     def make_packet(self, cmd_id, args):
         # TODO: docstring
-        with self.lock:
-            seq = self.seq
-            self.seq += 1
-        s = u'{}\t{}\t{}\n'.format(cmd_id, seq, args)
-        return seq, s
+        seq = self._next_seq()
+        return seq, self._format_line(cmd_id, seq, args)
 
     def pydevd_notify(self, cmd_id, args):
         # TODO: docstring
-        if self.pipe_w is None:
-            raise EOFError
-        seq, s = self.make_packet(cmd_id, args)
+        seq = self._next_seq()
         _util.log_pydevd_msg(cmd_id, seq, args, inbound=False)
-        os.write(self.pipe_w, s.encode('utf8'))
+        with self.lock:
+            self._write(cmd_id, seq, args)
+            self._record(cmd_id, seq, args, inbound=False)
 
-    def pydevd_request(self, loop, cmd_id, args):
-        # TODO: docstring
-        if self.pipe_w is None:
-            raise EOFError
-        seq, s = self.make_packet(cmd_id, args)
+    def pydevd_request(self, loop, cmd_id, args,
+                       priority=futures.PRIORITY_NORMAL, timeout=None):
+        """Send a request to pydevd and return a future for the reply.
+
+        If pydevd has not replied after "timeout" seconds (by default
+        the one for the command in PYDEVD_REQUEST_TIMEOUTS) then the
+        future fails with PydevdRequestTimeoutError.
+        """
+        if timeout is None:
+            timeout = PYDEVD_REQUEST_TIMEOUTS.get(cmd_id,
+                                                  PYDEVD_REQUEST_TIMEOUT)
+        seq = self._next_seq()
         _util.log_pydevd_msg(cmd_id, seq, args, inbound=False)
-        fut = loop.create_future()
+        fut = loop.create_future(priority)
         with self.lock:
-            self.requests[seq] = loop, fut
-            os.write(self.pipe_w, s.encode('utf8'))
+            self._write(cmd_id, seq, args)
+            self._record(cmd_id, seq, args, inbound=False)
+            # The reply cannot be handled until the lock is released.
+            start = time.time()
+            self.requests[seq] = loop, fut, cmd_id, start
+            if timeout is not None:
+                heapq.heappush(self._deadlines,
+                               (start + timeout, seq, timeout))
+                self._ensure_watchdog()
+                self._wakeup.notify()
         return fut
 
+    def pydevd_cancel(self, fut):
+        """Stop waiting for the reply to the request behind the future.
+
+        The future fails with PydevdRequestCancelledError.  False is
+        returned if the request was already resolved.
+        """
+        with self.lock:
+            for seq, request in self.requests.items():
+                if request[1] is fut:
+                    break
+            else:
+                return False
+            loop, _, cmd_id, _ = self._abandon(seq, 'cancelled')
+        exc = PydevdRequestCancelledError(cmd_id)
+        loop.call_soon_threadsafe(fut.set_exc_info, (type(exc), exc, None),
+                                  priority=fut.priority)
+        return True
+
+    def request_stats(self):
+        """Return the reply latency (in seconds) and counters by command.
+
+        "timeouts" and "cancelled" count abandoned requests and "late"
+        counts replies that came in after that.
+        """
+        with self.lock:
+            commands = {}
+            for cmd_id, stats in self._command_stats.items():
+                name = pydevd_comm.ID_TO_MEANING.get(str(cmd_id), cmd_id)
+                commands[name] = dict(stats['latency'].stats,
+                                      timeouts=stats['timeouts'],
+                                      cancelled=stats['cancelled'],
+                                      late=stats['late'])
+            return {
+                'pending': len(self.requests),
+                'commands': commands,
+            }
+
+    # internal methods
+
+    def _next_seq(self):
+        with self.lock:
+            seq = self.seq
+            self.seq += 1
+        return seq
+
+    def _write(self, cmd_id, seq, args):
+        # This must be called while holding the lock.
+        if self._closing or self._closed:
+            raise EOFError
+        if self._commands is not None:
+            self._commands.put((int(cmd_id), seq, u'{}'.format(args)))
+        else:
+            s = self._format_line(cmd_id, seq, args)
+            os.write(self.pipe_w, s.encode('utf8'))
+
+    def _record(self, cmd_id, seq, args, inbound):
+        if self._capture is None:
+            return
+        if isinstance(args, bytes):
+            args = args.decode('utf8')
+        elif not inbound:
+            # This is how _write() sends it.
+            args = u'{}'.format(args)
+        self._capture.record_pydevd(inbound, cmd_id, seq, args)
+
+    @staticmethod
+    def _format_line(cmd_id, seq, args):
+        return u'{}\t{}\t{}\n'.format(cmd_id, seq, args)
+
+    def _handle_command(self, cmd_id, seq, args):
+        _util.log_pydevd_msg(cmd_id, seq, args, inbound=True)
+        self._record(cmd_id, seq, args, inbound=True)
+        with self.lock:
+            request = self.requests.pop(seq, None)
+            if request is not None:
+                _, _, req_cmd_id, start = request
+                stats = self._stats_for(req_cmd_id)
+                stats['latency'].add(time.time() - start)
+            elif seq in self._abandoned:
+                req_cmd_id = self._abandoned.pop(seq)
+                self._stats_for(req_cmd_id)['late'] += 1
+                return
+        if request is None:
+            self._handle_msg(cmd_id, seq, args)
+        else:
+            loop, fut, _, _ = request
+            loop.call_soon_threadsafe(fut.set_result, (cmd_id, seq, args),
+                                      priority=fut.priority)
+
+    def _stats_for(self, cmd_id):
+        # This must be called while holding the lock.
+        cmd_id = int(cmd_id)
+        try:
+            return self._command_stats[cmd_id]
+        except KeyError:
+            stats = self._command_stats[cmd_id] = {
+                'latency': LatencyHistogram(),
+                'timeouts': 0,
+                'cancelled': 0,
+                'late': 0,
+            }
+            return stats
+
+    def _abandon(self, seq, reason):
+        # This must be called while holding the lock.
+        request = self.requests.pop(seq)
+        cmd_id = request[2]
+        self._stats_for(cmd_id)[reason] += 1
+        self._abandoned[seq] = cmd_id
+        while len(self._abandoned) > PYDEVD_MAX_ABANDONED:
+            self._abandoned.popitem(last=False)
+        return request
+
+    def _ensure_watchdog(self):
+        # This must be called while holding the lock.
+        if self._watchdog is not None:
+            return
+        self._watchdog = _util.new_hidden_thread(
+            target=self._watch,
+            name='pydevd.requests',
+        )
+        self._watchdog.start()
+
+    def _watch(self):
+        while True:
+            expired = []
+            with self.lock:
+                while True:
+                    if self._closing or self._closed:
+                        return
+                    now = time.time()
+                    while self._deadlines and self._deadlines[0][0] <= now:
+                        _, seq, timeout = heapq.heappop(self._deadlines)
+                        if seq not in self.requests:
+                            # It was already resolved.
+                            continue
+                        request = self._abandon(seq, 'timeouts')
+                        expired.append((request, timeout))
+                    if expired:
+                        break
+                    if self._deadlines:
+                        self._wakeup.wait(self._deadlines[0][0] - now)
+                    else:
+                        self._wakeup.wait()
+            for (loop, fut, cmd_id, _), timeout in expired:
+                exc = PydevdRequestTimeoutError(cmd_id, timeout)
+                loop.call_soon_threadsafe(fut.set_exc_info,
+                                          (type(exc), exc, None),
+                                          priority=fut.priority)
+
 
 class ExceptionsManager(object):
     def __init__(self, proc):
@@ -586,12 +1175,32 @@ class VariablesSorter(object):
 
 
 class ModulesManager(object):
+    """Tracks the modules that frames were seen in, for "module" events.
+
+    Modules are looked up by file in an index of sys.modules, keyed by
+    normalized __file__.  The index is kept up to date by diffing
+    sys.modules against what was indexed (by identity, so only new
+    modules get their path computed), which also finds unloaded ones.
+    Between stops the diff is skipped if sys.modules has the same size
+    and the same indexed modules as last time; a lookup that misses
+    always redoes it.
+    """
+
     def __init__(self, proc):
         self.module_id_to_details = {}
         self.path_to_module_id = {}
         self._lock = threading.Lock()
         self.proc = proc
         self._next_id = 1
+        self._is_windows = platform.system() == 'Windows'
+        # normalized __file__ -> names of the modules loaded from it
+        self._index = {}
+        # name -> (module, normalized __file__) for what is in the index
+        self._indexed = {}
+        # len(sys.modules) as of the last refresh
+        self._modules_count = None
+        # normalized paths found unloaded but not yet reported
+        self._removed = set()
 
     def add_or_get_from_path(self, module_path):
         with self._lock:
@@ -602,101 +1211,445 @@ class ModulesManager(object):
                 pass
 
             search_path = self._get_platform_file_path(module_path)
-            for _, value in list(sys.modules.items()):
-                try:
-                    path = self._get_platform_file_path(value.__file__)
-                except AttributeError:
-                    path = None
-
-                if path and search_path == path:
-                    module_id = self._next_id
-                    self._next_id += 1
-
-                    module = {
-                        'id': module_id,
-                        'package': value.__package__,
-                        'path': module_path,
-                    }
+            value = self._find_module(search_path)
+            if value is None:
+                # It may have been imported since the last refresh.
+                self._removed.update(self._refresh_index(rescan=True))
+                value = self._find_module(search_path)
+                if value is None:
+                    return None
+
+            module_id = self._next_id
+            self._next_id += 1
 
-                    try:
-                        module['name'] = value.__qualname__
-                    except AttributeError:
-                        module['name'] = value.__name__
+            module = {
+                'id': module_id,
+                'package': value.__package__,
+                'path': module_path,
+            }
 
-                    try:
-                        module['version'] = value.__version__
-                    except AttributeError:
-                        pass
+            try:
+                module['name'] = value.__qualname__
+            except AttributeError:
+                module['name'] = value.__name__
 
-                    self.path_to_module_id[module_path] = module_id
-                    self.module_id_to_details[module_id] = module
+            try:
+                module['version'] = value.__version__
+            except AttributeError:
+                pass
 
-                    self.proc.send_event('module', reason='new', module=module)
-                    return module
+            self.path_to_module_id[module_path] = module_id
+            self.module_id_to_details[module_id] = module
 
-        return None
+            self.proc.send_event('module', reason='new', module=module)
+            return module
 
     def _get_platform_file_path(self, path):
-        if platform.system() == 'Windows':
+        if self._is_windows:
             return path.lower()
         return path
 
+    def _find_module(self, search_path):
+        # This must be called while holding the lock.
+        names = self._index.get(search_path)
+        if not names:
+            return None
+        return self._indexed[names[0]][0]
+
+    def _refresh_index(self, rescan=False):
+        """Bring the index up to date with sys.modules.
+
+        Return the normalized paths that no module is loaded from any
+        more.  Unless rescan is true, nothing is done when sys.modules
+        looks unchanged.  This must be called while holding the lock.
+        """
+        modules = sys.modules
+        indexed = self._indexed
+        if not rescan and len(modules) == self._modules_count and all(
+                modules.get(name) is value
+                for name, (value, _) in indexed.items()):
+            # Nothing was imported or unloaded since the last refresh.
+            return []
+        current = dict(modules)
+        dropped = set()
+        for name in list(indexed):
+            value, path = indexed[name]
+            if current.get(name) is not value:
+                del indexed[name]
+                names = self._index[path]
+                names.remove(name)
+                if not names:
+                    del self._index[path]
+                    dropped.add(path)
+        for name, value in current.items():
+            if name in indexed or value is None:
+                continue
+            try:
+                path = self._get_platform_file_path(value.__file__)
+            except (AttributeError, TypeError):
+                continue
+            if path:
+                indexed[name] = (value, path)
+                self._index.setdefault(path, []).append(name)
+        self._modules_count = len(current)
+        # A module that was replaced (e.g. reloaded) is still there.
+        return [path for path in dropped if path not in self._index]
+
     def get_all(self):
         with self._lock:
             return list(self.module_id_to_details.values())
 
-    def check_unloaded_modules(self, module_event):
-        pass
+    def check_unloaded_modules(self):
+        """Send "module" events for reported modules that were unloaded."""
+        with self._lock:
+            self._removed.update(self._refresh_index())
+            # A path may have been loaded again since it was found unloaded.
+            removed = self._removed - set(self._index)
+            self._removed.clear()
+            if not removed:
+                return
+            for module_path in list(self.path_to_module_id):
+                if self._get_platform_file_path(module_path) in removed:
+                    module_id = self.path_to_module_id.pop(module_path)
+                    module = self.module_id_to_details.pop(module_id)
+                    self.proc.send_event('module', reason='removed',
+                                         module=module)
+
+
+class OutputBuffer(object):
+    """Turns program output into "output" events without flooding.
+
+    write() only appends to the buffer.  A flusher thread (started on
+    the first write) does the sending.  While the client is getting no
+    more than event_rate events per second (in bursts of up to
+    event_burst), each write is sent as its own event.  Past that, the
+    writes are coalesced: what has been buffered is sent once
+    flush_size characters are pending or flush_delay seconds after the
+    first write, whichever comes first.  Consecutive writes to the same
+    category are merged in order, and only where a write ends a line
+    (a trailing partial line waits one more round for the rest).
+
+    At most max_buffered characters are held.  Writes that do not fit
+    (e.g. because the client is not keeping up) are dropped and, with
+    the "summarize" overflow policy, a note about how much was dropped
+    is sent in their place.  A write into an empty buffer is always
+    kept, however large, so a single big print is never lost.
+    """
+
+    def __init__(self, send,
+                 flush_size=OUTPUT_FLUSH_SIZE,
+                 flush_delay=OUTPUT_FLUSH_DELAY,
+                 max_buffered=OUTPUT_MAX_BUFFERED,
+                 overflow=OUTPUT_OVERFLOW_SUMMARIZE,
+                 event_rate=OUTPUT_EVENT_RATE,
+                 event_burst=OUTPUT_EVENT_BURST):
+        self._send = send
+        self._settings = {}
+        self._cond = threading.Condition()
+        self.configure(
+            flush_size=flush_size,
+            flush_delay=flush_delay,
+            max_buffered=max_buffered,
+            overflow=overflow,
+            event_rate=event_rate,
+            event_burst=event_burst,
+        )
+
+        # (category, text) or, for dropped output, (None, size)
+        self._pending = collections.deque()
+        self._buffered = 0
+        self._first_write = None
+        # Set while a partial line is held back for the rest of it.
+        self._holding = False
+        self._tokens = float(event_burst)
+        self._refilled = time.time()
+        # Held while sending so that batches cannot overtake each other.
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self._counters = {
+            'writes': 0,
+            'emitted': 0,
+            'dropped': 0,
+            'dropped_writes': 0,
+            'events': 0,
+            'max_buffered': 0,
+        }
+
+    @property
+    def stats(self):
+        """A snapshot of the counters (sizes are in characters)."""
+        with self._cond:
+            stats = dict(self._counters)
+            stats['buffered'] = self._buffered
+        return stats
+
+    def configure(self, **settings):
+        """Change the given settings (named like the __init__ args)."""
+        overflow = settings.get('overflow', OUTPUT_OVERFLOW_SUMMARIZE)
+        if overflow not in (OUTPUT_OVERFLOW_DROP, OUTPUT_OVERFLOW_SUMMARIZE):
+            raise ValueError('unsupported overflow policy {!r}'
+                             .format(overflow))
+        with self._cond:
+            for name, value in settings.items():
+                setattr(self, '_' + name, value)
+            self._cond.notify_all()
+
+    def write(self, category, text):
+        """Buffer the output (or drop it if the buffer is full)."""
+        if not text:
+            return
+        size = len(text)
+        with self._cond:
+            if self._closed:
+                send_now = True
+            else:
+                send_now = False
+                self._counters['writes'] += 1
+                overflow = self._buffered + size > self._max_buffered
+                if self._buffered and overflow:
+                    self._drop(size)
+                else:
+                    self._pending.append((category, text))
+                    self._buffered += size
+                if self._buffered > self._counters['max_buffered']:
+                    self._counters['max_buffered'] = self._buffered
+                if self._first_write is None and self._pending:
+                    self._first_write = time.time()
+                    self._ensure_thread()
+                    self._cond.notify_all()
+                elif self._buffered >= self._flush_size:
+                    self._cond.notify_all()
+        if send_now:
+            # After close() output goes out right away.
+            self._emit([(category, text)])
+
+    def flush(self):
+        """Send whatever has been buffered, on the calling thread."""
+        self._flush(True)
+
+    def close(self):
+        """Send whatever has been buffered and stop the flusher thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(WAIT_FOR_THREAD_FINISH_TIMEOUT)
+        self.flush()
+
+    # internal methods
+
+    def _drop(self, size):
+        self._counters['dropped'] += size
+        self._counters['dropped_writes'] += 1
+        if self._overflow != OUTPUT_OVERFLOW_SUMMARIZE:
+            return
+        if self._pending and self._pending[-1][0] is None:
+            self._pending[-1] = (None, self._pending[-1][1] + size)
+        else:
+            self._pending.append((None, size))
+
+    def _refill(self, now):
+        elapsed = max(now - self._refilled, 0)
+        self._refilled = now
+        self._tokens = min(self._tokens + elapsed * self._event_rate,
+                           self._event_burst)
+        return self._tokens
+
+    def _can_send_each(self, now):
+        # Whether every pending write can go out as its own event.
+        return len(self._pending) <= self._refill(now)
+
+    def _is_due(self, now):
+        if self._buffered >= self._flush_size:
+            return True
+        return now >= self._first_write + self._flush_delay
+
+    def _take(self, everything):
+        # Return the events to send: one per write while the rate allows
+        # it, otherwise (once due) the writes coalesced.
+        now = time.time()
+        if self._can_send_each(now):
+            events = list(self._pending)
+            self._tokens -= len(events)
+            self._pending.clear()
+            self._buffered = 0
+            self._first_write = None
+            self._holding = False
+            return events
+        events = []
+        if not everything and not self._is_due(now):
+            return events
+
+        groups = []
+        for category, text in self._pending:
+            if groups and groups[-1][0] == category:
+                if category is None:
+                    groups[-1][1] += text
+                else:
+                    groups[-1][1].append(text)
+            elif category is None:
+                groups.append([None, text])
+            else:
+                groups.append([category, [text]])
+        full = self._buffered >= self._flush_size
+        self._pending.clear()
+        self._buffered = 0
+        self._first_write = None
+
+        # Don't split a line between two events if the rest of it may be
+        # on its way.  A line that has not grown since the last round
+        # goes out anyway, so one that is never finished is not stuck.
+        category, texts = groups[-1]
+        if category is not None and not everything:
+            ends = [i for i, text in enumerate(texts) if text.endswith('\n')]
+            if ends:
+                rest = texts[ends[-1] + 1:]
+            elif not self._holding and not full:
+                rest = texts[:]
+            else:
+                rest = []
+            if rest:
+                del texts[len(texts) - len(rest):]
+                if not texts:
+                    groups.pop()
+                self._pending.extend((category, text) for text in rest)
+                self._buffered = sum(len(text) for text in rest)
+                self._first_write = now
+        self._holding = bool(self._pending)
+
+        for category, texts in groups:
+            if category is None:
+                events.append((None, texts))
+            else:
+                events.append((category, ''.join(texts)))
+        return events
+
+    def _flush(self, everything):
+        with self._send_lock:
+            with self._cond:
+                events = self._take(everything)
+            self._emit(events)
+
+    def _emit(self, events):
+        emitted = sent = 0
+        for category, output in events:
+            if category is None:
+                category = 'console'
+                output = '[{} characters of output dropped]\n'.format(output)
+            else:
+                emitted += len(output)
+            try:
+                self._send(category, output)
+            except Exception:
+                traceback.print_exc(file=sys.__stderr__)
+                continue
+            sent += 1
+        if events:
+            # Only take the lock once, so writers are not held up.
+            with self._cond:
+                self._counters['emitted'] += emitted
+                self._counters['events'] += sent
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        self._thread = _util.new_hidden_thread(
+            target=self._run,
+            name='output',
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._first_write is None:
+                        # Nothing buffered (or someone else flushed it).
+                        self._cond.wait()
+                        continue
+                    now = time.time()
+                    if self._can_send_each(now) or self._is_due(now):
+                        break
+                    self._cond.wait(
+                        self._first_write + self._flush_delay - now)
+                else:
+                    # close() sends the rest.
+                    return
+            self._flush(False)
 
 
 class InternalsFilter(object):
     """Identifies debugger internal artifacts.
+
+    A path is internal if it ends with one of the ignored files or
+    starts with one of the ignored path prefixes.  Both lists are
+    compiled into a single regex (matched against the path with "/" as
+    the separator, ignoring case on Windows), and the results are
+    cached.  More of either can be added with add().
     """
     # TODO: Move the internal thread identifier here
-    def __init__(self):
-        if platform.system() == 'Windows':
-            self._init_windows()
-        else:
-            self._init_default()
 
-    def _init_default(self):
+    # The cache is cleared when it gets bigger than this.
+    CACHE_SIZE = 4096
+
+    def __init__(self):
         self._ignore_files = [
             '/ptvsd_launcher.py',
         ]
-
         self._ignore_path_prefixes = [
             os.path.dirname(os.path.abspath(__file__)),
         ]
+        self._is_windows = platform.system() == 'Windows'
+        self._lock = threading.Lock()
+        self._compile()
 
-    def _init_windows(self):
-        self._init_default()
-        files = []
-        for f in self._ignore_files:
-            files.append(f.lower())
-        self._ignore_files = files
-
-        prefixes = []
-        for p in self._ignore_path_prefixes:
-            prefixes.append(p.lower())
-        self._ignore_path_prefixes = prefixes
+    def add(self, files=(), path_prefixes=()):
+        """Also treat the given files and directories as internal."""
+        with self._lock:
+            # An empty entry would match every path.
+            self._ignore_files.extend(f for f in files if f)
+            self._ignore_path_prefixes.extend(p for p in path_prefixes if p)
+            self._compile()
+
+    def _compile(self):
+        # This must be called while holding the lock (or in __init__).
+        # The lookups in is_internal_path() do not need it.
+        def to_regex(path):
+            return re.escape(path.replace('\\', '/'))
+        alternatives = []
+        if self._ignore_path_prefixes:
+            alternatives.append('(?:{})'.format('|'.join(
+                to_regex(p) for p in self._ignore_path_prefixes)))
+        if self._ignore_files:
+            # match() with ".*" is a lot faster than search() with "$".
+            alternatives.append('.*(?:{})\\Z'.format('|'.join(
+                to_regex(f) for f in self._ignore_files)))
+        flags = re.DOTALL
+        if self._is_windows:
+            flags |= re.IGNORECASE
+        # With nothing to ignore, the regex never matches.
+        self._match = re.compile('|'.join(alternatives) or '(?!)',
+                                 flags).match
+        self._cache = {}
 
     def is_internal_path(self, abs_file_path):
         # TODO: Remove replace('\\', '/') after the path mapping in pydevd
         # is fixed. Currently if the client is windows and server is linux
         # the path separators used are windows path separators for linux
         # source paths.
-        is_windows = platform.system() == 'Windows'
-
-        file_path = abs_file_path.lower() if is_windows else abs_file_path
-        file_path = file_path.replace('\\', '/')
-        for f in self._ignore_files:
-            if file_path.endswith(f):
-                return True
-        for prefix in self._ignore_path_prefixes:
-            prefix_path = prefix.replace('\\', '/')
-            if file_path.startswith(prefix_path):
-                return True
-        return False
+        cache = self._cache
+        try:
+            return cache[abs_file_path]
+        except KeyError:
+            pass
+        file_path = abs_file_path.replace('\\', '/')
+        result = self._match(file_path) is not None
+        if len(cache) >= self.CACHE_SIZE:
+            cache.clear()
+        cache[abs_file_path] = result
+        return result
 
 
 ########################
@@ -706,6 +1659,12 @@ def bool_parser(str):
     return str in ("True", "true", "1")
 
 
+def output_overflow_parser(str):
+    if str not in (OUTPUT_OVERFLOW_DROP, OUTPUT_OVERFLOW_SUMMARIZE):
+        raise ValueError('unsupported overflow policy {!r}'.format(str))
+    return str
+
+
 DEBUG_OPTIONS_PARSER = {
     'WAIT_ON_ABNORMAL_EXIT': bool_parser,
     'WAIT_ON_NORMAL_EXIT': bool_parser,
@@ -718,6 +1677,24 @@ DEBUG_OPTIONS_PARSER = {
     'FIX_FILE_PATH_CASE': bool_parser,
     'CLIENT_OS_TYPE': unquote,
     'DEBUG_STDLIB': bool_parser,
+    'PREFETCH_LOCALS': bool_parser,
+    'OUTPUT_EVENT_RATE': float,
+    'OUTPUT_EVENT_BURST': int,
+    'OUTPUT_FLUSH_SIZE': int,
+    'OUTPUT_FLUSH_DELAY': float,
+    'OUTPUT_MAX_BUFFERED': int,
+    'OUTPUT_OVERFLOW': output_overflow_parser,
+}
+
+
+# The debug options that configure the OutputBuffer.
+OUTPUT_DEBUG_OPTIONS = {
+    'OUTPUT_EVENT_RATE': 'event_rate',
+    'OUTPUT_EVENT_BURST': 'event_burst',
+    'OUTPUT_FLUSH_SIZE': 'flush_size',
+    'OUTPUT_FLUSH_DELAY': 'flush_delay',
+    'OUTPUT_MAX_BUFFERED': 'max_buffered',
+    'OUTPUT_OVERFLOW': 'overflow',
 }
 
 
@@ -732,6 +1709,7 @@ DEBUG_OPTIONS_BY_FLAG = {
     'DebugStdLib': 'DEBUG_STDLIB=True',
     'WindowsClient': 'CLIENT_OS_TYPE=WINDOWS',
     'UnixClient': 'CLIENT_OS_TYPE=UNIX',
+    'PrefetchLocals': 'PREFETCH_LOCALS=True',
 }
 
 
@@ -782,6 +1760,13 @@ def _parse_debug_options(opts):
         DJANGO_DEBUG=True|False
         CLIENT_OS_TYPE=WINDOWS|UNIX
         DEBUG_STDLIB=True|False
+        PREFETCH_LOCALS=True|False
+        OUTPUT_EVENT_RATE=float (events per second)
+        OUTPUT_EVENT_BURST=int (events)
+        OUTPUT_FLUSH_SIZE=int (characters)
+        OUTPUT_FLUSH_DELAY=float (seconds)
+        OUTPUT_MAX_BUFFERED=int (characters)
+        OUTPUT_OVERFLOW=drop|summarize
     """
     options = {}
     if not opts:
@@ -794,7 +1779,7 @@ def _parse_debug_options(opts):
             continue
         try:
             options[key] = DEBUG_OPTIONS_PARSER[key](value)
-        except KeyError:
+        except (KeyError, ValueError):
             continue
 
     if 'CLIENT_OS_TYPE' not in options:
@@ -813,13 +1798,16 @@ class VSCodeMessageProcessorBase(ipcjson.SocketIO, ipcjson.IpcChannel):
     """The base class for VSC message processors."""
 
     def __init__(self, socket, notify_closing,
-                 timeout=None, logfile=None, own_socket=False
+                 timeout=None, logfile=None, own_socket=False,
+                 capture=None,
                  ):
         super(VSCodeMessageProcessorBase, self).__init__(
             socket=socket,
             own_socket=False,
             timeout=timeout,
             logfile=logfile,
+            capture=capture,
+            max_pending=ipcjson.MAX_PENDING,
         )
         self.socket = socket
         self._own_socket = own_socket
@@ -942,6 +1930,8 @@ class VSCodeMessageProcessorBase(ipcjson.SocketIO, ipcjson.IpcChannel):
     def _stop_vsc_message_loop(self):
         self.set_exit()
         self._stop_event_loop()
+        # Make sure everything we sent makes it out before we close.
+        self._close_outbound(ipcjson.FLUSH_TIMEOUT)
         if self.socket is not None and self._own_socket:
             try:
                 self.socket.shutdown(socket.SHUT_RDWR)
@@ -961,8 +1951,10 @@ class VSCodeMessageProcessorBase(ipcjson.SocketIO, ipcjson.IpcChannel):
 
 
 INITIALIZE_RESPONSE = dict(
+    supportsCancelRequest=True,
     supportsConditionalBreakpoints=True,
     supportsConfigurationDoneRequest=True,
+    supportsDelayedStackTraceLoading=True,
     supportsDebuggerProperties=True,
     supportsEvaluateForHovers=True,
     supportsExceptionInfoRequest=True,
@@ -998,12 +1990,14 @@ class VSCLifecycleMsgProcessor(VSCodeMessageProcessorBase):
                  notify_disconnecting, notify_closing,
                  notify_launch=None, notify_ready=None,
                  timeout=None, logfile=None, debugging=True,
+                 capture=None,
                  ):
         super(VSCLifecycleMsgProcessor, self).__init__(
             socket=socket,
             notify_closing=notify_closing,
             timeout=timeout,
             logfile=logfile,
+            capture=capture,
         )
         self._notify_launch = notify_launch or NOOP
         self._notify_ready = notify_ready or NOOP
@@ -1065,6 +2059,7 @@ class VSCLifecycleMsgProcessor(VSCodeMessageProcessorBase):
 
         # If we are exiting then pydevd must have stopped.
         self._ensure_debugger_stopped()
+        self._flush_outbound(ipcjson.FLUSH_TIMEOUT)
 
         if self._exitlock is not None:
             _util.lock_release(self._exitlock)
@@ -1113,6 +2108,8 @@ class VSCLifecycleMsgProcessor(VSCodeMessageProcessorBase):
                 return
             self.send_response(request)
             status['sent'] = True
+            # The socket may be closed as soon as we return.
+            self._flush_outbound(ipcjson.FLUSH_TIMEOUT)
 
         self._notify_disconnecting(
             pre_socket_close=disconnect_response,
@@ -1194,6 +2191,7 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
                  notify_debugger_ready,
                  notify_disconnecting, notify_closing,
                  timeout=None, logfile=None,
+                 pydevd_cancel=None, pydevd_stats=None, capture=None,
                  ):
         super(VSCodeMessageProcessor, self).__init__(
             socket=socket,
@@ -1201,9 +2199,12 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
             notify_closing=notify_closing,
             timeout=timeout,
             logfile=logfile,
+            capture=capture,
         )
         self._pydevd_notify = pydevd_notify
         self._pydevd_request = pydevd_request
+        self._pydevd_cancel = pydevd_cancel
+        self._pydevd_stats = pydevd_stats
         self._notify_debugger_ready = notify_debugger_ready
 
         self.loop = None
@@ -1212,13 +2213,20 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         # debugger state
         self.is_process_created = False
         self.is_process_created_lock = threading.Lock()
+        self.payload_format = pydevd_comm.PAYLOAD_XML
         self.stack_traces = {}
         self.stack_traces_lock = threading.Lock()
+        self.stack_frame_stats = {'hits': 0, 'misses': 0}
+        self.variables_stats = {'hits': 0, 'misses': 0}
+        # The watch expressions evaluated during the current and the
+        # previous stop.
+        self.watch_expressions = collections.OrderedDict()
+        self.last_watch_expressions = ()
         self.active_exceptions = {}
         self.active_exceptions_lock = threading.Lock()
         self.thread_map = IDMap()
-        self.frame_map = IDMap()
-        self.var_map = IDMap()
+        self.frame_map = ScopedIDMap()
+        self.var_map = ScopedIDMap()
         self.bp_map = IDMap()
         self.source_map = IDMap()
         self.enable_source_references = False
@@ -1229,12 +2237,32 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         self.internals_filter = InternalsFilter()
         self.new_thread_lock = threading.Lock()
 
+        # DAP requests being handled asynchronously:
+        # seq -> the pydevd request futures they are waiting on
+        self._pending_requests = {}
+        self._cancelled_requests = set()
+        self._pending_requests_lock = threading.Lock()
+
         # adapter state
         self.path_casing = PathUnNormcase()
         self._detached = False
+        self.output = OutputBuffer(self._send_output)
+
+    def _stop_vsc_message_loop(self):
+        # Send any buffered output before the client socket is closed.
+        self.output.close()
+        super(VSCodeMessageProcessor, self)._stop_vsc_message_loop()
+
+    def handle_exiting(self, exitcode=None, wait=None):
+        # The program's last output must come before the "exited" event.
+        self.output.flush()
+        super(VSCodeMessageProcessor, self).handle_exiting(exitcode, wait)
+
+    def _send_output(self, category, output):
+        self.send_event('output', category=category, output=output)
 
     def _start_event_loop(self):
-        self.loop = futures.EventLoop()
+        self.loop = futures.new_event_loop()
         self.event_loop_thread = _util.new_hidden_thread(
             target=self.loop.run_forever,
             name='EventLoop',
@@ -1257,15 +2285,36 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         return f
 
     def async_handler(m):
-        """Converts a generator method into a fire-and-forget async one."""
+        """Converts a generator method into a fire-and-forget async one.
+
+        When handling a DAP request, an error response is sent if a
+        pydevd request it was waiting on timed out or was cancelled.
+        """
         m = futures.wrap_async(m)
 
         def f(self, *args, **kwargs):
+            request = args[0] if args else None
+            if not isinstance(request, dict) or \
+                    request.get('type') != 'request':
+                # It is a pydevd event (or an internal call).
+                request = None
+            else:
+                with self._pending_requests_lock:
+                    self._pending_requests[request['seq']] = set()
             fut = m(self, self.loop, *args, **kwargs)
 
             def done(fut):
+                if request is not None:
+                    with self._pending_requests_lock:
+                        del self._pending_requests[request['seq']]
+                        self._cancelled_requests.discard(request['seq'])
                 try:
                     fut.result()
+                except PydevdRequestError as exc:
+                    if request is None:
+                        traceback.print_exc(file=sys.__stderr__)
+                    else:
+                        self.send_error_response(request, str(exc))
                 except BaseException:
                     traceback.print_exc(file=sys.__stderr__)
 
@@ -1273,11 +2322,6 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
 
         return f
 
-    def sleep(self):
-        fut = futures.Future(self.loop)
-        self.loop.call_soon(lambda: fut.set_result(None))
-        return fut
-
     # PyDevd "socket" entry points (and related helpers)
 
     def pydevd_notify(self, cmd_id, args):
@@ -1288,9 +2332,37 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
             traceback.print_exc(file=sys.__stderr__)
             raise
 
-    def pydevd_request(self, cmd_id, args):
-        # TODO: docstring
-        return self._pydevd_request(self.loop, cmd_id, args)
+    def pydevd_request(self, cmd_id, args, priority=futures.PRIORITY_NORMAL,
+                       request=None, fmt=None):
+        """Send a request to pydevd and return a future for the reply.
+
+        If "request" (a DAP request) is given then the pydevd request is
+        abandoned if the client cancels it.  If "fmt" (a DAP value
+        format) is given then the values in the reply are in it.
+        """
+        if fmt:
+            args = u'{}\t{}'.format(json.dumps(fmt, sort_keys=True), args)
+        if request is None:
+            return self._pydevd_request(self.loop, cmd_id, args, priority)
+
+        with self._pending_requests_lock:
+            if request['seq'] in self._cancelled_requests:
+                fut = self.loop.create_future(priority)
+                exc = PydevdRequestCancelledError(cmd_id)
+                fut.set_exc_info((type(exc), exc, None))
+                return fut
+            fut = self._pydevd_request(self.loop, cmd_id, args, priority)
+            pending = self._pending_requests.get(request['seq'])
+            if pending is not None:
+                pending.add(fut)
+
+        def done(fut):
+            with self._pending_requests_lock:
+                pending = self._pending_requests.get(request['seq'])
+                if pending is not None:
+                    pending.discard(fut)
+        fut.add_done_callback(done)
+        return fut
 
     # Instances of this class provide decorators to mark methods as
     # handlers for various # pydevd messages - a decorated method is
@@ -1316,23 +2388,6 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         else:
             return None
 
-    @staticmethod
-    def parse_xml_response(args):
-        return untangle.parse(io.BytesIO(args.encode('utf8'))).xml
-
-    @async_method
-    def using_format(self, fmt):
-        while not SafeReprPresentationProvider._lock.acquire(False):
-            yield self.sleep()
-        provider = SafeReprPresentationProvider._instance
-
-        @contextlib.contextmanager
-        def context():
-            with provider.using_format(fmt):
-                yield
-            provider._lock.release()
-        yield futures.Result(context())
-
     def _wait_for_pydevd_ready(self):
         # TODO: Call self._ensure_pydevd_requests_handled?
         pass
@@ -1367,6 +2422,12 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         if opts.get('FIX_FILE_PATH_CASE', False):
             self.path_casing.enable()
 
+        self.output.configure(**{
+            name: opts[key]
+            for key, name in OUTPUT_DEBUG_OPTIONS.items()
+            if key in opts
+        })
+
         if opts.get('REDIRECT_OUTPUT', False):
             redirect_output = 'STDOUT\tSTDERR'
         else:
@@ -1429,24 +2490,42 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         if len(self._path_mappings) > 0:
             pydevd_file_utils.setup_client_server_paths(self._path_mappings)
 
+    @async_method
     def _send_cmd_version_command(self):
         cmd = pydevd_comm.CMD_VERSION
         default_os_type = 'WINDOWS' if platform.system() == 'Windows' else 'UNIX' # noqa
         client_os_type = self.debug_options.get(
             'CLIENT_OS_TYPE', default_os_type)
         os_id = client_os_type
-        msg = '1.1\t{}\tID'.format(os_id)
-        return self.pydevd_request(cmd, msg)
+        # Ask for plain (non-XML) payloads for threads, frames and variables.
+        # Only the top frames are sent when a thread is suspended.
+        msg = '1.1\t{}\tID\t{}\t{}'.format(os_id, pydevd_comm.PAYLOAD_JSON,
+                                           STACK_PAGE_SIZE)
+        if self.debug_options.get('PREFETCH_LOCALS', False):
+            msg += '\t{}'.format(SUSPEND_LOCALS_LIMIT)
+        _, _, resp_args = yield self.pydevd_request(cmd, msg)
+        # pydevd adds the payload format to its version if it accepted it.
+        if pydevd_comm.PAYLOAD_JSON in resp_args.split('\t')[1:]:
+            self.payload_format = pydevd_comm.PAYLOAD_JSON
+
+    def _initialize_internals_filter(self, args):
+        # Teams can hide their own framework internals too.
+        self.internals_filter.add(
+            files=args.get('internalFiles', ()),
+            path_prefixes=args.get('internalPaths', ()),
+        )
 
     @async_handler
     def _handle_attach(self, args):
         yield self._send_cmd_version_command()
         self._initialize_path_maps(args)
+        self._initialize_internals_filter(args)
 
     @async_handler
     def _handle_launch(self, args):
         yield self._send_cmd_version_command()
         self._initialize_path_maps(args)
+        self._initialize_internals_filter(args)
 
     def _handle_detach(self):
         debug('detaching')
@@ -1499,26 +2578,17 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         _, _, resp_args = yield self.pydevd_request(cmd, '')
 
         try:
-            xml = self.parse_xml_response(resp_args)
-        except SAXParseException as ex:
+            pyd_threads = parse_pydevd_threads(resp_args)
+        except PAYLOAD_ERRORS:
             self.send_error_response(request)
             return
 
-        try:
-            xthreads = xml.thread
-        except AttributeError:
-            xthreads = []
-
         threads = []
         with self.new_thread_lock:
-            for xthread in xthreads:
-                try:
-                    name = unquote(xthread['name'])
-                except KeyError:
-                    name = None
-
+            for pyd_thread in pyd_threads:
+                name = pyd_thread.get('name')
                 if not is_debugger_internal_thread(name):
-                    pyd_tid = xthread['id']
+                    pyd_tid = pyd_thread['id']
                     try:
                         vsc_tid = self.thread_map.to_vscode(pyd_tid,
                                                             autogen=False)
@@ -1580,67 +2650,106 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         levels = int(args.get('levels', 0))
         fmt = args.get('format', {})
 
-        pyd_tid = self.thread_map.to_pydevd(vsc_tid)
+        try:
+            pyd_tid = self.thread_map.to_pydevd(vsc_tid)
+        except KeyError:
+            self.send_error_response(request)
+            return
         with self.stack_traces_lock:
-            try:
-                xframes = self.stack_traces[pyd_tid]
-            except KeyError:
-                # This means the stack was requested before the
-                # thread was suspended
-                xframes = []
-        totalFrames = len(xframes)
+            stack = self.stack_traces.get(pyd_tid)
+        if stack is None:
+            # This means the stack was requested before the
+            # thread was suspended
+            self.send_response(request, stackFrames=[], totalFrames=0)
+            return
 
-        if levels == 0:
-            levels = totalFrames
+        # startFrame and levels count user frames.
+        end = startFrame + levels if levels > 0 else None
+        while not stack.complete:
+            if end is None:
+                count = None
+            else:
+                count = end - len(stack.user_frames)
+                if count <= 0:
+                    break
+                count = max(count, STACK_PAGE_SIZE)
+            yield self._load_stack_frames(pyd_tid, stack, count, request)
 
+        fmt_key = tuple(sorted(fmt.items()))
         stackFrames = []
-        for xframe in xframes:
-            if startFrame > 0:
-                startFrame -= 1
-                continue
+        misses = 0
+        for pyd_frame in stack.user_frames[startFrame:end]:
+            key = (pyd_frame['id'], fmt_key)
+            try:
+                frame = stack.dap_frames[key]
+            except KeyError:
+                frame = stack.dap_frames[key] = self._build_stack_frame(
+                    pyd_tid, pyd_frame, fmt)
+                misses += 1
+            stackFrames.append(frame)
 
-            if levels <= 0:
-                break
-            levels -= 1
-
-            key = (pyd_tid, int(xframe['id']))
-            fid = self.frame_map.to_vscode(key, autogen=True)
-            name = unquote(xframe['name'])
-            # pydevd encodes if necessary and then uses urllib.quote.
-            norm_path = self.path_casing.un_normcase(unquote(str(xframe['file'])))  # noqa
-            source_reference = self.get_source_reference(norm_path)
-            if not self.internals_filter.is_internal_path(norm_path):
-                module = self.modules_mgr.add_or_get_from_path(norm_path)
-            else:
-                module = None
-            line = int(xframe['line'])
-            frame_name = self._format_frame_name(
-                fmt,
-                name,
-                module,
-                line,
-                norm_path)
-
-            stackFrames.append({
-                'id': fid,
-                'name': frame_name,
-                'source': {
-                    'path': norm_path,
-                    'sourceReference': source_reference
-                },
-                'line': line, 'column': 1,
-            })
+        with self.stack_traces_lock:
+            self.stack_frame_stats['hits'] += len(stackFrames) - misses
+            self.stack_frame_stats['misses'] += misses
+        self.send_response(request,
+                           stackFrames=stackFrames,
+                           totalFrames=stack.total_user_frames)
+
+    def _build_stack_frame(self, pyd_tid, pyd_frame, fmt):
+        key = (pyd_tid, int(pyd_frame['id']))
+        fid = self.frame_map.to_vscode(key, autogen=True)
+        name = pyd_frame['name']
+        norm_path = self.path_casing.un_normcase(str(pyd_frame['file']))
+        source_reference = self.get_source_reference(norm_path)
+        module = self.modules_mgr.add_or_get_from_path(norm_path)
+        line = int(pyd_frame['line'])
+        frame_name = self._format_frame_name(
+            fmt,
+            name,
+            module,
+            line,
+            norm_path)
+
+        return {
+            'id': fid,
+            'name': frame_name,
+            'source': {
+                'path': norm_path,
+                'sourceReference': source_reference
+            },
+            'line': line, 'column': 1,
+        }
 
-        user_frames = []
-        for frame in stackFrames:
-            if not self.internals_filter.is_internal_path(
-                frame['source']['path']):
-                user_frames.append(frame)
+    @async_method
+    def _load_stack_frames(self, pyd_tid, stack, count, request=None):
+        """Fetch the next "count" frames (None means all) of the stack."""
+        start = len(stack.frames)
+        if not start:
+            # There is no frame to page from, so the stack is empty.
+            stack.frame_count = 0
+            return
+        cmd = pydevd_comm.CMD_GET_THREAD_STACK
+        msg = '{}\t{}\t{}\t{}'.format(pyd_tid, stack.frames[0]['id'], start,
+                                      '' if count is None else count)
+        _, _, resp_args = yield self.pydevd_request(cmd, msg, request=request)
 
-        totalFrames = len(user_frames)
-        self.send_response(request,
-                           stackFrames=user_frames,
-                           totalFrames=totalFrames)
+        try:
+            pyd_frames = parse_pydevd_suspend(resp_args)['frame']
+        except PAYLOAD_ERRORS:
+            # The thread was resumed (or pydevd does not know the
+            # command), so there is nothing more to get.
+            pyd_frames = []
+        if len(stack.frames) != start:
+            # Another request already got them.
+            return
+        if pyd_frames:
+            stack.extend(pyd_frames)
+        else:
+            stack.frame_count = len(stack.frames)
+
+    def _is_user_frame(self, pyd_frame):
+        norm_path = self.path_casing.un_normcase(str(pyd_frame['file']))
+        return not self.internals_filter.is_internal_path(norm_path)
 
     def _format_frame_name(self, fmt, name, module, line, path):
         frame_name = name
@@ -1663,7 +2772,6 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
 
         return frame_name
 
-    @async_handler
     def on_scopes(self, request, args):
         # TODO: docstring
         vsc_fid = int(args['frameId'])
@@ -1675,8 +2783,105 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
             'expensive': False,
             'variablesReference': vsc_var,
         }
+        # The client asks for the locals (and the watch expressions)
+        # next, so they are all fetched now, in one pydevd request.  The
+        # requests for them wait for it, but this response does not.
+        # Only a pydevd that accepted JSON payloads knows that request.
+        if self.payload_format == pydevd_comm.PAYLOAD_JSON:
+            fut = self._prefetch_frame(vsc_fid, pyd_var)
+            fut.add_done_callback(
+                lambda fut: self._prefetch_done(fut, vsc_fid, vsc_var,
+                                                pyd_var))
         self.send_response(request, scopes=[scope])
 
+    def _prefetch_done(self, fut, vsc_fid, vsc_var, pyd_var):
+        """Report a failed prefetch and forget what it cached."""
+        try:
+            fut.result()
+            return
+        except BaseException:
+            # Nothing else waits on the result (as with async_handler).
+            traceback.print_exc(file=sys.__stderr__)
+        pyd_tid, pyd_fid, _ = pyd_var
+        with self.stack_traces_lock:
+            stack = self.stack_traces.get(pyd_tid)
+            if stack is None:
+                return
+            # The next scopes request tries again, and until then the
+            # requests for the locals and watches go to pydevd.
+            stack.prefetched.pop(pyd_fid, None)
+            cache = stack.dap_variables
+            cache.pop((vsc_var, (), None, None, None), None)
+            for key in list(cache):
+                if key[:2] == ('watch', vsc_fid):
+                    del cache[key]
+
+    @async_method
+    def _prefetch_frame(self, vsc_fid, pyd_var):
+        """Put the locals and watch results of the frame in the cache."""
+        pyd_tid, pyd_fid, _ = pyd_var
+        vsc_var = self.var_map.to_vscode(pyd_var, autogen=True)
+        key = (vsc_var, (), None, None, None)
+        with self.stack_traces_lock:
+            stack = self.stack_traces.get(pyd_tid)
+            if stack is None:
+                return
+            pending = stack.prefetched.get(pyd_fid)
+            cache = stack.dap_variables
+            # The locals may have come with the suspend message.
+            has_locals = key in cache
+            exprs = list(self.last_watch_expressions)
+            if pending is None:
+                if has_locals and not exprs:
+                    return
+                done = stack.prefetched[pyd_fid] = self.loop.create_future()
+        if pending is not None:
+            yield pending
+            return
+
+        items = [] if has_locals else [{'var': [pyd_var[2]]}]
+        items.extend({'evaluate': expr} for expr in exprs)
+        msg = '{}\t{}\t{}'.format(pyd_tid, pyd_fid, json.dumps(items))
+        try:
+            try:
+                _, _, resp_args = yield self.pydevd_request(
+                    pydevd_comm.CMD_GET_VARIABLE_BATCH, msg)
+                results = parse_pydevd_batch(resp_args)
+            except PAYLOAD_ERRORS + (PydevdRequestError,):
+                # The requests for them are sent as usual.
+                return
+
+            entries = []
+            if not has_locals:
+                pyd_vars = results.pop(0) if results else None
+                if pyd_vars is not None:
+                    variables = self._build_variables(pyd_var, pyd_vars)
+                    entries.append((key, variables))
+            for expr, pyd_vars in zip(exprs, results):
+                if pyd_vars:
+                    response = self._build_evaluate_response(
+                        pyd_tid, pyd_fid, expr, pyd_vars[0])
+                    entries.append((('watch', vsc_fid, expr), response))
+            with self.stack_traces_lock:
+                cache.update(entries)
+                while len(cache) > VARIABLES_CACHE_SIZE:
+                    cache.popitem(last=False)
+        finally:
+            done.set_result(None)
+
+    def on_cancel(self, request, args):
+        """Handles DAP CancelRequest."""
+        seq = args.get('requestId')
+        with self._pending_requests_lock:
+            pending = self._pending_requests.get(seq)
+            if pending is not None:
+                self._cancelled_requests.add(seq)
+                pending = list(pending)
+        if pending and self._pydevd_cancel is not None:
+            for fut in pending:
+                self._pydevd_cancel(fut)
+        self.send_response(request)
+
     @async_handler
     def on_variables(self, request, args):
         """Handles DAP VariablesRequest."""
@@ -1690,31 +2895,94 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
             self.send_error_response(request)
             return
 
-        if len(pyd_var) == 3:
+        key = (vsc_var, tuple(sorted(fmt.items())), args.get('filter'),
+               args.get('start'), args.get('count'))
+        with self.stack_traces_lock:
+            stack = self.stack_traces.get(pyd_var[0])
+            # This is the cache the response goes in (it is replaced
+            # when invalidated, so stale responses are dropped).
+            cache = None if stack is None else stack.dap_variables
+            variables = None if cache is None else cache.get(key)
+            pending = None
+            if variables is None and stack is not None and \
+                    len(pyd_var) == 3 and key[1:] == ((), None, None, None):
+                # The locals may be on their way (see on_scopes).
+                pending = stack.prefetched.get(pyd_var[1])
+        if pending is not None:
+            yield pending
+            with self.stack_traces_lock:
+                variables = cache.get(key)
+        with self.stack_traces_lock:
+            if variables is None:
+                self.variables_stats['misses'] += 1
+            else:
+                self.variables_stats['hits'] += 1
+        if variables is not None:
+            self.send_response(request, variables=variables)
+            return
+
+        # Containers with indexedVariables are paged by the client, which
+        # asks for their items ("indexed") and other fields ("named")
+        # separately.
+        var_filter = args.get('filter')
+        lazy = pyd_var[-1] is LAZY_VALUE
+        if lazy:
+            pyd_var = pyd_var[:-1]
+            cmd = pydevd_comm.CMD_LOAD_FULL_VALUE
+            cmdargs = [str(s) for s in pyd_var[:2]]
+            cmdargs.append('\t'.join(str(s) for s in pyd_var[2:]))
+            var_filter = None
+        elif len(pyd_var) == 3:
             cmd = pydevd_comm.CMD_GET_FRAME
+            cmdargs = [str(s) for s in pyd_var]
+            var_filter = None
+        elif var_filter in ('indexed', 'named'):
+            cmd = pydevd_comm.CMD_GET_VARIABLE_PAGE
+            count = args.get('count') or ''
+            cmdargs = [str(s) for s in pyd_var[:3]]
+            cmdargs += [var_filter, str(args.get('start', 0)), str(count)]
+            cmdargs += [str(s) for s in pyd_var[3:]]
         else:
             cmd = pydevd_comm.CMD_GET_VARIABLE
-        cmdargs = (str(s) for s in pyd_var)
+            cmdargs = [str(s) for s in pyd_var]
+            var_filter = None
         msg = '\t'.join(cmdargs)
-        with (yield self.using_format(fmt)):
-            _, _, resp_args = yield self.pydevd_request(cmd, msg)
+        _, _, resp_args = yield self.pydevd_request(cmd, msg,
+                                                    request=request, fmt=fmt)
 
         try:
-            xml = self.parse_xml_response(resp_args)
-        except SAXParseException as ex:
+            pyd_vars = parse_pydevd_vars(resp_args)
+        except PAYLOAD_ERRORS:
             self.send_error_response(request)
             return
 
-        try:
-            xvars = xml.var
-        except AttributeError:
-            xvars = []
-
-        variables = VariablesSorter()
-        for xvar in xvars:
-            var_name = unquote(xvar['name'])
-            var_type = unquote(xvar['type'])
-            var_value = unquote(xvar['value'])
+        if lazy:
+            # The one child is the variable itself.
+            for pyd_var_info in pyd_vars:
+                pyd_var_info['name'] = pyd_var[-1]
+            pyd_var = pyd_var[:-1]
+        variables = self._build_variables(pyd_var, pyd_vars, var_filter)
+        self._cache_variables(cache, key, variables)
+        self.send_response(request, variables=variables)
+
+    def _cache_variables(self, cache, key, value):
+        if cache is None:
+            return
+        with self.stack_traces_lock:
+            cache[key] = value
+            if len(cache) > VARIABLES_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    def _build_variables(self, pyd_var, pyd_vars, var_filter=None):
+        # Items come in index order, which is kept.
+        if var_filter == 'indexed':
+            variables = []
+        else:
+            variables = VariablesSorter()
+        for pyd_var_info in pyd_vars:
+            var_name = pyd_var_info['name']
+            var_type = pyd_var_info['type']
+            var_value = pyd_var_info.get('value')
             var = {
                 'name': var_name,
                 'type': var_type,
@@ -1724,10 +2992,18 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
             if self._is_raw_string(var_type):
                 var['presentationHint'] = {'attributes': ['rawString']}
 
-            if bool(xvar['isContainer']):
+            if var_value == pydevd_constants.DEFAULT_VALUE:
+                var['value'] = '...'
+                var.setdefault('presentationHint', {})['lazy'] = True
+                pyd_child = pyd_var + (var_name, LAZY_VALUE)
+                var['variablesReference'] = self.var_map.to_vscode(
+                    pyd_child, autogen=True)
+            elif pyd_var_info.get('isContainer'):
                 pyd_child = pyd_var + (var_name,)
                 var['variablesReference'] = self.var_map.to_vscode(
                     pyd_child, autogen=True)
+                if 'indexedVariables' in pyd_var_info:
+                    var['indexedVariables'] = pyd_var_info['indexedVariables']
 
             eval_name = self._get_variable_evaluate_name(pyd_var, var_name)
             if eval_name:
@@ -1735,7 +3011,16 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
 
             variables.append(var)
 
-        self.send_response(request, variables=variables.get_sorted_variables())
+        if var_filter != 'indexed':
+            variables = variables.get_sorted_variables()
+        return variables
+
+    def _invalidate_variables(self):
+        # Running code in one thread may change what the variables of
+        # any suspended thread show.
+        with self.stack_traces_lock:
+            for stack in self.stack_traces.values():
+                stack.dap_variables = collections.OrderedDict()
 
     def _is_raw_string(self, var_type):
         return var_type in ('str', 'unicode', 'bytes', 'bytearray')
@@ -1794,6 +3079,9 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         var_name = args['name']
         var_value = args['value']
         fmt = args.get('format', {})
+        if pyd_var[-1] is LAZY_VALUE:
+            # The child of a lazy variable is the variable itself.
+            pyd_var = pyd_var[:-2]
 
         lhs_expr = self._get_variable_evaluate_name(pyd_var, var_name)
         if not lhs_expr:
@@ -1812,37 +3100,39 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         vsc_var = self.var_map.to_vscode(pyd_var, autogen=True)
 
         cmd_args = [pyd_tid, pyd_fid, 'LOCAL', expr, '1']
-        with (yield self.using_format(fmt)):
-            yield self.pydevd_request(
-                pydevd_comm.CMD_EXEC_EXPRESSION,
-                '\t'.join(cmd_args),
-            )
+        yield self.pydevd_request(
+            pydevd_comm.CMD_EXEC_EXPRESSION,
+            '\t'.join(cmd_args),
+            fmt=fmt,
+        )
+        self._invalidate_variables()
 
         cmd_args = [pyd_tid, pyd_fid, 'LOCAL', lhs_expr, '1']
-        with (yield self.using_format(fmt)):
-            _, _, resp_args = yield self.pydevd_request(
-                pydevd_comm.CMD_EVALUATE_EXPRESSION,
-                '\t'.join(cmd_args),
-            )
+        _, _, resp_args = yield self.pydevd_request(
+            pydevd_comm.CMD_EVALUATE_EXPRESSION,
+            '\t'.join(cmd_args),
+            fmt=fmt,
+        )
 
         try:
-            xml = self.parse_xml_response(resp_args)
-        except SAXParseException as ex:
+            pyd_vars = parse_pydevd_vars(resp_args)
+        except PAYLOAD_ERRORS:
             self.send_error_response(request)
             return
 
-        try:
-            xvar = xml.var
-        except AttributeError:
+        if not pyd_vars:
             self.send_response(request, success=False)
             return
+        pyd_var_info = pyd_vars[0]
 
         response = {
-            'type': unquote(xvar['type']),
-            'value': unquote(xvar['value']),
+            'type': pyd_var_info['type'],
+            'value': pyd_var_info.get('value'),
         }
-        if bool(xvar['isContainer']):
+        if pyd_var_info.get('isContainer'):
             response['variablesReference'] = vsc_var
+            if 'indexedVariables' in pyd_var_info:
+                response['indexedVariables'] = pyd_var_info['indexedVariables']
 
         self.send_response(request, **response)
 
@@ -1856,50 +3146,76 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
 
         vsc_fid = int(args['frameId'])
         pyd_tid, pyd_fid = self.frame_map.to_pydevd(vsc_fid)
+        context = args.get('context', '')
+
+        if context == 'watch':
+            response = yield self._get_watch_response(
+                pyd_tid, pyd_fid, vsc_fid, expr, fmt)
+            if response is not None:
+                self.send_response(request, **response)
+                return
+
+        cache = key = None
+        if context == 'hover' and HOVER_CACHED_EXPRESSION.match(expr):
+            key = ('hover', vsc_fid, expr, tuple(sorted(fmt.items())))
+            with self.stack_traces_lock:
+                stack = self.stack_traces.get(pyd_tid)
+                cache = None if stack is None else stack.dap_variables
+                response = None if cache is None else cache.get(key)
+                if response is None:
+                    self.variables_stats['misses'] += 1
+                else:
+                    self.variables_stats['hits'] += 1
+            if response is not None:
+                self.send_response(request, **response)
+                return
 
         cmd_args = (pyd_tid, pyd_fid, 'LOCAL', expr, '1')
         msg = '\t'.join(str(s) for s in cmd_args)
-        with (yield self.using_format(fmt)):
-            _, _, resp_args = yield self.pydevd_request(
-                pydevd_comm.CMD_EVALUATE_EXPRESSION,
-                msg)
+        _, _, resp_args = yield self.pydevd_request(
+            pydevd_comm.CMD_EVALUATE_EXPRESSION,
+            msg,
+            request=request,
+            fmt=fmt)
+        # Code run in the REPL may change variables.
+        if context == 'repl':
+            self._invalidate_variables()
 
         try:
-            xml = self.parse_xml_response(resp_args)
-        except SAXParseException as ex:
+            pyd_vars = parse_pydevd_vars(resp_args)
+        except PAYLOAD_ERRORS:
             self.send_error_response(request)
             return
 
-        try:
-            xvar = xml.var
-        except AttributeError:
+        if not pyd_vars:
             self.send_response(request, success=False)
             return
+        pyd_var_info = pyd_vars[0]
 
-        context = args.get('context', '')
-        is_eval_error = xvar['isErrorOnEval']
-        if context == 'hover' and is_eval_error == 'True':
-            self.send_response(
-                request,
-                result=None,
-                variablesReference=0)
+        is_eval_error = pyd_var_info.get('isErrorOnEval', False)
+        if context == 'hover' and is_eval_error:
+            response = {'result': None, 'variablesReference': 0}
+            self._cache_variables(cache, key, response)
+            self.send_response(request, **response)
             return
 
-        if context == 'repl' and is_eval_error == 'True':
+        if context == 'repl' and is_eval_error:
             # try exec for repl requests
-            with (yield self.using_format(fmt)):
-                _, _, resp_args = yield self.pydevd_request(
-                    pydevd_comm.CMD_EXEC_EXPRESSION,
-                    msg)
+            _, _, resp_args = yield self.pydevd_request(
+                pydevd_comm.CMD_EXEC_EXPRESSION,
+                msg,
+                request=request,
+                fmt=fmt)
+            self._invalidate_variables()
             try:
-                xml2 = self.parse_xml_response(resp_args)
-                xvar2 = xml2.var
-                result_type = unquote(xvar2['type'])
-                result = unquote(xvar2['value'])
+                pyd_var_info2 = parse_pydevd_vars(resp_args)[0]
+                result_type = pyd_var_info2['type']
+                result = pyd_var_info2.get('value')
             except Exception:
-                # if resp_args is not xml then it contains the error traceback
-                result_type = unquote(xvar['type'])
-                result = unquote(xvar['value'])
+                # if resp_args is not a payload then it contains the error
+                # traceback
+                result_type = pyd_var_info['type']
+                result = pyd_var_info.get('value')
             self.send_response(
                 request,
                 result=(None
@@ -1910,10 +3226,16 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
             )
             return
 
+        response = self._build_evaluate_response(
+            pyd_tid, pyd_fid, expr, pyd_var_info)
+        self._cache_variables(cache, key, response)
+        self.send_response(request, **response)
+
+    def _build_evaluate_response(self, pyd_tid, pyd_fid, expr, pyd_var_info):
         pyd_var = (pyd_tid, pyd_fid, 'EXPRESSION', expr)
         vsc_var = self.var_map.to_vscode(pyd_var, autogen=True)
-        var_type = unquote(xvar['type'])
-        var_value = unquote(xvar['value'])
+        var_type = pyd_var_info['type']
+        var_value = pyd_var_info.get('value')
         response = {
             'type': var_type,
             'result': var_value,
@@ -1922,10 +3244,40 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         if self._is_raw_string(var_type):
             response['presentationHint'] = {'attributes': ['rawString']}
 
-        if bool(xvar['isContainer']):
+        if pyd_var_info.get('isContainer'):
             response['variablesReference'] = vsc_var
+            if 'indexedVariables' in pyd_var_info:
+                response['indexedVariables'] = pyd_var_info['indexedVariables']
 
-        self.send_response(request, **response)
+        return response
+
+    @async_method
+    def _get_watch_response(self, pyd_tid, pyd_fid, vsc_fid, expr, fmt):
+        """Return the prefetched evaluate response for the expression.
+
+        None is returned if it was not prefetched.  Either way, the
+        expression is remembered, to be prefetched on the next stop
+        (only names and attribute chains in the default format are).
+        """
+        with self.stack_traces_lock:
+            if not fmt and HOVER_CACHED_EXPRESSION.match(expr):
+                self.watch_expressions.pop(expr, None)
+                self.watch_expressions[expr] = None
+                if len(self.watch_expressions) > WATCH_EXPRESSIONS_SIZE:
+                    self.watch_expressions.popitem(last=False)
+            stack = self.stack_traces.get(pyd_tid)
+            pending = None if stack is None else stack.prefetched.get(pyd_fid)
+        if pending is None or fmt:
+            yield futures.Result(None)
+            return
+        # Wait for it rather than evaluating the expression twice.
+        yield pending
+        with self.stack_traces_lock:
+            # It is only used once, like the evaluation it stands for.
+            response = stack.dap_variables.pop(('watch', vsc_fid, expr), None)
+            if response is not None:
+                self.variables_stats['hits'] += 1
+        yield futures.Result(response)
 
     @async_handler
     def on_setExpression(self, request, args):
@@ -1944,10 +3296,11 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
 
         cmd_args = (pyd_tid, pyd_fid, 'LOCAL', expr, '1')
         msg = '\t'.join(str(s) for s in cmd_args)
-        with (yield self.using_format(fmt)):
-            yield self.pydevd_request(
-                pydevd_comm.CMD_EXEC_EXPRESSION,
-                msg)
+        yield self.pydevd_request(
+            pydevd_comm.CMD_EXEC_EXPRESSION,
+            msg,
+            fmt=fmt)
+        self._invalidate_variables()
 
         # Return 'None' here, VS will call getVariables to retrieve
         # updated values anyway. Doing eval on the left-hand-side
@@ -1956,6 +3309,7 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
 
     @async_handler
     def on_modules(self, request, args):
+        self.modules_mgr.check_unloaded_modules()
         modules = list(self.modules_mgr.get_all())
         user_modules = []
         for module in modules:
@@ -2208,6 +3562,63 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         }
         self.send_response(request, **sys_info)
 
+    # Custom ptvsd message
+    @async_handler
+    def on_ptvsd_tableWindow(self, request, args):
+        """Send some rows and columns of a DataFrame, Series or ndarray.
+
+        The table is the value of "expression" in the frame.  The window
+        is "startRow", "rowCount", "startColumn" and "columnCount" (by
+        default the first 1000 rows and 100 columns, which are also the
+        most that are sent).  With "stats" the header of each column
+        also has its count, nulls, min, max, mean and std.  Floats are
+        shown with "floatFormat" (e.g. "%.3f") if given, and integers in
+        hex if "format" says so.
+        """
+        vsc_fid = int(args['frameId'])
+        pyd_tid, pyd_fid = self.frame_map.to_pydevd(vsc_fid)
+        window = dict((key, args[key]) for key in TABLE_WINDOW_ARGS
+                      if key in args)
+        msg = '{}\t{}\t{}'.format(pyd_tid, pyd_fid, json.dumps(window))
+        cmd_id, _, resp_args = yield self.pydevd_request(
+            pydevd_comm.CMD_GET_TABLE_WINDOW,
+            msg,
+            request=request,
+            fmt=args.get('format'))
+
+        if cmd_id != pydevd_comm.CMD_GET_TABLE_WINDOW:
+            # pydevd sends the traceback, which ends with the error.
+            lines = resp_args.strip().splitlines()
+            self.send_error_response(request, lines[-1] if lines else None)
+            return
+        try:
+            body = _load_pydevd_payload(resp_args)
+        except PAYLOAD_ERRORS:
+            self.send_error_response(request)
+            return
+        self.send_response(request, **body)
+
+    # Custom ptvsd message
+    def on_ptvsd_stats(self, request, args):
+        """Report the adapter's internal counters (for diagnostics)."""
+        stats = dict(
+            eventLoop=self.loop.stats,
+            output=self.output.stats,
+            outbound=self.outbound_stats,
+            stackFrames=self._get_cache_stats(self.stack_frame_stats),
+            variables=self._get_cache_stats(self.variables_stats),
+        )
+        if self._pydevd_stats is not None:
+            stats['pydevdRequests'] = self._pydevd_stats()
+        self.send_response(request, **stats)
+
+    def _get_cache_stats(self, counts):
+        with self.stack_traces_lock:
+            stats = dict(counts)
+        total = stats['hits'] + stats['misses']
+        stats['hitRate'] = stats['hits'] / float(total) if total else None
+        return stats
+
     # VS specific custom message handlers
     @async_handler
     def on_setDebuggerProperty(self, request, args):
@@ -2238,14 +3649,11 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
                 self.is_process_created = True
                 self.send_process_event(self.start_reason)
 
-        xml = self.parse_xml_response(args)
-        try:
-            name = unquote(xml.thread['name'])
-        except KeyError:
-            name = None
+        pyd_thread = parse_pydevd_threads(args)[0]
+        name = pyd_thread.get('name')
         if not is_debugger_internal_thread(name):
             with self.new_thread_lock:
-                pyd_tid = xml.thread['id']
+                pyd_tid = pyd_thread['id']
                 # Any internal pydevd or ptvsd threads will be ignored
                 # everywhere
                 try:
@@ -2260,6 +3668,14 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
     def on_pydevd_thread_kill(self, seq, args):
         # TODO: docstring
         pyd_tid = args.strip()
+        # The thread is gone, so is anything left of its last suspension.
+        with self.stack_traces_lock:
+            self.stack_traces.pop(pyd_tid, None)
+        with self.active_exceptions_lock:
+            self.active_exceptions.pop(pyd_tid, None)
+        self.frame_map.remove_scope(pyd_tid)
+        self.var_map.remove_scope(pyd_tid)
+
         try:
             vsc_tid = self.thread_map.to_vscode(pyd_tid, autogen=False)
         except KeyError:
@@ -2272,9 +3688,9 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
     @async_handler
     def on_pydevd_thread_suspend(self, seq, args):
         # TODO: docstring
-        xml = self.parse_xml_response(args)
-        pyd_tid = xml.thread['id']
-        reason = int(xml.thread['stop_reason'])
+        pyd_thread = parse_pydevd_suspend(args)
+        pyd_tid = pyd_thread['id']
+        reason = int(pyd_thread['stop_reason'])
         STEP_REASONS = {
                 pydevd_comm.CMD_STEP_INTO,
                 pydevd_comm.CMD_STEP_OVER,
@@ -2289,9 +3705,9 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         # This is needed till https://github.com/Microsoft/ptvsd/issues/477
         # is done. Remove this after adding the appropriate pydevd commands to
         # do step over and step out
-        xframes = list(xml.thread.frame)
-        xframe = xframes[0]
-        filepath = unquote(xframe['file'])
+        pyd_frames = pyd_thread['frame']
+        pyd_frame = pyd_frames[0]
+        filepath = pyd_frame['file']
         if reason in STEP_REASONS or reason in EXCEPTION_REASONS:
             if not self._should_debug(filepath):
                 self.pydevd_notify(pydevd_comm.CMD_THREAD_RUN, pyd_tid)
@@ -2304,8 +3720,22 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         autogen = self.start_reason == 'attach'
         vsc_tid = self.thread_map.to_vscode(pyd_tid, autogen=autogen)
 
+        frame_count = pyd_thread.get('frame_count', len(pyd_frames))
+        suspended = SuspendedStack(pyd_frames, frame_count,
+                                   self._is_user_frame)
+        if 'locals' in pyd_frame:
+            # The first variables request for them is answered from these.
+            pyd_var = (pyd_tid, pyd_frame['id'], 'FRAME')
+            vsc_var = self.var_map.to_vscode(pyd_var, autogen=True)
+            variables = self._build_variables(pyd_var, pyd_frame['locals'])
+            key = (vsc_var, (), None, None, None)
+            suspended.dap_variables[key] = variables
         with self.stack_traces_lock:
-            self.stack_traces[pyd_tid] = list(xml.thread.frame)
+            self.stack_traces[pyd_tid] = suspended
+            # Watch expressions that are not evaluated again during this
+            # stop are forgotten (e.g. the user removed them).
+            self.last_watch_expressions = tuple(self.watch_expressions)
+            self.watch_expressions.clear()
 
         description = None
         text = None
@@ -2325,32 +3755,36 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
         if reason == 'exception':
             # Get exception info from frame
             try:
-                pyd_fid = xframe['id']
+                pyd_fid = pyd_frame['id']
                 cmdargs = '{}\t{}\tFRAME\t__exception__'.format(pyd_tid,
                                                                 pyd_fid)
                 cmdid = pydevd_comm.CMD_GET_VARIABLE
-                _, _, resp_args = yield self.pydevd_request(cmdid, cmdargs)
-                xml = self.parse_xml_response(resp_args)
-                text = unquote(xml.var[1]['type'])
-                description = unquote(xml.var[1]['value'])
+                # The "stopped" event waits on this, so it goes first.
+                _, _, resp_args = yield self.pydevd_request(
+                    cmdid, cmdargs, priority=futures.PRIORITY_HIGH)
+                pyd_vars = parse_pydevd_vars(resp_args)
+                text = pyd_vars[1]['type']
+                description = pyd_vars[1].get('value')
+                # The traceback needs the whole stack.
+                if not suspended.complete:
+                    yield self._load_stack_frames(pyd_tid, suspended, None)
                 frame_data = []
-                for f in xframes:
-                    file_path = unquote(f['file'])
-                    if not self.internals_filter.is_internal_path(file_path):
-                        line_no = int(f['line'])
-                        func_name = unquote(f['name'])
-                        if _util.is_py34():
-                            # NOTE: In 3.4.* format_list requires the text
-                            # to be passed in the tuple list.
-                            line_text = _util.get_line_for_traceback(file_path,
-                                                                     line_no)
-                            frame_data.append((file_path, line_no,
-                                               func_name, line_text))
-                        else:
-                            frame_data.append((file_path, line_no,
-                                               func_name, None))
+                for f in suspended.user_frames:
+                    file_path = f['file']
+                    line_no = int(f['line'])
+                    func_name = f['name']
+                    if _util.is_py34():
+                        # NOTE: In 3.4.* format_list requires the text
+                        # to be passed in the tuple list.
+                        line_text = _util.get_line_for_traceback(file_path,
+                                                                 line_no)
+                        frame_data.append((file_path, line_no,
+                                           func_name, line_text))
+                    else:
+                        frame_data.append((file_path, line_no,
+                                           func_name, None))
                 stack = ''.join(traceback.format_list(frame_data))
-                source = unquote(xframe['file'])
+                source = pyd_frame['file']
                 if self.internals_filter.is_internal_path(source):
                     source = None
             except Exception:
@@ -2365,6 +3799,9 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
                                                                 stack,
                                                                 source)
 
+        # Output written before the thread stopped must be shown first.
+        self.output.flush()
+        self.modules_mgr.check_unloaded_modules()
         self.send_event(
             'stopped',
             reason=reason,
@@ -2392,13 +3829,8 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
             except KeyError:
                 pass
 
-        for pyd_fid, vsc_fid in self.frame_map.pairs():
-            if pyd_fid[0] == pyd_tid:
-                self.frame_map.remove(pyd_fid, vsc_fid)
-
-        for pyd_var, vsc_var in self.var_map.pairs():
-            if pyd_var[0] == pyd_tid:
-                self.var_map.remove(pyd_var, vsc_var)
+        self.frame_map.remove_scope(pyd_tid)
+        self.var_map.remove_scope(pyd_tid)
 
         try:
             vsc_tid = self.thread_map.to_vscode(pyd_tid, autogen=False)
@@ -2425,8 +3857,6 @@ class VSCodeMessageProcessor(VSCLifecycleMsgProcessor):
     @pydevd_events.handler(pydevd_comm.CMD_WRITE_TO_CONSOLE)
     def on_pydevd_cmd_write_to_console2(self, seq, args):
         """Handle console output"""
-        xml = self.parse_xml_response(args)
-        ctx = xml.io['ctx']
-        category = 'stdout' if ctx == '1' else 'stderr'
-        content = unquote(xml.io['s'])
-        self.send_event('output', category=category, output=content)
+        io = parse_pydevd_io(args)
+        category = 'stdout' if str(io['ctx']) == '1' else 'stderr'
+        self.output.write(category, io['s'])
@@ -0,0 +1,45 @@
+"""Micro-benchmarks for ptvsd internals.
+
+These are not part of the test suite (the modules do not match the
+"test*.py" discovery pattern).  Run one directly, e.g.:
+
+  python -m tests.benchmarks.bench_ipcjson
+"""
+
+from __future__ import absolute_import, print_function
+
+import time
+
+
+if hasattr(time, 'perf_counter'):
+    clock = time.perf_counter
+else:
+    clock = time.time
+
+
+class Timer(object):
+    """A context manager that records the elapsed wall-clock time."""
+
+    def __init__(self):
+        self.start = None
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = clock() - self.start
+
+
+def report(name, **results):
+    """Print the results of a single benchmark run."""
+    fields = ', '.join('{}={}'.format(key, _format(value))
+                       for key, value in sorted(results.items()))
+    print('{:<32} {}'.format(name, fields))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return '{:.3f}'.format(value)
+    return str(value)
@@ -0,0 +1,85 @@
+"""Latency of the adapter's event loop (futures.EventLoop and friends).
+
+"handoff" is the time from call_soon() on another thread until the
+callback runs (the old loop polled every 0.1s).  "urgent" is the time it
+takes a high-priority callback to run while a backlog of bulk callbacks
+is queued.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import sys
+import threading
+
+from ptvsd import futures
+from tests.benchmarks import Timer, clock, report
+
+
+LOOPS = ['thread']
+if sys.version_info >= (3, 4):
+    LOOPS.append('asyncio')
+
+
+def _start(kind):
+    loop = futures.new_event_loop(kind)
+    thread = threading.Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+    return loop, thread
+
+
+def run_handoff(kind, count):
+    loop, thread = _start(kind)
+    done = threading.Event()
+    try:
+        with Timer() as timer:
+            for _ in range(count):
+                done.clear()
+                loop.call_soon(done.set)
+                done.wait()
+    finally:
+        loop.stop()
+        thread.join()
+    report('handoff[{}]'.format(kind),
+           calls=count,
+           usec_per_call=timer.elapsed / count * 1e6)
+
+
+def run_urgent(kind, backlog, priority):
+    loop, thread = _start(kind)
+    done = threading.Event()
+    gate = threading.Event()
+    try:
+        # Hold the loop so that the backlog builds up.
+        loop.call_soon(gate.wait)
+        for _ in range(backlog):
+            loop.call_soon(sum, range(100))
+        start = clock()
+        loop.call_soon(done.set, priority=priority)
+        gate.set()
+        done.wait()
+        elapsed = clock() - start
+    finally:
+        loop.stop()
+        thread.join()
+    report('urgent[{}]'.format(kind),
+           backlog=backlog,
+           priority=futures.PRIORITY_NAMES[priority],
+           usec=elapsed * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_event_loop')
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--backlog', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    for kind in LOOPS:
+        run_handoff(kind, args.count)
+        for priority in (futures.PRIORITY_NORMAL, futures.PRIORITY_HIGH):
+            run_urgent(kind, args.backlog, priority)
+
+
+if __name__ == '__main__':
+    main()
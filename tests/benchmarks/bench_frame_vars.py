@@ -0,0 +1,74 @@
+"""A frame's variables when some of them have a slow repr.
+
+The frame has plain values and some objects whose repr sleeps (like a
+lazy-loading ORM object).  Its variables are sent (frame_vars_to_dicts)
+a number of times, as when stopping at a breakpoint in a loop, and the
+time per response and how many values were left to load later are
+reported.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import time
+
+from _pydevd_bundle import pydevd_xml
+from _pydevd_bundle.pydevd_constants import DEFAULT_VALUE
+from tests.benchmarks import Timer, report
+
+
+class Slow(object):
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __repr__(self):
+        time.sleep(self.delay)
+        return '<Slow>'
+
+
+def run(plain, slow, delay, count, budgets):
+    f_locals = dict(('plain{}'.format(i), i) for i in range(plain))
+    f_locals.update(('slow{}'.format(i), Slow(delay)) for i in range(slow))
+    old = (pydevd_xml.FRAME_VARS_TIME_BUDGET_SEC,
+           pydevd_xml.VALUE_TIME_BUDGET_SEC)
+    if not budgets:
+        pydevd_xml.FRAME_VARS_TIME_BUDGET_SEC = float('inf')
+        pydevd_xml.VALUE_TIME_BUDGET_SEC = float('inf')
+    pydevd_xml.forget_slow_value_types()
+    times = []
+    try:
+        for _ in range(count):
+            with Timer() as timer:
+                variables = pydevd_xml.frame_vars_to_dicts(f_locals)
+            times.append(timer.elapsed)
+    finally:
+        (pydevd_xml.FRAME_VARS_TIME_BUDGET_SEC,
+         pydevd_xml.VALUE_TIME_BUDGET_SEC) = old
+        pydevd_xml.forget_slow_value_types()
+    deferred = sum(1 for var in variables
+                   if var.get('value') == DEFAULT_VALUE)
+    report('frame_vars',
+           budgets=budgets,
+           plain=plain,
+           slow=slow,
+           delay_ms=delay * 1e3,
+           first_ms=times[0] * 1e3,
+           later_ms=sum(times[1:]) * 1e3 / max(1, len(times) - 1),
+           deferred=deferred)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_frame_vars')
+    parser.add_argument('--plain', type=int, default=200)
+    parser.add_argument('--slow', type=int, default=10)
+    parser.add_argument('--delay', type=float, default=0.2)
+    parser.add_argument('--count', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    for budgets in (False, True):
+        run(args.plain, args.slow, args.delay, args.count, budgets)
+
+
+if __name__ == '__main__':
+    main()
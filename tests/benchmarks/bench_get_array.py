@@ -0,0 +1,59 @@
+"""CMD_GET_ARRAY windows of a large ndarray, as the array viewer asks.
+
+The whole array is paged through in windows (as when scrolling), with
+the cells as text and as base64, and the time per window and the size
+of the payloads are reported.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from _pydevd_bundle import pydevd_vars
+from tests.benchmarks import Timer, report
+
+
+def run(dtype, size, window, base64_cells):
+    array = np.random.RandomState(0).rand(size, size) * 1000
+    array = array.astype(dtype)
+    windows = [(r, c)
+               for r in range(0, size, window)
+               for c in range(0, size, window)]
+    total = 0
+    with Timer() as timer:
+        for r, c in windows:
+            xml = pydevd_vars.table_like_struct_to_xml(
+                array, 'array', r, c, window, window, '%', base64_cells)
+            total += len(xml)
+    report('get_array',
+           dtype=dtype,
+           size=size,
+           window=window,
+           cells='base64' if base64_cells else 'text',
+           windows=len(windows),
+           per_window_ms=timer.elapsed * 1e3 / len(windows),
+           payload_kb=total / 1024.0 / len(windows))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_get_array')
+    parser.add_argument('--dtype', action='append')
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--window', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print('numpy is not installed')
+        return
+    for dtype in args.dtype or ('float64', 'int64'):
+        for base64_cells in (False, True):
+            run(dtype, args.size, args.window, base64_cells)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Frame and variable ID invalidation when a thread resumes.
+
+IDs are added for many suspended threads, then one thread's IDs are
+removed (what happens on every continue), both by scanning all of the
+pairs (IDMap) and by scope (ScopedIDMap).
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+
+from ptvsd.wrapper import IDMap, ScopedIDMap
+from tests.benchmarks import Timer, report
+
+
+def _fill(id_map, threads, ids):
+    for tid in range(threads):
+        pyd_tid = 'pid_1_id_{}'.format(tid)
+        for i in range(ids):
+            id_map.add((pyd_tid, i, 'FRAME', 'var{}'.format(i)))
+
+
+def run(threads, ids):
+    pyd_tid = 'pid_1_id_0'
+
+    id_map = IDMap()
+    _fill(id_map, threads, ids)
+    with Timer() as scan:
+        for pyd_id, vsc_id in id_map.pairs():
+            if pyd_id[0] == pyd_tid:
+                id_map.remove(pyd_id, vsc_id)
+
+    id_map = ScopedIDMap()
+    _fill(id_map, threads, ids)
+    with Timer() as scoped:
+        id_map.remove_scope(pyd_tid)
+
+    report('id_map',
+           threads=threads,
+           ids_per_thread=ids,
+           scan_ms=scan.elapsed * 1e3,
+           scoped_ms=scoped.elapsed * 1e3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_id_map')
+    parser.add_argument('--threads', type=int, action='append')
+    parser.add_argument('--ids', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    for threads in args.threads or (10, 100, 500):
+        run(threads, args.ids)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Throughput of the DAP reader and writer in ptvsd.ipcjson.
+
+The fake VSC client (tests.helpers.vsc) sends a batch of large requests
+to a minimal adapter built on ipcjson.SocketIO, which counts them.  In
+the other direction the adapter sends a burst of "output" events, with
+and without the outbound writer thread.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import threading
+import time
+
+from ptvsd.ipcjson import SocketIO, IpcChannel
+from ptvsd.socket import create_server, close_socket
+from tests.helpers.vsc import FakeVSC, VSCMessages
+from tests.benchmarks import Timer, report
+
+
+class CountingAdapter(SocketIO, IpcChannel):
+    """An adapter that only counts the requests it receives."""
+
+    def __init__(self, expected, *args, **kwargs):
+        super(CountingAdapter, self).__init__(*args, **kwargs)
+        self.expected = expected
+        self.count = 0
+        self.done = threading.Event()
+
+    def on_request(self, request):
+        self.count += 1
+        if self.count == self.expected:
+            self.send_response(request)
+            self.done.set()
+
+
+class AdapterServer(object):
+    """The "start_adapter" half expected by FakeVSC."""
+
+    def __init__(self, expected, **kwargs):
+        self._server = create_server('localhost', 0)
+        self.address = self._server.getsockname()
+        self.adapter = None
+        self._ready = threading.Event()
+        self._expected = expected
+        self._kwargs = kwargs
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wait_until_ready(self, timeout=None):
+        self._ready.wait(timeout)
+        return self.adapter
+
+    def wait(self, timeout=None):
+        return self.wait_until_ready(timeout).done.wait(timeout)
+
+    def close(self):
+        close_socket(self._server)
+        if self.adapter is not None:
+            self.adapter.close()
+
+    def _run(self):
+        client, _ = self._server.accept()
+        self.adapter = CountingAdapter(self._expected, socket=client,
+                                       own_socket=True, **self._kwargs)
+        self._ready.set()
+        try:
+            self.adapter.process_messages()
+        except (EOFError, OSError):
+            pass
+
+
+def _requests(kind, count, size):
+    vsc = VSCMessages()
+    for _ in range(count):
+        if kind == 'setBreakpoints':
+            yield vsc.new_request(
+                'setBreakpoints',
+                source={'path': '/spam/eggs.py'},
+                breakpoints=[{'line': i, 'condition': 'x == {}'.format(i)}
+                             for i in range(size)],
+            )
+        else:
+            yield vsc.new_request(
+                'evaluate',
+                expression='x' * size,
+                context='repl',
+            )
+
+
+def run(kind, count, size):
+    requests = list(_requests(kind, count, size))
+    nbytes = sum(len(json.dumps(req)) for req in requests)
+
+    server = []
+
+    def start_adapter(address):
+        server.append(AdapterServer(count))
+        return server[0]
+
+    fake = FakeVSC(start_adapter)
+    with fake.start((None, 0)) as started:
+        started.wait_until_connected()
+        with Timer() as timer:
+            for req in requests:
+                fake.send_request(req)
+            if not server[0].wait(timeout=60):
+                raise RuntimeError('timed out')
+    fake.close()
+
+    report('{}[size={}]'.format(kind, size),
+           messages=count,
+           msgs_per_sec=count / timer.elapsed,
+           mb_per_sec=nbytes / timer.elapsed / (1024 * 1024))
+
+
+def run_events(count, max_pending=None):
+    server = []
+
+    def start_adapter(address):
+        server.append(AdapterServer(0, max_pending=max_pending))
+        return server[0]
+
+    fake = FakeVSC(start_adapter)
+    with fake.start((None, 0)) as started:
+        started.wait_until_connected()
+        adapter = server[0].wait_until_ready()
+        with Timer() as total:
+            with Timer() as producer:
+                for i in range(count):
+                    adapter.send_event('output', category='stdout',
+                                       output='line {}\n'.format(i))
+            while len(fake.received) < count:
+                time.sleep(0.001)
+        stats = adapter.outbound_stats
+    fake.close()
+
+    if stats is None:
+        name = 'output events[sync]'
+        extra = {}
+    else:
+        name = 'output events[max_pending={}]'.format(max_pending)
+        extra = dict(flushes=stats['flushes'], max_flush=stats['max_flush'],
+                     max_depth=stats['max_depth'])
+    report(name,
+           messages=count,
+           producer_usec=producer.elapsed / count * 1e6,
+           msgs_per_sec=count / total.elapsed,
+           **extra)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_ipcjson')
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    for kind, size in (('setBreakpoints', 10),
+                       ('setBreakpoints', 1000),
+                       ('setBreakpoints', 20000),
+                       ('evaluate', 100),
+                       ('evaluate', 1000000)):
+        run(kind, args.count, size)
+    for max_pending in (None, 1000):
+        run_events(args.count * 50, max_pending)
+
+
+if __name__ == '__main__':
+    main()
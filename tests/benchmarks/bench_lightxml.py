@@ -0,0 +1,138 @@
+"""Cost of parsing pydevd's XML with ptvsd.lightxml vs. bare ElementTree.
+
+The documents are the XML pydevd actually produces for a scope with many
+variables and for a deep stack.  "all" touches every attribute of every
+element (like the variables request), "first" only the first child
+(like the stopped event), and "retained" is the memory kept alive by the
+parsed tree (Python 3 only).
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import sys
+import xml.etree.ElementTree as ElementTree
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from _pydevd_bundle import pydevd_comm, pydevd_xml
+from _pydevd_bundle.pydevd_comm import NetCommandFactory
+
+from ptvsd import lightxml
+from tests.benchmarks import Timer, report
+
+
+def _variables(count):
+    values = {'v{}'.format(i): value
+              for i, value in enumerate([1, 'spam', [1, 2, 3], {'a': 1},
+                                         3.5, None, object()] * count)}
+    return '<xml>' + pydevd_xml.frame_vars_to_xml(values) + '</xml>'
+
+
+def _deep_stack(depth):
+    if depth:
+        return _deep_stack(depth - 1)
+    return NetCommandFactory().make_thread_suspend_str(
+        'pid_1_id_1', sys._getframe(), pydevd_comm.CMD_SET_BREAK, '')
+
+
+class _ETreeElement(object):
+    # The least code that gives ElementTree the API used here (the
+    # baseline lightxml is compared against).
+
+    def __init__(self, element):
+        self._element = element
+
+    def __getitem__(self, key):
+        return self._element.get(key)
+
+    def __getattr__(self, name):
+        return _ETreeElement(self._element.find(name))
+
+    def get_elements(self, name):
+        return [_ETreeElement(e) for e in self._element.findall(name)]
+
+
+def _etree(text):
+    return _ETreeElement(ElementTree.fromstring(text.encode('utf8')))
+
+
+PARSERS = {
+    'etree': _etree,
+    'lightxml': lightxml.parse,
+}
+
+DOCUMENTS = {
+    # name: (document, path to the elements, attributes)
+    'variables': (lambda: _variables(300), ('var',),
+                  ('name', 'type', 'value', 'isContainer')),
+    'stack': (lambda: _deep_stack(500), ('thread', 'frame'),
+              ('id', 'name', 'file', 'line')),
+}
+
+
+def _elements(root, path):
+    parent = root
+    for name in path[:-1]:
+        parent = getattr(parent, name)
+    return parent.get_elements(path[-1])
+
+
+def _touch_all(root, path, attrs):
+    for element in _elements(root, path):
+        for attr in attrs:
+            element[attr]
+
+
+def _touch_first(root, path, attrs):
+    element = _elements(root, path)[0]
+    for attr in attrs:
+        element[attr]
+
+
+def _retained(parse, text):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        root = parse(text)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del root
+    return size
+
+
+def run(parser, document, count):
+    parse = PARSERS[parser]
+    make, path, attrs = DOCUMENTS[document]
+    text = make()
+
+    results = {}
+    for kind, touch in (('all', _touch_all), ('first', _touch_first)):
+        with Timer() as timer:
+            for _ in range(count):
+                touch(parse(text), path, attrs)
+        results['usec_' + kind] = timer.elapsed / count * 1e6
+    report('{}[{}]'.format(document, parser),
+           bytes=len(text),
+           elements=len(_elements(parse(text), path)),
+           retained=_retained(parse, text),
+           **results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_lightxml')
+    parser.add_argument('--count', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    for document in sorted(DOCUMENTS):
+        for name in sorted(PARSERS, reverse=True):
+            run(name, document, args.count)
+
+
+if __name__ == '__main__':
+    main()
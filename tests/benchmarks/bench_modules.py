@@ -0,0 +1,78 @@
+"""Module lookups by frame path with many imported modules.
+
+Fake modules are added to sys.modules, then ModulesManager looks up the
+files of a stack's worth of them (the first stop), and then a few more
+(later stops, after more imports).
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import sys
+import types
+
+from ptvsd.wrapper import ModulesManager
+from tests.benchmarks import Timer, report
+
+
+class EventSink(object):
+
+    def __init__(self):
+        self.events = 0
+
+    def send_event(self, event, **kwargs):
+        self.events += 1
+
+
+def _add_modules(prefix, count):
+    names = []
+    for i in range(count):
+        name = 'bench_modules_{}_{}'.format(prefix, i)
+        module = types.ModuleType(name)
+        module.__file__ = '/bench/{}.py'.format(name)
+        sys.modules[name] = module
+        names.append(name)
+    return names
+
+
+def run(count, frames):
+    names = _add_modules('a', count)
+    try:
+        sink = EventSink()
+        mgr = ModulesManager(sink)
+        paths = [sys.modules[name].__file__ for name in names[-frames:]]
+        with Timer() as first:
+            for path in paths:
+                mgr.add_or_get_from_path(path)
+        names.extend(_add_modules('b', frames))
+        paths = [sys.modules[name].__file__ for name in names[-frames:]]
+        with Timer() as later:
+            for path in paths:
+                mgr.add_or_get_from_path(path)
+        with Timer() as again:
+            for path in paths:
+                mgr.add_or_get_from_path(path)
+    finally:
+        for name in names:
+            del sys.modules[name]
+    report('modules',
+           modules=len(sys.modules) + len(names),
+           frames=frames,
+           first_stop_ms=first.elapsed * 1e3,
+           new_modules_ms=later.elapsed * 1e3,
+           known_modules_ms=again.elapsed * 1e3,
+           events=sink.events)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_modules')
+    parser.add_argument('--modules', type=int, action='append')
+    parser.add_argument('--frames', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    for count in args.modules or (1000, 5000):
+        run(count, args.frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""How chatty program output turns into "output" events.
+
+A writer thread prints many short lines, once with every write sent as
+its own event (like the adapter used to do) and once through
+wrapper.OutputBuffer.  The "client" takes a fixed time per event to
+simulate a slow connection.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import time
+
+from ptvsd.wrapper import OutputBuffer
+from tests.benchmarks import Timer, report
+
+
+class SlowClient(object):
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.events = 0
+        self.chars = 0
+
+    def send(self, category, output):
+        if self.delay:
+            time.sleep(self.delay)
+        self.events += 1
+        self.chars += len(output)
+
+
+def run(kind, count, delay, **kwargs):
+    client = SlowClient(delay)
+    line = 'spam spam spam eggs and spam\n'
+    with Timer() as writing:
+        if kind == 'unbuffered':
+            for _ in range(count):
+                client.send('stdout', line)
+        else:
+            buf = OutputBuffer(client.send, **kwargs)
+            for _ in range(count):
+                buf.write('stdout', line)
+    with Timer() as draining:
+        if kind != 'unbuffered':
+            buf.close()
+    results = {}
+    if kind != 'unbuffered':
+        stats = buf.stats
+        results['dropped'] = stats['dropped']
+    report('output[{}]'.format(kind),
+           writes=count,
+           events=client.events,
+           chars=client.chars,
+           usec_per_write=writing.elapsed / count * 1e6,
+           drain_sec=draining.elapsed,
+           **results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_output')
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--delay', type=float, default=0.0001)
+    args = parser.parse_args(argv)
+
+    run('unbuffered', args.count // 10, args.delay)
+    run('buffered', args.count, args.delay)
+    run('capped', args.count, args.delay, max_buffered=64 * 1024)
+
+
+if __name__ == '__main__':
+    main()
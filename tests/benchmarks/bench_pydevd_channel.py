@@ -0,0 +1,116 @@
+"""Per-request latency of the channel between the adapter and pydevd.
+
+Requests go through wrapper.PydevdSocket to pydevd's real ReaderThread
+and the replies come back through its WriterThread, once using the
+structured (in-process queue) path and once using the OS pipe with the
+pydevd line protocol.  The replies are the XML pydevd actually produces
+for a deep stack (stackTrace), a scope (variables) and an expression
+(evaluate).
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import sys
+import threading
+
+from _pydevd_bundle import pydevd_comm, pydevd_xml
+from _pydevd_bundle.pydevd_comm import (
+    ReaderThread, WriterThread, NetCommand, NetCommandFactory)
+
+from ptvsd.futures import EventLoop
+from ptvsd.wrapper import PydevdSocket
+from tests.benchmarks import Timer, report
+
+
+def _deep_stack(depth):
+    if depth:
+        return _deep_stack(depth - 1)
+    frame = sys._getframe()
+    return NetCommandFactory().make_thread_suspend_str(
+        'pid_1_id_1', frame, pydevd_comm.CMD_SET_BREAK, '')
+
+
+def _variables(count):
+    values = {'v{}'.format(i): value
+              for i, value in enumerate([1, 'spam', [1, 2, 3], {'a': 1},
+                                         3.5, None, object()] * count)}
+    return pydevd_xml.frame_vars_to_xml(values)
+
+
+def replies(depth=50, count=15):
+    evaluated = pydevd_xml.var_to_xml(list(range(100)), 'x')
+    return {
+        'stackTrace': (pydevd_comm.CMD_THREAD_SUSPEND, _deep_stack(depth)),
+        'variables': (pydevd_comm.CMD_GET_VARIABLE,
+                      '<xml>' + _variables(count) + '</xml>'),
+        'evaluate': (pydevd_comm.CMD_EVALUATE_EXPRESSION,
+                     '<xml>' + evaluated + '</xml>'),
+    }
+
+
+class ReplyingReaderThread(ReaderThread):
+    """Answers every request with a canned reply."""
+
+    def __init__(self, sock, writer, text):
+        ReaderThread.__init__(self, sock)
+        self.writer = writer
+        self.text = text
+
+    def process_command(self, cmd_id, seq, text):
+        self.writer.add_command(NetCommand(cmd_id, seq, self.text))
+
+    def handle_except(self):
+        pass
+
+
+def run(name, cmd_id, text, count, structured):
+    sock = PydevdSocket(
+        (lambda *args: None),
+        (lambda: None),
+        (lambda: ('localhost', 0)),
+        (lambda: ('localhost', 0)),
+        structured=structured,
+    )
+    writer = WriterThread(sock)
+    reader = ReplyingReaderThread(sock, writer, text)
+    writer.start()
+    reader.start()
+
+    loop = EventLoop()
+    looping = threading.Thread(target=loop.run_forever)
+    looping.daemon = True
+    looping.start()
+
+    done = threading.Event()
+    try:
+        with Timer() as timer:
+            for _ in range(count):
+                done.clear()
+                fut = sock.pydevd_request(loop, cmd_id, 'spam')
+                fut.add_done_callback(lambda _: done.set())
+                if not done.wait(10):
+                    raise RuntimeError('timed out')
+    finally:
+        loop.stop()
+        writer.do_kill_pydev_thread()
+        sock.close()
+
+    report('{}[{}]'.format(name, 'structured' if structured else 'pipe'),
+           requests=count,
+           reply_bytes=len(text),
+           usec_per_request=timer.elapsed / count * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_pydevd_channel')
+    parser.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    for name, (cmd_id, text) in sorted(replies().items()):
+        for structured in (False, True):
+            run(name, cmd_id, text, args.count, structured)
+
+
+if __name__ == '__main__':
+    main()
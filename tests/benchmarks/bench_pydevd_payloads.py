@@ -0,0 +1,83 @@
+"""Suspend-to-stopped cost of the pydevd payload formats for deep stacks.
+
+For each stack depth this measures building the CMD_THREAD_SUSPEND
+payload in pydevd and turning it into the adapter's frame dicts, once
+with XML (the default) and once with the negotiated JSON format (passed
+as a dict through the in-process channel, or as JSON text through the
+line protocol).  With --levels only that many top frames are sent, as
+negotiated by the adapter (the rest is fetched on demand).
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import sys
+
+from _pydevd_bundle import pydevd_comm
+from _pydevd_bundle.pydevd_comm import NetCommandFactory
+
+from ptvsd.wrapper import parse_pydevd_suspend, STACK_PAGE_SIZE
+from tests.benchmarks import Timer, report
+
+
+def _make_xml(factory, frame, levels):
+    return factory.make_thread_suspend_str(
+        'pid_1_id_1', frame, pydevd_comm.CMD_SET_BREAK, '', levels=levels)
+
+
+def _make_dict(factory, frame, levels):
+    return factory.make_thread_suspend_payload(
+        'pid_1_id_1', frame, pydevd_comm.CMD_SET_BREAK, '', levels=levels)
+
+
+def _make_json(factory, frame, levels):
+    return json.dumps(_make_dict(factory, frame, levels))
+
+
+FORMATS = {
+    'xml': _make_xml,
+    'dict': _make_dict,
+    'json': _make_json,
+}
+
+
+def _at_depth(depth, func):
+    if depth:
+        return _at_depth(depth - 1, func)
+    return func(sys._getframe())
+
+
+def run(kind, depth, count, levels=None):
+    factory = NetCommandFactory()
+    make = FORMATS[kind]
+
+    def measure(frame):
+        with Timer() as timer:
+            for _ in range(count):
+                thread = parse_pydevd_suspend(make(factory, frame, levels))
+        return timer, len(thread['frame'])
+
+    timer, frames = _at_depth(depth, measure)
+    report('suspend[{}]'.format(kind),
+           depth=depth,
+           levels=levels or 'all',
+           frames=frames,
+           usec_per_stop=timer.elapsed / count * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_pydevd_payloads')
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--depth', type=int, action='append')
+    parser.add_argument('--levels', type=int, action='append')
+    args = parser.parse_args(argv)
+
+    for depth in args.depth or (10, 100, 500):
+        for levels in args.levels or (None, STACK_PAGE_SIZE):
+            for kind in sorted(FORMATS):
+                run(kind, depth, args.count, levels)
+
+
+if __name__ == '__main__':
+    main()
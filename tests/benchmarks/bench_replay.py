@@ -0,0 +1,131 @@
+"""Replays a recorded debug session against the adapter.
+
+Record a session by setting PTVSD_CAPTURE to a filename and pass that
+file with --capture.  Without one, a session is made up that stops a
+number of times and fetches the variables of the top frame each time.
+The adapter runs in-process against a fake pydevd that answers with
+the recorded replies, so "cpu" covers the adapter and the replayer.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import io
+import json
+
+from _pydevd_bundle import pydevd_comm
+from ptvsd import capture
+from tests.benchmarks import report
+from tests.helpers.pydevd import ReplayScript, replay
+
+
+THREAD_ID = 'pid_1_id_1'
+FRAME_ID = 2
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.file = io.BytesIO()
+        self.recorder = capture.Recorder(self.file)
+        self.client_seq = 1000
+        self.adapter_seq = 1
+        self.pydevd_seq = 1000000000
+        self.event_seq = 2
+
+    def request(self, command, pydevd=(), **arguments):
+        """Record a DAP request, the pydevd requests for it and the reply."""
+        self.recorder.record_dap(True, json.dumps({
+            'type': 'request',
+            'seq': self.client_seq,
+            'command': command,
+            'arguments': arguments,
+        }))
+        for cmd_id, args, reply in pydevd:
+            self.recorder.record_pydevd(False, cmd_id, self.pydevd_seq, args)
+            self.recorder.record_pydevd(True, cmd_id, self.pydevd_seq, reply)
+            self.pydevd_seq += 1
+        self.recorder.record_dap(False, json.dumps({
+            'type': 'response',
+            'seq': self.adapter_seq,
+            'request_seq': self.client_seq,
+            'command': command,
+            'success': True,
+        }))
+        self.client_seq += 1
+        self.adapter_seq += 1
+
+    def event(self, cmd_id, args):
+        """Record a pydevd event."""
+        self.recorder.record_pydevd(True, cmd_id, self.event_seq, args)
+        self.event_seq += 2
+
+    def records(self):
+        self.recorder.close()
+        self.file.seek(0)
+        return list(capture.iter_records(self.file))
+
+
+def synthesize(stops, variables):
+    session = _Session()
+    version = (pydevd_comm.CMD_VERSION, '1.1\tUNIX\tID\tJSON',
+               '1.1.1\tJSON')
+    session.request('initialize', adapterID='spam')
+    session.request('launch', pydevd=[version])
+    session.request('configurationDone')
+    session.event(pydevd_comm.CMD_THREAD_CREATE, {
+        'thread': [{'name': 'MainThread', 'id': THREAD_ID}],
+    })
+    frames = [{'id': FRAME_ID + i, 'name': 'f{}'.format(i),
+               'file': '/spam/eggs.py', 'line': 10 + i}
+              for i in range(10)]
+    pyd_vars = {'var': [{'name': 'v{}'.format(i), 'type': 'int',
+                         'qualifier': 'builtins', 'value': str(i)}
+                        for i in range(variables)]}
+    for stop in range(stops):
+        session.event(pydevd_comm.CMD_THREAD_SUSPEND, {
+            'thread': {'id': THREAD_ID, 'stop_reason': 111, 'message': '',
+                       'suspend_type': 'trace', 'frame': frames},
+        })
+        session.request('stackTrace', threadId=1)
+        # Each stop gets new frame IDs and variable references.
+        session.request('scopes', frameId=stop * len(frames) + 1)
+        session.request('variables', variablesReference=stop + 1, pydevd=[
+            (pydevd_comm.CMD_GET_FRAME,
+             '{}\t{}\tFRAME'.format(THREAD_ID, FRAME_ID),
+             pyd_vars),
+        ])
+        session.request('continue', threadId=1)
+        session.event(pydevd_comm.CMD_THREAD_RUN, THREAD_ID + '\t-1')
+    return session.records()
+
+
+def run(name, script, pace=False):
+    results = replay(script, pace=pace)
+    latency = results.pop('latency')
+    report('replay[{}]'.format(name), **results)
+    for command, stats in sorted(latency.items()):
+        report('latency[{}]'.format(command),
+               count=stats['count'],
+               p50_ms=stats['p50'] * 1000,
+               p95_ms=stats['p95'] * 1000,
+               max_ms=stats['max'] * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_replay')
+    parser.add_argument('--capture')
+    parser.add_argument('--pace', action='store_true')
+    parser.add_argument('--stops', type=int, default=200)
+    parser.add_argument('--variables', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.capture:
+        run(args.capture, ReplayScript.load(args.capture), args.pace)
+    else:
+        records = synthesize(args.stops, args.variables)
+        run('synthetic', ReplayScript.from_records(records), args.pace)
+
+
+if __name__ == '__main__':
+    main()
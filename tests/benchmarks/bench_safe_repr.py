@@ -0,0 +1,79 @@
+"""SafeRepr on representative values shown in the variables pane.
+
+Each payload is repr'd a number of times (as when its container is
+expanded over and over) and the time per repr is reported.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+from ptvsd.safe_repr import SafeRepr
+from tests.benchmarks import Timer, report
+
+
+class Model(object):
+    """Looks like an ORM object: many fields and a custom repr."""
+
+    def __init__(self, pk):
+        self.pk = pk
+        self.name = 'model {}'.format(pk)
+        self.fields = dict(('field{}'.format(i), i) for i in range(20))
+
+    def __repr__(self):
+        return '<Model: {} ({})>'.format(self.name, self.pk)
+
+
+def _payloads():
+    nested = dict(('key{}'.format(i),
+                   dict(('inner{}'.format(j), [j] * 5) for j in range(10)))
+                  for i in range(20))
+    payloads = [
+        ('ints', list(range(10))),
+        ('nested_dicts', nested),
+        ('long_string', 'spam ' * 100000),
+        ('strings', ['eggs ' * 10] * 100),
+        ('models', [Model(i) for i in range(100)]),
+        ('model_dict', dict((i, Model(i)) for i in range(10))),
+    ]
+    if np is not None:
+        payloads.append(('ndarray', np.arange(100000.0)))
+        payloads.append(('ndarrays', [np.zeros(10)] * 10))
+    if pd is not None:
+        frame = pd.DataFrame(dict(('col{}'.format(i), range(10000))
+                                  for i in range(20)))
+        payloads.append(('dataframe', frame))
+    return payloads
+
+
+def run(name, value, count):
+    safe_repr = SafeRepr()
+    with Timer() as timer:
+        for _ in range(count):
+            text = safe_repr(value)
+    report('safe_repr.' + name,
+           count=count,
+           chars=len(text),
+           per_repr_us=timer.elapsed / count * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_safe_repr')
+    parser.add_argument('--count', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    for name, value in _payloads():
+        run(name, value, args.count)
+
+
+if __name__ == '__main__':
+    main()
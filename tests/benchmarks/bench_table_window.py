@@ -0,0 +1,100 @@
+"""Windows of a large DataFrame, as a table viewer pages through it.
+
+A window of rows (in the middle of the frame) is fetched as XML with
+dataframe_to_xml (CMD_GET_ARRAY) and with table_window (the
+ptvsd_tableWindow request), with and without column stats.  The time
+and peak memory (where tracemalloc is available) per window are
+reported.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = pd = None
+
+from _pydevd_bundle import pydevd_vars
+from tests.benchmarks import Timer, report
+
+
+def _frame(rows, cols):
+    rng = np.random.RandomState(0)
+    data = {}
+    for i in range(cols):
+        if i % 4 == 0:
+            data['int{}'.format(i)] = rng.randint(0, 1000, rows)
+        elif i % 4 == 3:
+            data['str{}'.format(i)] = rng.randint(0, 1000, rows).astype(str)
+        else:
+            data['float{}'.format(i)] = rng.rand(rows)
+    return pd.DataFrame(data)
+
+
+def _get_xml(df, start, window):
+    return pydevd_vars.dataframe_to_xml(df, 'df', start, 0, window,
+                                        window, '%')
+
+
+def _get_window(df, start, window, stats=False):
+    return pydevd_vars.table_window(df, start, window, 0, window,
+                                    stats=stats)
+
+
+def _measure(get, count):
+    if tracemalloc is not None:
+        tracemalloc.start()
+    with Timer() as timer:
+        for _ in range(count):
+            get()
+    peak = None
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+    return timer.elapsed * 1e3 / count, peak
+
+
+def run(rows, cols, window, count):
+    df = _frame(rows, cols)
+    # dataframe_to_xml only shows the first rows, so use those for both.
+    start = min(rows, pydevd_vars.MAX_SLICE_SIZE) // 2
+    for name, get in [
+        ('dataframe_to_xml', lambda: _get_xml(df, start, window)),
+        ('table_window', lambda: _get_window(df, start, window)),
+        ('table_window_stats',
+         lambda: _get_window(df, start, window, stats=True)),
+    ]:
+        per_window_ms, peak_kb = _measure(get, count)
+        report('table_window',
+               path=name,
+               rows=rows,
+               cols=cols,
+               window=window,
+               per_window_ms=per_window_ms,
+               peak_kb=peak_kb)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_table_window')
+    parser.add_argument('--rows', type=int, action='append')
+    parser.add_argument('--cols', type=int, default=20)
+    parser.add_argument('--window', type=int, default=100)
+    parser.add_argument('--count', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if pd is None:
+        print('pandas is not installed')
+        return
+    for rows in args.rows or (10000, 1000000):
+        run(rows, args.cols, args.window, args.count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Fetching variables on several suspended threads at once.
+
+A script is debugged that starts a number of threads, which all stop at
+a breakpoint.  Then the locals of each thread's top frame are fetched,
+one thread after the other ("serial_ms") and with the requests for all
+threads sent at once ("parallel_ms").  Code is run in the REPL before
+each round so that no responses are cached.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import tempfile
+import time
+
+from tests.benchmarks import Timer, report
+from tests.helpers.debugclient import EasyDebugClient as DebugClient
+from tests.helpers.debugsession import Awaitable
+from tests.system_tests import lifecycle_handshake
+
+
+SCRIPT = '''\
+import threading
+
+def work(i):
+    items = list(range(100))
+    text = 'thread %d' % i
+    mapping = dict((str(n), n) for n in range(20))
+    done.wait()  # break here
+
+done = threading.Event()
+threads = [threading.Thread(target=work, args=(i,)) for i in range({})]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+'''
+BREAK_LINE = 7
+
+
+def _wait_for_stopped(session, count, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        tids = set(msg.body['threadId'] for msg in session.received
+                   if msg.type == 'event' and msg.event == 'stopped')
+        if len(tids) >= count:
+            return sorted(tids)
+        time.sleep(0.05)
+    raise RuntimeError('only {} threads stopped'.format(len(tids)))
+
+
+def _locals_ref(session, tid):
+    req = session.send_request('stackTrace', threadId=tid)
+    req.wait()
+    frame_id = req.resp.body['stackFrames'][0]['id']
+    req = session.send_request('scopes', frameId=frame_id)
+    req.wait()
+    return frame_id, req.resp.body['scopes'][0]['variablesReference']
+
+
+def _invalidate(session, frame_id):
+    req = session.send_request('evaluate', expression='None',
+                               frameId=frame_id, context='repl')
+    req.wait()
+
+
+def run(threads, rounds, port):
+    workdir = tempfile.mkdtemp()
+    filename = os.path.join(workdir, 'threads.py')
+    with open(filename, 'w') as script:
+        script.write(SCRIPT.format(threads))
+    breakpoints = [{
+        'source': {'path': filename},
+        'breakpoints': [{'line': BREAK_LINE}],
+    }]
+
+    with DebugClient(port=port, connecttimeout=5.0) as editor:
+        time.sleep(1.0)
+        adapter, session = editor.host_local_debugger([filename],
+                                                      cwd=workdir)
+        (_, req_launch, _, _, _, _,
+         ) = lifecycle_handshake(session, 'launch', breakpoints=breakpoints)
+        req_launch.wait()
+        tids = _wait_for_stopped(session, threads)
+        refs = [_locals_ref(session, tid) for tid in tids]
+
+        serial = parallel = 0.0
+        for _ in range(rounds):
+            _invalidate(session, refs[0][0])
+            with Timer() as timer:
+                for _, ref in refs:
+                    session.send_request('variables',
+                                         variablesReference=ref).wait()
+            serial += timer.elapsed
+
+            _invalidate(session, refs[0][0])
+            with Timer() as timer:
+                reqs = [session.send_request('variables',
+                                             variablesReference=ref)
+                        for _, ref in refs]
+                Awaitable.wait_all(*reqs)
+            parallel += timer.elapsed
+
+        session.send_request('evaluate', expression='done.set()',
+                             frameId=refs[0][0], context='repl').wait()
+        for tid in tids:
+            session.send_request('continue', threadId=tid)
+        adapter.wait()
+
+    report('variables_threads',
+           threads=threads,
+           serial_ms=serial / rounds * 1e3,
+           parallel_ms=parallel / rounds * 1e3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_variables_threads')
+    parser.add_argument('--threads', type=int, action='append')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--port', type=int, default=9880)
+    args = parser.parse_args(argv)
+
+    for threads in args.threads or (1, 4, 16):
+        run(threads, args.rounds, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
 from ._fake import FakePyDevd  # noqa
 from ._messages import PyDevdMessages  # noqa
 from ._pydevd import RawMessage  # noqa
+from ._replay import ReplayScript, ReplayPyDevd, replay  # noqa
@@ -0,0 +1,274 @@
+from collections import defaultdict, deque
+import contextlib
+import threading
+import time
+
+from _pydevd_bundle.pydevd_comm import CMD_VERSION
+from debugger_protocol.messages import wireformat
+import ptvsd.daemon
+from ptvsd import capture
+from ptvsd.wrapper import LatencyHistogram
+from tests.helpers import socket
+from tests.helpers.vsc import RawMessage
+
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:  # Python 2
+    _cpu_time = time.clock
+
+
+class ReplayScript(object):
+    """What to send to the adapter to replay a recorded session.
+
+    "steps" are the messages the client and pydevd sent on their own
+    (i.e. everything but pydevd's replies), in order, as
+    (record, responses), where "responses" is how many DAP responses
+    had been sent by the adapter before the message was.  "replies"
+    maps each pydevd command ID to the recorded requests for it, in
+    order, as (args, reply), with a reply of None if pydevd never
+    replied.  "responses" is the number of DAP responses recorded.
+    """
+
+    @classmethod
+    def from_records(cls, records):
+        """Return the script for the given capture.Record list."""
+        requests = {}
+        replies = defaultdict(deque)
+        steps = []
+        responses = 0
+        for record in records:
+            if record.stream == capture.STREAM_DAP:
+                if record.inbound:
+                    steps.append((record, responses))
+                elif record.message.get('type') == 'response':
+                    responses += 1
+            elif not record.inbound:
+                cmd_id, seq, args = record.message
+                entry = [args, None]
+                requests[seq] = entry
+                replies[cmd_id].append(entry)
+            else:
+                cmd_id, seq, args = record.message
+                try:
+                    entry = requests.pop(seq)
+                except KeyError:
+                    steps.append((record, responses))
+                else:
+                    entry[1] = (cmd_id, args)
+        return cls(steps, replies, responses)
+
+    @classmethod
+    def load(cls, filename):
+        """Return the script for the given capture file."""
+        return cls.from_records(capture.load(filename))
+
+    def __init__(self, steps, replies, responses):
+        self.steps = steps
+        self.replies = replies
+        self.responses = responses
+
+
+class ReplayPyDevd(object):
+    """A stand-in for pydevd that answers with recorded replies.
+
+    It talks to the adapter's PydevdSocket over the structured channel
+    (recv_command() and send_command()).  Each request is answered
+    right away with the reply that was recorded for the same command,
+    preferring one that was recorded for the same args.
+    """
+
+    VERSION = '1.1.1\tJSON'
+
+    def __init__(self, sock, replies):
+        self._sock = sock
+        self._replies = {cmd_id: deque(tuple(e) for e in entries)
+                         for cmd_id, entries in replies.items()}
+        self._thread = None
+        self.received = 0
+        self.unmatched = 0
+
+    def start(self):
+        # TODO: docstring
+        self._thread = threading.Thread(target=self._run,
+                                        name='ptvsd.test.replay.pydevd')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send_event(self, cmd_id, seq, args):
+        """Send a recorded pydevd event to the adapter."""
+        self._sock.send_command(cmd_id, seq, args)
+
+    def join(self, timeout=None):
+        # TODO: docstring
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            command = self._sock.recv_command()
+            if command is None:
+                return
+            self.received += 1
+            cmd_id, seq, args = command
+            reply = self._find_reply(cmd_id, args)
+            if reply is not None:
+                self._sock.send_command(reply[0], seq, reply[1])
+
+    def _find_reply(self, cmd_id, args):
+        recorded = self._replies.get(cmd_id)
+        if not recorded:
+            self.unmatched += 1
+            if cmd_id == CMD_VERSION:
+                return CMD_VERSION, self.VERSION
+            return None
+        for entry in recorded:
+            if entry[0] == args:
+                recorded.remove(entry)
+                break
+        else:
+            entry = recorded.popleft()
+        return entry[1]
+
+
+class ReplayClient(object):
+    """The DAP client side of a replayed session."""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._cond = threading.Condition()
+        self._pending = {}  # seq -> (command, start)
+        self._thread = None
+        self.responses = 0
+        self.failed = 0
+        self.latency = defaultdict(LatencyHistogram)
+
+    def start(self):
+        # TODO: docstring
+        self._thread = threading.Thread(target=self._run,
+                                        name='ptvsd.test.replay.client')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, msg):
+        """Send a recorded DAP message to the adapter."""
+        data = wireformat.as_bytes(RawMessage(msg))
+        with self._cond:
+            if msg.get('type') == 'request':
+                self._pending[msg['seq']] = msg['command'], time.time()
+        self._sock.sendall(data)
+
+    def wait_for_responses(self, count, timeout):
+        """Return True once "count" responses have been received."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self.responses < count:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def join(self, timeout=None):
+        # TODO: docstring
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        stream = self._sock.makefile('rb')
+        try:
+            while True:
+                try:
+                    msg = wireformat.read(stream, lambda _: RawMessage)
+                except Exception:
+                    msg = None
+                if msg is None:
+                    return
+                self._handle(msg.data)
+        finally:
+            stream.close()
+
+    def _handle(self, msg):
+        if msg.get('type') != 'response':
+            return
+        now = time.time()
+        with self._cond:
+            self.responses += 1
+            if not msg.get('success', True):
+                self.failed += 1
+            request = self._pending.pop(msg.get('request_seq'), None)
+            if request is not None:
+                command, start = request
+                self.latency[command].add(now - start)
+            self._cond.notify_all()
+
+
+def replay(script, pace=False, timeout=5.0):
+    """Run the adapter through a recorded session and return the stats.
+
+    If "pace" is True then each step is sent no earlier (relative to
+    the start) than it was recorded.  Otherwise steps go out as soon as
+    the adapter has sent the DAP responses that came before them.  A
+    step that waits longer than "timeout" is sent anyway (and counted
+    as a stall).
+    """
+    if not isinstance(script, ReplayScript):
+        script = ReplayScript.from_records(script)
+
+    daemon = ptvsd.daemon.Daemon(
+        wait_for_user=(lambda: None),
+        addhandlers=False,
+        killonclose=False,
+        singlesession=True,
+    )
+    listener = socket.create_server(('127.0.0.1', 0))
+    with contextlib.closing(listener):
+        client_sock = socket.create_client()
+        client_sock.connect(listener.getsockname())
+        adapter_sock, _ = listener.accept()
+
+    pydevd = ReplayPyDevd(daemon.start(), script.replies)
+    client = ReplayClient(client_sock)
+    stalls = 0
+    cpu = _cpu_time()
+    start = time.time()
+    try:
+        pydevd.start()
+        client.start()
+        daemon.start_session(adapter_sock, 'ptvsd.Server')
+        for record, responses in script.steps:
+            if pace:
+                delay = start + record.time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            if not client.wait_for_responses(responses, timeout):
+                stalls += 1
+            if record.stream == capture.STREAM_DAP:
+                client.send(record.message)
+            else:
+                pydevd.send_event(*record.message)
+        if not client.wait_for_responses(script.responses, timeout):
+            stalls += 1
+        elapsed = time.time() - start
+        cpu = _cpu_time() - cpu
+    finally:
+        try:
+            daemon.close()
+        except ptvsd.daemon.DaemonClosedError:
+            pass
+        socket.close(client_sock)
+        client.join(timeout)
+        pydevd.join(timeout)
+
+    return {
+        'steps': len(script.steps),
+        'responses': client.responses,
+        'failed': client.failed,
+        'stalls': stalls,
+        'pydevd_commands': pydevd.received,
+        'pydevd_unmatched': pydevd.unmatched,
+        'elapsed': elapsed,
+        'cpu': cpu,
+        'latency': {command: hist.stats
+                    for command, hist in client.latency.items()},
+    }
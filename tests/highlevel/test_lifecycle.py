@@ -17,7 +17,7 @@ from . import (
 )
 
 
-from ptvsd.wrapper import INITIALIZE_RESPONSE
+from ptvsd.wrapper import INITIALIZE_RESPONSE, STACK_PAGE_SIZE
 
 # TODO: Make sure we are handling the following properly:
 #  * initialize args
@@ -109,8 +109,9 @@ class LifecycleTests(HighlevelTest, unittest.TestCase):
             )),
         ])
         self.assert_received(self.debugger, [
-            self.debugger_msgs.new_request(CMD_VERSION,
-                                           *['1.1', expected_os_id, 'ID']),
+            self.debugger_msgs.new_request(
+                CMD_VERSION, *['1.1', expected_os_id, 'ID', 'JSON',
+                               str(STACK_PAGE_SIZE)]),
             self.debugger_msgs.new_request(CMD_REDIRECT_OUTPUT),
             self.debugger_msgs.new_request(CMD_SET_PROJECT_ROOTS,
                                            _get_project_dirs()),
@@ -187,8 +188,9 @@ class LifecycleTests(HighlevelTest, unittest.TestCase):
             self.new_response(req_disconnect),
         ])
         self.assert_received(self.debugger, [
-            self.debugger_msgs.new_request(CMD_VERSION,
-                                           *['1.1', OS_ID, 'ID']),
+            self.debugger_msgs.new_request(
+                CMD_VERSION, *['1.1', OS_ID, 'ID', 'JSON',
+                               str(STACK_PAGE_SIZE)]),
             self.debugger_msgs.new_request(CMD_REDIRECT_OUTPUT),
             self.debugger_msgs.new_request(CMD_SET_PROJECT_ROOTS,
                                            _get_project_dirs()),
@@ -37,6 +37,7 @@ from _pydevd_bundle.pydevd_comm import (
 
 from . import RunningTest
 from ptvsd.wrapper import UnsupportedPyDevdCommandError, INITIALIZE_RESPONSE
+from ptvsd.wrapper import PYDEVD_REQUEST_TIMEOUTS, STACK_PAGE_SIZE
 
 
 def fail(msg):
@@ -98,7 +99,7 @@ class LifecycleTest(RunningTest):
 
 def _get_cmd_version():
     plat = 'WINDOWS' if platform.system() == 'Windows' else 'UNIX'
-    return '1.1\t%s\tID' % plat
+    return '1.1\t%s\tID\tJSON\t%s' % (plat, STACK_PAGE_SIZE)
 
 
 class InitializeTests(LifecycleTest, unittest.TestCase):
@@ -456,6 +457,7 @@ class VariablesTests(NormalRequestTest, unittest.TestCase):
                 variables=[
                     {
                         'evaluateName': 'ham',
+                        'indexedVariables': 3,
                         'name': 'ham',
                         'type': 'list',
                         'value': '[1, 2, 3]',
@@ -497,6 +499,49 @@ class VariablesTests(NormalRequestTest, unittest.TestCase):
             self.expected_pydevd_request('{}\t2\tFRAME'.format(thread.id)),
         ])
 
+    def test_after_timeout(self):
+        timeouts = dict(PYDEVD_REQUEST_TIMEOUTS)
+        self.addCleanup(PYDEVD_REQUEST_TIMEOUTS.update, timeouts)
+        PYDEVD_REQUEST_TIMEOUTS[CMD_GET_FRAME] = 0.1
+        self.PYDEVD_CMD = CMD_GET_FRAME
+        with self.launched():
+            with self.hidden():
+                _, thread = self.pause('t', *[
+                    # (pfid, func, file, line)
+                    (2, 'spam', 'abc.py', 10),  # VSC frame ID 1
+                ])
+            # pydevd does not reply to the first request.
+            self.send_request(
+                variablesReference=1,  # matches frame locals
+            )
+            self.set_debugger_response(
+                # (var, value)
+                ('spam', 'eggs'),
+            )
+            self.send_request(
+                variablesReference=1,  # matches frame locals
+            )
+            received = self.vsc.received
+
+        self.assert_vsc_received(received, [
+            self.expected_failure(
+                'pydevd did not reply to command {} within 0.1s'
+                .format(CMD_GET_FRAME)),
+            self.expected_response(
+                variables=[
+                    {
+                        'evaluateName': 'spam',
+                        'name': 'spam',
+                        'type': 'str',
+                        'value': "'eggs'",
+                        'presentationHint': {
+                            'attributes': ['rawString'],
+                        },
+                    },
+                ],
+            ),
+        ])
+
     def test_invalid_var_ref(self):
         with self.launched():
             with self.hidden():
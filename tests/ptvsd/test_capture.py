@@ -0,0 +1,157 @@
+import io
+import json
+import unittest
+
+from _pydevd_bundle.pydevd_comm import CMD_LIST_THREADS, CMD_VERSION
+
+from ptvsd import capture
+from ptvsd.capture import Recorder, STREAM_DAP, STREAM_PYDEVD
+from ptvsd.ipcjson import SocketIO, IpcChannel
+from ptvsd.wrapper import PydevdSocket
+from tests.helpers.pydevd import ReplayScript, replay
+
+
+def _read(data):
+    return list(capture.iter_records(io.BytesIO(data)))
+
+
+class BufferSocket(object):
+
+    def __init__(self, data=b''):
+        self.data = data
+        self.sent = []
+
+    def recv(self, count):
+        data, self.data = self.data[:count], self.data[count:]
+        return data
+
+    def sendall(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        pass
+
+
+class Channel(SocketIO, IpcChannel):
+
+    def on_threads(self, request, args):
+        self.send_response(request, threads=[])
+
+
+class CaptureFormatTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        file = io.BytesIO()
+        recorder = Recorder(file)
+        recorder.record_dap(True, b'{"seq": 1}')
+        recorder.record_pydevd(False, 501, 1000000000, u'1.1\tspam\u20ac')
+        recorder.record_pydevd(True, '502', 7, {'thread': []})
+        recorder.record_dap(False, u'{"seq": "\u20ac"}')
+        recorder.close()
+        records = _read(file.getvalue())
+
+        self.assertEqual([r[1:] for r in records], [
+            (STREAM_DAP, True, {'seq': 1}),
+            (STREAM_PYDEVD, False, (501, 1000000000, u'1.1\tspam\u20ac')),
+            (STREAM_PYDEVD, True, (502, 7, {'thread': []})),
+            (STREAM_DAP, False, {'seq': u'\u20ac'}),
+        ])
+        times = [r.time for r in records]
+        self.assertEqual(times, sorted(times))
+
+    def test_not_a_capture(self):
+        with self.assertRaises(ValueError):
+            _read(b'Content-Length: 2\r\n\r\n{}')
+        with self.assertRaises(ValueError):
+            _read(b'PTV')
+
+    def test_truncated(self):
+        file = io.BytesIO()
+        recorder = Recorder(file)
+        recorder.record_dap(True, b'{"seq": 1}')
+        recorder.close()
+
+        with self.assertRaises(ValueError):
+            _read(file.getvalue()[:-1])
+
+    def test_closed(self):
+        file = io.BytesIO()
+        recorder = Recorder(file)
+        recorder.close()
+        recorder.record_dap(True, b'{}')
+
+        self.assertEqual(_read(file.getvalue()), [])
+
+
+class CaptureHookTests(unittest.TestCase):
+
+    def test_socketio(self):
+        file = io.BytesIO()
+        request = {'type': 'request', 'seq': 1, 'command': 'threads'}
+        content = json.dumps(request).encode('utf-8')
+        data = ('Content-Length: {}\r\n\r\n'.format(len(content))
+                ).encode('ascii') + content
+        channel = Channel(socket=BufferSocket(data), capture=Recorder(file))
+        channel.process_one_message()
+        records = _read(file.getvalue())
+
+        self.assertEqual([(r.stream, r.inbound) for r in records], [
+            (STREAM_DAP, True),
+            (STREAM_DAP, False),
+        ])
+        self.assertEqual(records[0].message, request)
+        self.assertEqual(records[1].message['command'], 'threads')
+
+    def test_pydevd_socket(self):
+        file = io.BytesIO()
+        sock = PydevdSocket(
+            (lambda *args: None),
+            (lambda: None),
+            (lambda: ('localhost', 8888)),
+            (lambda: ('localhost', 8888)),
+            capture=Recorder(file),
+        )
+        self.addCleanup(sock.close)
+        sock.pydevd_notify(CMD_VERSION, 5)
+        sock.send_command(103, 2, {'thread': []})
+        records = _read(file.getvalue())
+
+        self.assertEqual([r[1:] for r in records], [
+            (STREAM_PYDEVD, False, (CMD_VERSION, 1000000000, u'5')),
+            (STREAM_PYDEVD, True, (103, 2, {'thread': []})),
+        ])
+
+
+class ReplayTests(unittest.TestCase):
+
+    def test_replay(self):
+        file = io.BytesIO()
+        recorder = Recorder(file)
+        for seq, command in enumerate(['initialize', 'launch', 'threads']):
+            recorder.record_dap(True, json.dumps({
+                'type': 'request',
+                'seq': seq,
+                'command': command,
+                'arguments': {},
+            }))
+            if command == 'threads':
+                recorder.record_pydevd(False, CMD_LIST_THREADS, 7, u'')
+                recorder.record_pydevd(True, CMD_LIST_THREADS, 7, {
+                    'thread': [{'name': 'MainThread', 'id': 'pid_1_id_1'}],
+                })
+            recorder.record_dap(False, json.dumps({
+                'type': 'response',
+                'seq': seq,
+                'request_seq': seq,
+                'command': command,
+            }))
+        recorder.close()
+        script = ReplayScript.from_records(_read(file.getvalue()))
+        results = replay(script)
+
+        self.assertEqual(len(script.steps), 3)
+        self.assertEqual(results['responses'], 3)
+        self.assertEqual(results['failed'], 0)
+        self.assertEqual(results['stalls'], 0)
+        self.assertEqual(sorted(results['latency']),
+                         ['initialize', 'launch', 'threads'])
@@ -0,0 +1,131 @@
+import sys
+import threading
+import unittest
+
+from ptvsd import futures
+from ptvsd.futures import (
+    EventLoop, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+
+class EventLoopTests(unittest.TestCase):
+
+    def new_loop(self):
+        return EventLoop()
+
+    def start_loop(self):
+        loop = self.new_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            loop.stop()
+            thread.join(5)
+        self.addCleanup(stop)
+        return loop
+
+    def test_priorities(self):
+        loop = self.new_loop()
+        calls = []
+        loop.call_soon(calls.append, 'normal1')
+        loop.call_soon(calls.append, 'low', priority=PRIORITY_LOW)
+        loop.call_soon(calls.append, 'high1', priority=PRIORITY_HIGH)
+        loop.call_soon(calls.append, 'normal2', priority=PRIORITY_NORMAL)
+
+        def high():
+            calls.append('high2')
+            # This jumps ahead of everything that is already queued.
+            loop.call_soon(calls.append, 'high3', priority=PRIORITY_HIGH)
+        loop.call_soon(high, priority=PRIORITY_HIGH)
+        loop.call_soon(loop.stop, priority=PRIORITY_LOW)
+        loop.run_forever()
+
+        self.assertEqual(calls, [
+            'high1', 'high2', 'high3', 'normal1', 'normal2', 'low'])
+
+    def test_wake_on_submit(self):
+        loop = self.start_loop()
+        done = threading.Event()
+        for _ in range(20):
+            done.clear()
+            loop.call_soon(done.set)
+            self.assertTrue(done.wait(5))
+        stats = loop.stats
+
+        self.assertEqual(stats['normal']['calls'], 20)
+        self.assertEqual(stats['normal']['depth'], 0)
+        self.assertEqual(stats['high']['calls'], 0)
+        # The old loop polled every 0.1s.
+        self.assertLess(stats['normal']['wait_max'], 0.1)
+
+    def test_stats(self):
+        loop = self.new_loop()
+        for _ in range(3):
+            loop.call_soon(lambda: None, priority=PRIORITY_LOW)
+        loop.call_soon(loop.stop, priority=PRIORITY_LOW)
+        self.assertEqual(loop.stats['low']['depth'], 4)
+        loop.run_forever()
+        stats = loop.stats['low']
+
+        self.assertEqual(stats['calls'], 4)
+        self.assertEqual(stats['max_depth'], 4)
+        self.assertEqual(stats['depth'], 0)
+        self.assertGreaterEqual(stats['wait_total'], stats['wait_max'])
+        self.assertGreaterEqual(stats['run_total'], stats['run_max'])
+
+    def test_bad_priority(self):
+        loop = self.new_loop()
+
+        with self.assertRaises(ValueError):
+            loop.call_soon(lambda: None, priority=5)
+        with self.assertRaises(TypeError):
+            loop.call_soon(lambda: None, spam=1)
+
+    def test_future_priority(self):
+        loop = self.new_loop()
+        calls = []
+        normal = loop.create_future()
+        high = loop.create_future(PRIORITY_HIGH)
+        normal.add_done_callback(lambda fut: calls.append(fut.result()))
+        high.add_done_callback(lambda fut: calls.append(fut.result()))
+        normal.set_result('normal')
+        high.set_result('high')
+        loop.call_soon(loop.stop, priority=PRIORITY_LOW)
+        loop.run_forever()
+
+        self.assertEqual(calls, ['high', 'normal'])
+
+    def test_wrap_async(self):
+        loop = self.start_loop()
+
+        class Spam(object):
+            def eggs(self, x):
+                fut = loop.create_future()
+                loop.call_soon(fut.set_result, x * 2)
+                y = yield fut
+                yield futures.Result(y + 1)
+        eggs = futures.wrap_async(Spam.eggs)
+        done = threading.Event()
+        result = eggs(Spam(), loop, 20)
+        result.add_done_callback(lambda _: done.set())
+        done.wait(5)
+
+        self.assertEqual(result.result(), 41)
+
+
+@unittest.skipIf(sys.version_info < (3, 4), 'asyncio is not available')
+class AsyncioEventLoopTests(EventLoopTests):
+
+    def new_loop(self):
+        loop = futures.AsyncioEventLoop()
+        # Only a loop that ran closes its asyncio loop.  (Cleanups run in
+        # reverse, so a started loop is stopped before this.)
+        self.addCleanup(loop.asyncio_loop.close)
+        return loop
+
+    def test_new_event_loop(self):
+        loop = futures.new_event_loop('asyncio')
+        self.addCleanup(loop.asyncio_loop.close)
+
+        self.assertIsInstance(loop, futures.AsyncioEventLoop)
+        self.assertIsInstance(futures.new_event_loop('thread'), EventLoop)
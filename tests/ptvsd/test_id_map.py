@@ -0,0 +1,58 @@
+import unittest
+
+from ptvsd.wrapper import IDMap, ScopedIDMap
+
+
+class IDMapTests(unittest.TestCase):
+
+    def test_add_and_remove(self):
+        id_map = IDMap()
+        vsc_id = id_map.add(('spam', 1))
+
+        self.assertEqual(id_map.to_pydevd(vsc_id), ('spam', 1))
+        self.assertEqual(id_map.to_vscode(('spam', 1), autogen=False),
+                         vsc_id)
+
+        id_map.remove(vscode_id=vsc_id)
+
+        self.assertEqual(id_map.pairs(), [])
+
+
+class ScopedIDMapTests(unittest.TestCase):
+
+    def test_remove_scope(self):
+        id_map = ScopedIDMap()
+        spam = [id_map.to_vscode(('spam', i), autogen=True)
+                for i in range(3)]
+        eggs = id_map.to_vscode(('eggs', 0), autogen=True)
+
+        removed = id_map.remove_scope('spam')
+
+        self.assertEqual(removed, 3)
+        self.assertEqual(id_map.pairs(), [(('eggs', 0), eggs)])
+        for vsc_id in spam:
+            with self.assertRaises(KeyError):
+                id_map.to_pydevd(vsc_id)
+        self.assertEqual(id_map.remove_scope('spam'), 0)
+
+    def test_remove_then_scope(self):
+        id_map = ScopedIDMap()
+        vsc_id = id_map.add(('spam', 0))
+        id_map.add(('spam', 1))
+
+        id_map.remove(('spam', 0), vsc_id)
+
+        self.assertEqual(id_map.remove_scope('spam'), 1)
+        self.assertEqual(id_map.pairs(), [])
+        self.assertEqual(id_map._scopes, {})
+
+    def test_added_twice(self):
+        id_map = ScopedIDMap()
+        first = id_map.add(('spam', 0))
+        second = id_map.add(('spam', 0))
+
+        id_map.remove_scope('spam')
+
+        self.assertEqual(id_map.pairs(), [])
+        self.assertEqual(id_map.vscode_ids(), [])
+        self.assertNotEqual(first, second)
@@ -1,6 +1,6 @@
 import os
 import unittest
-import ptvsd.untangle
+import ptvsd.version
 
 from ptvsd.wrapper import InternalsFilter
 from ptvsd.wrapper import dont_trace_ptvsd_files
@@ -10,10 +10,10 @@ class InternalsFilterTests(unittest.TestCase):
     def test_internal_paths(self):
         int_filter = InternalsFilter()
         internal_dir = os.path.dirname(
-            os.path.abspath(ptvsd.untangle.__file__)
+            os.path.abspath(ptvsd.version.__file__)
         )
         internal_files = [
-            os.path.abspath(ptvsd.untangle.__file__),
+            os.path.abspath(ptvsd.version.__file__),
             # File used by VS Only
             os.path.join('somepath', 'ptvsd_launcher.py'),
             # Any file under ptvsd
@@ -31,11 +31,47 @@ class InternalsFilterTests(unittest.TestCase):
         for fp in files:
             self.assertFalse(int_filter.is_internal_path(fp))
 
+    def test_backslashes(self):
+        int_filter = InternalsFilter()
+        internal_dir = os.path.dirname(
+            os.path.abspath(ptvsd.version.__file__)
+        )
+
+        self.assertTrue(int_filter.is_internal_path(
+            internal_dir.replace('/', '\\') + '\\somefile.py'))
+        self.assertTrue(int_filter.is_internal_path(
+            'C:\\somepath\\ptvsd_launcher.py'))
+
+    def test_add(self):
+        int_filter = InternalsFilter()
+        files = [
+            os.path.join('somepath', 'framework', 'somefile.py'),
+            os.path.join('somepath', 'runner.py'),
+        ]
+        for fp in files:
+            self.assertFalse(int_filter.is_internal_path(fp))
+
+        int_filter.add(files=['/runner.py', ''],
+                       path_prefixes=[os.path.join('somepath', 'framework')])
+
+        for fp in files:
+            self.assertTrue(int_filter.is_internal_path(fp))
+        self.assertFalse(int_filter.is_internal_path(__file__))
+
+    def test_cache_size(self):
+        int_filter = InternalsFilter()
+        int_filter.CACHE_SIZE = 10
+        for i in range(25):
+            path = os.path.join('somepath', 'file{}.py'.format(i))
+            self.assertFalse(int_filter.is_internal_path(path))
+        self.assertLessEqual(len(int_filter._cache), 10)
+        self.assertFalse(int_filter.is_internal_path(path))
+
 
 class PtvsdFileTraceFilter(unittest.TestCase):
     def test_basic(self):
         internal_dir = os.path.dirname(
-            os.path.abspath(ptvsd.untangle.__file__))
+            os.path.abspath(ptvsd.version.__file__))
 
         test_paths = {
             os.path.join(internal_dir, 'wrapper.py'): True,
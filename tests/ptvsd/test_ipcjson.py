@@ -0,0 +1,338 @@
+import errno
+import json
+import socket
+import sys
+import threading
+import unittest
+
+from ptvsd.ipcjson import (
+    SocketIO, IpcChannel, OutboundQueue, InvalidHeaderError,
+    InvalidContentError, OVERFLOW_DROP_EVENTS, MAX_IOVECS,
+    MAX_IDLE_READ_BUFFER)
+
+
+def _encode(msg):
+    content = json.dumps(msg).encode('utf-8')
+    header = 'Content-Length: {}\r\n\r\n'.format(len(content))
+    return header.encode('ascii') + content
+
+
+class ChunkedSocket(object):
+    """A fake socket that returns the data in fixed-size chunks."""
+
+    def __init__(self, data, chunksize):
+        self._data = data
+        self._chunksize = chunksize
+
+    def recv(self, count):
+        count = min(count, self._chunksize)
+        data, self._data = self._data[:count], self._data[count:]
+        return data
+
+    def recv_into(self, buf):
+        data = self.recv(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class BlockingWriteSocket(object):
+    """A fake socket that records writes, once allowed to."""
+
+    def __init__(self):
+        self.writes = []
+        self.allowed = threading.Event()
+
+    def sendall(self, data):
+        self.allowed.wait()
+        self.writes.append(data)
+
+
+class SlowSendmsgSocket(object):
+    """A fake socket whose writes time out or only partly succeed."""
+
+    def __init__(self, timeouts, chunksize):
+        self.timeouts = timeouts
+        self.chunksize = chunksize
+        self.data = b''
+        self.calls = []
+
+    def sendmsg(self, buffers):
+        self.calls.append(len(buffers))
+        if self.timeouts:
+            self.timeouts -= 1
+            raise socket.timeout('timed out')
+        data = b''.join(buffers)[:self.chunksize]
+        self.data += data
+        return len(data)
+
+
+class FailingSocket(object):
+    """A fake socket whose writes fail."""
+
+    def sendall(self, data):
+        raise IOError(errno.EIO, 'I/O error')
+
+
+class Output(object):
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, text):
+        self.written.append(text)
+
+    def flush(self):
+        pass
+
+
+class RecvOnlySocket(ChunkedSocket):
+
+    recv_into = None
+
+
+class Channel(SocketIO, IpcChannel):
+
+    def __init__(self, *args, **kwargs):
+        super(Channel, self).__init__(*args, **kwargs)
+        self.received = []
+
+    def on_request(self, request):
+        self.received.append(request)
+
+
+class SocketIOReadTests(unittest.TestCase):
+
+    def _read_all(self, sock):
+        channel = Channel(socket=sock)
+        while True:
+            try:
+                channel.process_one_message()
+            except EOFError:
+                break
+        return channel.received
+
+    def test_chunk_boundaries(self):
+        msgs = [
+            {'type': 'request', 'seq': i, 'command': 'evaluate',
+             'arguments': {'expression': u'x' * i + u'\u20ac'}}
+            for i in range(50)
+        ]
+        data = b''.join(_encode(msg) for msg in msgs)
+        for chunksize in (1, 2, 3, 7, 64, len(data)):
+            received = self._read_all(ChunkedSocket(data, chunksize))
+
+            self.assertEqual(received, msgs)
+
+    def test_large_message(self):
+        msg = {'type': 'request', 'seq': 1, 'command': 'setBreakpoints',
+               'arguments': {'breakpoints': [{'line': i}
+                                             for i in range(50000)]}}
+        data = _encode(msg) * 3
+        received = self._read_all(ChunkedSocket(data, 100000))
+
+        self.assertEqual(received, [msg] * 3)
+
+    def test_buffer_shrinks(self):
+        large = {'type': 'request', 'seq': 1, 'command': 'setBreakpoints',
+                 'arguments': {'breakpoints': [{'line': i}
+                                               for i in range(100000)]}}
+        small = {'type': 'request', 'seq': 2, 'command': 'threads'}
+        data = _encode(large) + _encode(small)
+        channel = Channel(socket=ChunkedSocket(data, 100000))
+        channel.process_one_message()
+        grown = len(channel._SocketIO__buffer)
+        channel.process_one_message()
+        with self.assertRaises(EOFError):
+            channel.process_one_message()
+
+        self.assertEqual(channel.received, [large, small])
+        self.assertGreater(grown, MAX_IDLE_READ_BUFFER)
+        self.assertLessEqual(len(channel._SocketIO__buffer),
+                             MAX_IDLE_READ_BUFFER)
+
+    def test_without_recv_into(self):
+        msg = {'type': 'request', 'seq': 1, 'command': 'threads'}
+        data = _encode(msg) * 2
+        received = self._read_all(RecvOnlySocket(data, 5))
+
+        self.assertEqual(received, [msg] * 2)
+
+    def test_extra_headers(self):
+        content = b'{"type": "request", "seq": 1, "command": "threads"}'
+        length = str(len(content)).encode('ascii')
+        data = b''.join([b'Content-Type: application/json\r\n',
+                         b'Content-Length: ', length, b'\r\n\r\n',
+                         content])
+        received = self._read_all(ChunkedSocket(data, 10))
+
+        self.assertEqual(received, [json.loads(content.decode('utf-8'))])
+
+    def test_header_not_terminated(self):
+        channel = Channel(socket=ChunkedSocket(b'Content-Length: 10', 4))
+
+        with self.assertRaises(InvalidHeaderError):
+            channel._wait_for_message()
+
+    def test_missing_content_length(self):
+        channel = Channel(socket=ChunkedSocket(b'Spam: 10\r\n\r\n', 4))
+
+        with self.assertRaises(InvalidHeaderError):
+            channel._wait_for_message()
+
+    def test_truncated_content(self):
+        data = _encode({'type': 'request', 'seq': 1})[:-3]
+        channel = Channel(socket=ChunkedSocket(data, 4))
+
+        with self.assertRaises(InvalidContentError):
+            channel._wait_for_message()
+
+    def test_real_socket(self):
+        msgs = [{'type': 'request', 'seq': i, 'command': 'threads'}
+                for i in range(100)]
+        client, server = socket.socketpair()
+        try:
+            def send():
+                for msg in msgs:
+                    client.sendall(_encode(msg))
+                client.shutdown(socket.SHUT_WR)
+            t = threading.Thread(target=send)
+            t.start()
+            received = self._read_all(server)
+            t.join()
+        finally:
+            client.close()
+            server.close()
+
+        self.assertEqual(received, msgs)
+
+
+class SocketIOWriteTests(unittest.TestCase):
+
+    def test_synchronous(self):
+        client, server = socket.socketpair()
+        try:
+            channel = Channel(socket=client, own_socket=False)
+            for _ in range(3):
+                channel.send_event('spam', x=1)
+            client.shutdown(socket.SHUT_WR)
+            received = Channel(socket=server, own_socket=False)
+            received.on_event = received.received.append
+            while True:
+                try:
+                    received.process_one_message()
+                except EOFError:
+                    break
+        finally:
+            client.close()
+            server.close()
+
+        self.assertEqual([msg['seq'] for msg in received.received],
+                         [0, 1, 2])
+        self.assertIsNone(channel.outbound_stats)
+
+    def test_writer_thread(self):
+        client, server = socket.socketpair()
+        try:
+            channel = Channel(socket=client, max_pending=10)
+            for _ in range(100):
+                channel.send_event('spam', x=1)
+            channel.send_response({'seq': 1, 'command': 'eggs'})
+            channel.close()
+            received = Channel(socket=server, own_socket=False)
+            received.on_event = received.received.append
+            received.on_response = received.received.append
+            while True:
+                try:
+                    received.process_one_message()
+                except EOFError:
+                    break
+        finally:
+            server.close()
+        stats = channel.outbound_stats
+
+        self.assertEqual([msg['seq'] for msg in received.received],
+                         list(range(101)))
+        self.assertEqual(received.received[-1]['type'], 'response')
+        self.assertEqual(stats['queued'], 101)
+        self.assertEqual(stats['written'], 101)
+        self.assertEqual(stats['dropped'], 0)
+        self.assertEqual(stats['depth'], 0)
+        self.assertLessEqual(stats['max_depth'], 10)
+        self.assertLessEqual(stats['flushes'], 101)
+
+    def test_coalesced(self):
+        sock = BlockingWriteSocket()
+        queue = OutboundQueue(sock, maxsize=10)
+        for i in range(5):
+            queue.put([b'<', str(i).encode('ascii'), b'>'])
+        sock.allowed.set()
+        flushed = queue.flush(timeout=5)
+        queue.close()
+        stats = queue.stats
+
+        self.assertTrue(flushed)
+        self.assertEqual(b''.join(sock.writes), b'<0><1><2><3><4>')
+        self.assertLessEqual(len(sock.writes), 2)
+        self.assertEqual(stats['written'], 5)
+        self.assertEqual(stats['bytes'], 15)
+
+    def test_drop_events(self):
+        sock = BlockingWriteSocket()
+        queue = OutboundQueue(sock, maxsize=2, overflow=OVERFLOW_DROP_EVENTS)
+        queue.put([b'0'])
+        # Wait for the writer to take the first message.
+        while queue.stats['depth']:
+            pass
+        results = [queue.put([str(i).encode('ascii')], droppable=True)
+                   for i in range(1, 5)]
+        sock.allowed.set()
+        queue.close()
+        stats = queue.stats
+
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(b''.join(sock.writes), b'012')
+        self.assertEqual(stats['dropped'], 2)
+
+    def test_retry_timeouts(self):
+        sock = SlowSendmsgSocket(timeouts=3, chunksize=4)
+        queue = OutboundQueue(sock, maxsize=10)
+        for i in range(5):
+            queue.put([b'<', str(i).encode('ascii'), b'>'])
+        flushed = queue.flush(timeout=5)
+        queue.put([b'<5>'])
+        queue.close()
+        stats = queue.stats
+
+        self.assertTrue(flushed)
+        self.assertEqual(sock.data, b'<0><1><2><3><4><5>')
+        self.assertEqual(stats['retries'], 3)
+        self.assertEqual(stats['written'], 6)
+
+    def test_iovecs_capped(self):
+        sock = SlowSendmsgSocket(timeouts=0, chunksize=1 << 20)
+        queue = OutboundQueue(sock, maxsize=2000)
+        for i in range(MAX_IOVECS * 2):
+            queue.put([b'<', b'>'])
+        queue.close()
+
+        self.assertEqual(sock.data, b'<>' * MAX_IOVECS * 2)
+        self.assertLessEqual(max(sock.calls), MAX_IOVECS)
+
+    def test_write_failed(self):
+        queue = OutboundQueue(FailingSocket(), maxsize=10)
+        stderr = sys.__stderr__
+        sys.__stderr__ = output = Output()
+        try:
+            queue.put([b'<0>'])
+            queue.flush(timeout=5)
+            results = [queue.put([b'<1>']), queue.put([b'<2>'])]
+            queue.close()
+        finally:
+            sys.__stderr__ = stderr
+
+        self.assertEqual(results, [False, False])
+        self.assertEqual(sum(text.startswith('Traceback')
+                             for text in output.written), 1)
@@ -0,0 +1,99 @@
+import sys
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+from _pydevd_bundle import pydevd_comm, pydevd_xml
+from _pydevd_bundle.pydevd_comm import NetCommandFactory
+
+from ptvsd import lightxml
+
+
+def _etree(text):
+    return ElementTree.fromstring(text.encode('utf8'))
+
+
+class ParseTests(unittest.TestCase):
+
+    def assert_same_as_etree(self, text, name, attrs):
+        expected = _etree(text).findall(name)
+        actual = lightxml.parse(text).get_elements(name)
+
+        self.assertEqual(len(actual), len(expected))
+        for element, xelement in zip(actual, expected):
+            for attr in attrs:
+                self.assertEqual(element[attr], xelement.get(attr))
+
+    def test_vars(self):
+        values = {
+            'x': 1,
+            'y<&>"\t': u'spam\n\u20ac "eggs" <ham> & \'spam\'',
+            'z': [1, 2, {'a': None}],
+        }
+        text = '<xml>' + pydevd_xml.frame_vars_to_xml(values) + '</xml>'
+
+        self.assert_same_as_etree(
+            text, 'var',
+            ('name', 'type', 'qualifier', 'value', 'isContainer', 'spam'))
+
+    def test_frames(self):
+        text = NetCommandFactory().make_thread_suspend_str(
+            'pid_1_id_1', sys._getframe(), pydevd_comm.CMD_SET_BREAK, '')
+        root = lightxml.parse(text)
+        xthread = _etree(text).find('thread')
+
+        self.assertEqual(root.thread['id'], xthread.get('id'))
+        self.assertEqual(root.thread['stop_reason'],
+                         xthread.get('stop_reason'))
+        frames = root.thread.get_elements('frame')
+        xframes = xthread.findall('frame')
+        self.assertEqual(
+            [(f['id'], f['name'], f['file'], f['line']) for f in frames],
+            [tuple(f.get(attr) for attr in ('id', 'name', 'file', 'line'))
+             for f in xframes])
+
+    def test_entities_and_whitespace(self):
+        root = lightxml.parse(
+            u"<?xml version='1.0'?>\n"
+            u"<xml><io s='a&#9;b&#x20ac;&apos;' ctx=\"1\tx\" /></xml>\n")
+
+        self.assertEqual(root.io['s'], u"a\tb\u20ac'")
+        self.assertEqual(root.io['ctx'], u'1 x')
+        self.assertIsNone(root.io['spam'])
+
+    def test_children(self):
+        root = lightxml.parse(
+            '<xml><thread id="1"><frame id="2" /></thread><spam />'
+            '<thread id="3"><frame id="4"><frame id="5" /></frame></thread>'
+            '</xml>')
+        threads = list(root.iter_elements('thread'))
+
+        self.assertEqual([t['id'] for t in threads], ['1', '3'])
+        self.assertEqual(threads[1].frame['id'], '4')
+        self.assertEqual(threads[1].frame.frame['id'], '5')
+        self.assertEqual(len(root), 3)
+        self.assertEqual(len(root.spam), 0)
+        self.assertTrue(root.spam)
+        self.assertEqual(root.thread[1]['id'], '3')
+        self.assertEqual(root.get_elements('var'), [])
+        with self.assertRaises(AttributeError):
+            root.var
+
+    def test_bytes(self):
+        root = lightxml.parse(u'<xml><var name="\u20ac" /></xml>'
+                              .encode('utf-8'))
+
+        self.assertEqual(root.var['name'], u'\u20ac')
+
+    def test_malformed(self):
+        for text in ['Traceback (most recent call last):\n',
+                     '',
+                     '<xml><var name="x" </xml>',
+                     '<xml><var name="x"></xml>',
+                     '<xml></var></xml>',
+                     '<xml>',
+                     '<xml/><xml/>',
+                     '<xml><var name="&spam;" /></xml>']:
+            with self.assertRaises(ValueError):
+                root = lightxml.parse(text)
+                for var in root.iter_elements():
+                    var['name']
@@ -1,8 +1,9 @@
 import sys
 import threading
 import time
+import types
 import unittest
-import ptvsd.untangle
+import ptvsd.version
 
 from ptvsd.wrapper import ModulesManager
 
@@ -34,7 +35,7 @@ class ModulesManagerTests(unittest.TestCase):
         sink = ModulesEventSink()
         mgr = ModulesManager(sink)
 
-        orig_module = sys.modules['ptvsd.untangle']
+        orig_module = sys.modules['ptvsd.version']
         expected_module = {
             'id': 1,
             'name': orig_module.__name__,
@@ -44,7 +45,7 @@ class ModulesManagerTests(unittest.TestCase):
         }
 
         self.assertEqual(expected_module,
-                         mgr.add_or_get_from_path(ptvsd.untangle.__file__))
+                         mgr.add_or_get_from_path(ptvsd.version.__file__))
         self.assertEqual(1, len(sink.event_data))
         self.assertEqual([expected_module],
                          mgr.get_all())
@@ -84,7 +85,7 @@ class ModulesManagerTests(unittest.TestCase):
         sink = ModulesEventSink()
         self.mgr = ModulesManager(sink)
 
-        orig_module = sys.modules['ptvsd.untangle']
+        orig_module = sys.modules['ptvsd.version']
         expected_module = {
             'id': 1,
             'name': orig_module.__name__,
@@ -112,3 +113,111 @@ class ModulesManagerTests(unittest.TestCase):
         self.assertEqual(1, len(sink.event_data))
         self.assertEqual([expected_module],
                          self.mgr.get_all())
+
+    def test_module_imported_later(self):
+        sink = ModulesEventSink()
+        mgr = ModulesManager(sink)
+        self.assertIsNone(mgr.add_or_get_from_path('/abc/later.py'))
+
+        module = types.ModuleType('later')
+        module.__file__ = '/abc/later.py'
+        sys.modules['later'] = module
+        try:
+            found = mgr.add_or_get_from_path('/abc/later.py')
+        finally:
+            del sys.modules['later']
+
+        self.assertEqual('later', found['name'])
+        self.assertEqual([found], mgr.get_all())
+
+    def test_unloaded_module(self):
+        sink = ModulesEventSink()
+        mgr = ModulesManager(sink)
+        module = types.ModuleType('unloaded')
+        module.__file__ = '/abc/unloaded.py'
+        sys.modules['unloaded'] = module
+        try:
+            found = mgr.add_or_get_from_path('/abc/unloaded.py')
+            mgr.check_unloaded_modules()
+        finally:
+            del sys.modules['unloaded']
+        self.assertEqual(1, len(sink.event_data))
+
+        mgr.check_unloaded_modules()
+
+        self.assertEqual([], mgr.get_all())
+        self.assertEqual({
+                'event': 'module',
+                'args': {
+                    'reason': 'removed',
+                    'module': found,
+                },
+            },
+            sink.event_data[-1])
+        self.assertIsNone(mgr.add_or_get_from_path('/abc/unloaded.py'))
+
+    def test_replaced_module(self):
+        sink = ModulesEventSink()
+        mgr = ModulesManager(sink)
+        module = types.ModuleType('replaced')
+        module.__file__ = '/abc/replaced.py'
+        sys.modules['replaced'] = module
+        try:
+            found = mgr.add_or_get_from_path('/abc/replaced.py')
+            # It is re-imported from the same file.
+            del sys.modules['replaced']
+            module = types.ModuleType('replaced')
+            module.__file__ = '/abc/replaced.py'
+            sys.modules['replaced'] = module
+            mgr.check_unloaded_modules()
+        finally:
+            del sys.modules['replaced']
+
+        self.assertEqual(1, len(sink.event_data))
+        self.assertEqual([found], mgr.get_all())
+        self.assertEqual(found, mgr.add_or_get_from_path('/abc/replaced.py'))
+
+    def test_unloaded_before_other_lookup(self):
+        sink = ModulesEventSink()
+        mgr = ModulesManager(sink)
+        first = types.ModuleType('zz_a')
+        first.__file__ = '/abc/zz_a.py'
+        second = types.ModuleType('zz_b')
+        second.__file__ = '/abc/zz_b.py'
+        sys.modules['zz_a'] = first
+        try:
+            found = mgr.add_or_get_from_path('/abc/zz_a.py')
+            mgr.check_unloaded_modules()
+        finally:
+            del sys.modules['zz_a']
+        sys.modules['zz_b'] = second
+        try:
+            # The lookup notices zz_a is gone before the next check.
+            other = mgr.add_or_get_from_path('/abc/zz_b.py')
+            mgr.check_unloaded_modules()
+        finally:
+            del sys.modules['zz_b']
+
+        self.assertEqual(['new', 'new', 'removed'],
+                         [e['args']['reason'] for e in sink.event_data])
+        self.assertEqual(found, sink.event_data[-1]['args']['module'])
+        self.assertEqual([other], mgr.get_all())
+
+    def test_module_imported_in_place_of_another(self):
+        sink = ModulesEventSink()
+        mgr = ModulesManager(sink)
+        sys.modules['zz_placeholder'] = None
+        try:
+            mgr.check_unloaded_modules()
+        finally:
+            del sys.modules['zz_placeholder']
+        module = types.ModuleType('zz_new')
+        module.__file__ = '/abc/zz_new.py'
+        # sys.modules keeps its size, with the same indexed modules.
+        sys.modules['zz_new'] = module
+        try:
+            found = mgr.add_or_get_from_path('/abc/zz_new.py')
+        finally:
+            del sys.modules['zz_new']
+
+        self.assertEqual('zz_new', found['name'])
@@ -0,0 +1,179 @@
+import threading
+import unittest
+
+from ptvsd.wrapper import (
+    OutputBuffer, OUTPUT_OVERFLOW_DROP, _parse_debug_options)
+
+
+class OutputBufferTests(unittest.TestCase):
+
+    def new_buffer(self, **kwargs):
+        self.events = []
+        self.sent = threading.Event()
+
+        def send(category, output):
+            self.events.append((category, output))
+            self.sent.set()
+        kwargs.setdefault('flush_delay', 60)
+        # Coalesce everything unless a test says otherwise.
+        kwargs.setdefault('event_burst', 0)
+        buf = OutputBuffer(send, **kwargs)
+        self.addCleanup(buf.close)
+        return buf
+
+    def test_coalesced(self):
+        buf = self.new_buffer()
+        buf.write('stdout', 'a')
+        buf.write('stdout', 'b')
+        buf.write('stderr', 'c')
+        buf.write('stdout', 'd')
+        buf.write('stdout', '')
+        buf.write('stdout', 'e')
+        self.assertEqual(self.events, [])
+        buf.flush()
+        stats = buf.stats
+
+        self.assertEqual(self.events, [
+            ('stdout', 'ab'),
+            ('stderr', 'c'),
+            ('stdout', 'de'),
+        ])
+        self.assertEqual(stats['writes'], 5)
+        self.assertEqual(stats['events'], 3)
+        self.assertEqual(stats['emitted'], 5)
+        self.assertEqual(stats['buffered'], 0)
+        self.assertEqual(stats['max_buffered'], 5)
+
+    def test_event_per_write(self):
+        buf = self.new_buffer(event_burst=5, event_rate=0)
+        for text in ['yes', '\n', 'no', '\n', 'spam\n']:
+            buf.write('stdout', text)
+        buf.flush()
+        # The allowance is used up.
+        for text in ['a', 'b\n', 'c\n']:
+            buf.write('stdout', text)
+        buf.flush()
+
+        self.assertEqual(self.events, [
+            ('stdout', 'yes'),
+            ('stdout', '\n'),
+            ('stdout', 'no'),
+            ('stdout', '\n'),
+            ('stdout', 'spam\n'),
+            ('stdout', 'ab\nc\n'),
+        ])
+        self.assertEqual(buf.stats['events'], 6)
+
+    def test_partial_line_held(self):
+        buf = self.new_buffer(flush_delay=0.01)
+        buf.write('stdout', 'a\n')
+        buf.write('stdout', 'b')
+        self.sent.wait(5)
+        self.sent.clear()
+        buf.write('stdout', 'c\n')
+        buf.write('stdout', 'd')
+        self.sent.wait(5)
+        self.sent.clear()
+        # An unfinished line only waits once.
+        self.sent.wait(5)
+
+        self.assertEqual(self.events, [
+            ('stdout', 'a\n'),
+            ('stdout', 'bc\n'),
+            ('stdout', 'd'),
+        ])
+
+    def test_configure(self):
+        buf = self.new_buffer()
+        buf.configure(max_buffered=3, overflow=OUTPUT_OVERFLOW_DROP)
+        buf.write('stdout', 'ab')
+        buf.write('stdout', 'spam')
+        buf.flush()
+
+        self.assertEqual(self.events, [('stdout', 'ab')])
+        self.assertEqual(buf.stats['dropped'], 4)
+        with self.assertRaises(ValueError):
+            buf.configure(overflow='spam')
+
+    def test_debug_options(self):
+        opts = _parse_debug_options(
+            'OUTPUT_FLUSH_SIZE=10;OUTPUT_FLUSH_DELAY=0.5;'
+            'OUTPUT_OVERFLOW=drop;OUTPUT_MAX_BUFFERED=x;'
+            'OUTPUT_EVENT_RATE=spam')
+
+        self.assertEqual(opts['OUTPUT_FLUSH_SIZE'], 10)
+        self.assertEqual(opts['OUTPUT_FLUSH_DELAY'], 0.5)
+        self.assertEqual(opts['OUTPUT_OVERFLOW'], OUTPUT_OVERFLOW_DROP)
+        self.assertNotIn('OUTPUT_MAX_BUFFERED', opts)
+        self.assertNotIn('OUTPUT_EVENT_RATE', opts)
+
+    def test_flush_delay(self):
+        buf = self.new_buffer(flush_delay=0.01)
+        buf.write('stdout', 'spam')
+        self.sent.wait(5)
+
+        self.assertEqual(self.events, [('stdout', 'spam')])
+
+    def test_flush_size(self):
+        buf = self.new_buffer(flush_size=10)
+        buf.write('stdout', 'x' * 5)
+        buf.write('stdout', 'x' * 5)
+        self.sent.wait(5)
+
+        self.assertEqual(self.events, [('stdout', 'x' * 10)])
+
+    def test_summarize(self):
+        buf = self.new_buffer(max_buffered=10)
+        buf.write('stdout', 'x' * 8)
+        buf.write('stdout', 'y' * 5)
+        buf.write('stderr', 'z' * 5)
+        buf.write('stdout', 'w' * 2)
+        buf.flush()
+        stats = buf.stats
+
+        self.assertEqual(self.events, [
+            ('stdout', 'x' * 8),
+            ('console', '[10 characters of output dropped]\n'),
+            ('stdout', 'w' * 2),
+        ])
+        self.assertEqual(stats['dropped'], 10)
+        self.assertEqual(stats['dropped_writes'], 2)
+        self.assertEqual(stats['emitted'], 10)
+
+    def test_drop(self):
+        buf = self.new_buffer(max_buffered=10, overflow=OUTPUT_OVERFLOW_DROP)
+        buf.write('stdout', 'x' * 8)
+        buf.write('stdout', 'y' * 3)
+        buf.write('stdout', 'z')
+        buf.flush()
+
+        self.assertEqual(self.events, [('stdout', 'x' * 8 + 'z')])
+        self.assertEqual(buf.stats['dropped'], 3)
+
+    def test_oversized_write_into_empty_buffer(self):
+        buf = self.new_buffer(max_buffered=10)
+        buf.write('stdout', 'x' * 11)
+        buf.write('stdout', 'y')
+        buf.flush()
+        buf.write('stdout', 'z' * 11)
+        buf.flush()
+        stats = buf.stats
+
+        self.assertEqual(self.events, [
+            ('stdout', 'x' * 11),
+            ('console', '[1 characters of output dropped]\n'),
+            ('stdout', 'z' * 11),
+        ])
+        self.assertEqual(stats['dropped'], 1)
+        self.assertEqual(stats['emitted'], 22)
+
+    def test_close(self):
+        buf = self.new_buffer()
+        buf.write('stdout', 'spam')
+        buf.close()
+        buf.write('stderr', 'eggs')
+
+        self.assertEqual(self.events, [
+            ('stdout', 'spam'),
+            ('stderr', 'eggs'),
+        ])
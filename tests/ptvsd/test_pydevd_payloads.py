@@ -0,0 +1,439 @@
+import json
+import sys
+import threading
+import time
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from _pydevd_bundle import pydevd_comm, pydevd_resolver, pydevd_xml
+from _pydevd_bundle.pydevd_comm import NetCommandFactory
+from _pydevd_bundle.pydevd_constants import DEFAULT_VALUE, RETURN_VALUES_DICT
+
+from ptvsd import futures
+from ptvsd.wrapper import (
+    parse_pydevd_vars, parse_pydevd_threads, parse_pydevd_suspend,
+    parse_pydevd_io, parse_pydevd_batch, PAYLOAD_ERRORS,
+    SafeReprPresentationProvider, SuspendedStack, VSCodeMessageProcessor)
+
+
+def _suspend_payloads(frame, **kwargs):
+    factory = NetCommandFactory()
+    args = ('pid_1_id_1', frame, pydevd_comm.CMD_SET_BREAK, '')
+    return (factory.make_thread_suspend_str(*args, **kwargs),
+            factory.make_thread_suspend_payload(*args, **kwargs))
+
+
+def _recurse(depth, f):
+    if depth == 0:
+        return f(sys._getframe())
+    return _recurse(depth - 1, f)
+
+
+class ParsePydevdPayloadTests(unittest.TestCase):
+
+    def assert_all_equal(self, parse, *payloads):
+        expected = parse(payloads[0])
+        for payload in payloads[1:]:
+            self.assertEqual(parse(payload), expected)
+        return expected
+
+    def test_vars(self):
+        values = [
+            (u'spam eggs\u20ac', 'x'),
+            ([1, 2, 3], 'y'),
+            (None, 'z<&>'),
+        ]
+        xml = ''.join(pydevd_xml.var_to_xml(v, n) for v, n in values)
+        dicts = {'var': [pydevd_xml.var_to_dict(v, n) for v, n in values]}
+        parsed = self.assert_all_equal(
+            parse_pydevd_vars,
+            dicts,
+            json.dumps(dicts),
+        )
+        xml_parsed = parse_pydevd_vars('<xml>' + xml + '</xml>')
+
+        self.assertEqual([v['name'] for v in parsed], ['x', 'y', 'z<&>'])
+        self.assertEqual(parsed[0]['value'], xml_parsed[0]['value'])
+        self.assertEqual(parsed[1], xml_parsed[1])
+        self.assertTrue(parsed[1]['isContainer'])
+        self.assertEqual(parsed[2]['type'], 'NoneType')
+
+    def test_vars_indexed(self):
+        values = [(list(range(1000)), 'x'), (object(), 'y')]
+        xml = ''.join(pydevd_xml.var_to_xml(v, n) for v, n in values)
+        dicts = {'var': [pydevd_xml.var_to_dict(v, n) for v, n in values]}
+        parsed = parse_pydevd_vars(dicts)
+
+        self.assertEqual(parse_pydevd_vars('<xml>' + xml + '</xml>'), parsed)
+        self.assertEqual(parsed[0]['indexedVariables'], 1000)
+        self.assertNotIn('indexedVariables', parsed[1])
+
+    def test_vars_empty(self):
+        self.assertEqual(parse_pydevd_vars('<xml></xml>'), [])
+        self.assertEqual(parse_pydevd_vars({}), [])
+
+    def test_batch(self):
+        xvar = pydevd_xml.var_to_xml(1, 'x')
+        xml = '<xml><result>{}</result><result error="Trace" /></xml>'
+        dicts = {'result': [
+            {'var': [pydevd_xml.var_to_dict(1, 'x')]},
+            {'error': 'Trace'},
+        ]}
+        parsed = self.assert_all_equal(
+            parse_pydevd_batch,
+            dicts,
+            json.dumps(dicts),
+            xml.format(xvar),
+        )
+
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual(parsed[0][0]['value'], '1')
+        self.assertIsNone(parsed[1])
+
+    def test_threads(self):
+        self.assert_all_equal(
+            parse_pydevd_threads,
+            '<xml><thread name="Main%20Thread" id="pid_1_id_1" /></xml>',
+            {'thread': [{'name': 'Main Thread', 'id': 'pid_1_id_1'}]},
+            '{"thread": [{"name": "Main Thread", "id": "pid_1_id_1"}]}',
+        )
+
+    def test_suspend(self):
+        xml, payload = _suspend_payloads(sys._getframe())
+        expected = parse_pydevd_suspend(xml)
+        parsed = parse_pydevd_suspend(payload)
+
+        self.assertEqual(parsed['id'], expected['id'])
+        self.assertEqual(parsed['stop_reason'], expected['stop_reason'])
+        self.assertEqual(parsed['frame'], expected['frame'])
+        self.assertEqual(parsed['frame'][0]['name'], 'test_suspend')
+        self.assertEqual(parse_pydevd_suspend(json.dumps(payload)), parsed)
+
+    def test_suspend_top_frames(self):
+        def get_payloads(frame):
+            return _suspend_payloads(frame) + _suspend_payloads(frame,
+                                                                levels=5)
+        whole, _, xml, payload = _recurse(30, get_payloads)
+        expected = parse_pydevd_suspend(whole)
+        parsed = parse_pydevd_suspend(payload)
+        xml_parsed = parse_pydevd_suspend(xml)
+
+        self.assertEqual(parsed['frame'], expected['frame'][:5])
+        self.assertEqual(parsed['frame_count'], len(expected['frame']))
+        self.assertEqual(xml_parsed['frame'], parsed['frame'])
+        self.assertEqual(xml_parsed['frame_count'], parsed['frame_count'])
+        self.assertNotIn('frame_count', expected)
+
+    def test_suspend_locals(self):
+        def get_payloads(spam='eggs', count=3):
+            frame = sys._getframe()
+            payloads = _suspend_payloads(frame, locals_limit=10)
+            return payloads + _suspend_payloads(frame, locals_limit=2)
+        xml, payload, xml_over, payload_over = get_payloads()
+        parsed = parse_pydevd_suspend(payload)
+        xml_parsed = parse_pydevd_suspend(xml)
+        over = [parse_pydevd_suspend(xml_over),
+                parse_pydevd_suspend(payload_over)]
+
+        self.assertEqual([v['name'] for v in parsed['frame'][0]['locals']],
+                         ['count', 'frame', 'spam'])
+        self.assertEqual(xml_parsed['frame'][0]['locals'][2]['value'],
+                         parsed['frame'][0]['locals'][2]['value'])
+        self.assertNotIn('locals', parsed['frame'][1])
+        self.assertNotIn('locals', xml_parsed['frame'][1])
+        self.assertNotIn('locals', over[0]['frame'][0])
+        self.assertNotIn('locals', over[1]['frame'][0])
+
+    def test_thread_stack(self):
+        def get_payloads(frame):
+            factory = NetCommandFactory()
+            payloads = [factory.make_thread_suspend_str(
+                'pid_1_id_1', frame, pydevd_comm.CMD_SET_BREAK, '')]
+            payloads.append(factory.make_get_thread_stack_message(
+                7, 'pid_1_id_1', frame, 10, 5).text)
+            factory.payload_format = pydevd_comm.PAYLOAD_JSON
+            for levels in (5, None):
+                payloads.append(factory.make_get_thread_stack_message(
+                    7, 'pid_1_id_1', frame, 10, levels).text)
+            return payloads
+        whole, xml, payload, rest = _recurse(30, get_payloads)
+        expected = parse_pydevd_suspend(whole)['frame']
+        parsed = parse_pydevd_suspend(payload)
+        xml_parsed = parse_pydevd_suspend(xml)
+        rest = parse_pydevd_suspend(rest)
+
+        self.assertEqual(parsed['frame'], expected[10:15])
+        self.assertEqual(parsed['frame_count'], len(expected))
+        self.assertEqual(xml_parsed['frame'], parsed['frame'])
+        self.assertEqual(xml_parsed['frame_count'], parsed['frame_count'])
+        self.assertEqual(rest['frame'], expected[10:])
+        self.assertEqual(rest['frame_count'], len(expected))
+
+    def test_io(self):
+        factory = NetCommandFactory()
+        xml = factory.make_io_message(u'spam\n<eggs> 100%', 2).text
+        factory.payload_format = pydevd_comm.PAYLOAD_JSON
+        payload = factory.make_io_message(u'spam\n<eggs> 100%', 2).text
+
+        self.assert_all_equal(
+            parse_pydevd_io,
+            xml,
+            payload,
+            json.dumps(payload),
+            {'io': {'s': u'spam\n<eggs> 100%', 'ctx': '2'}},
+        )
+
+    def test_malformed(self):
+        for args in ('Traceback (most recent call last):', '{spam'):
+            with self.assertRaises(PAYLOAD_ERRORS):
+                parse_pydevd_vars(args)
+
+
+class SuspendedStackTests(unittest.TestCase):
+
+    def test_partial(self):
+        frames = [{'id': i, 'file': 'internal' if i % 3 else 'user'}
+                  for i in range(6)]
+        stack = SuspendedStack(frames[:4], 6,
+                               lambda f: f['file'] == 'user')
+
+        self.assertFalse(stack.complete)
+        self.assertEqual(stack.user_frames, [frames[0], frames[3]])
+        self.assertEqual(stack.total_user_frames, 4)
+
+        stack.extend(frames[4:])
+
+        self.assertTrue(stack.complete)
+        self.assertEqual(stack.frames, frames)
+        self.assertEqual(stack.total_user_frames, 2)
+
+    def test_load_empty(self):
+        stack = SuspendedStack([], 3, lambda f: True)
+        # Nothing is requested from pydevd without a frame to start at
+        # (there is no pydevd_request() to call here).
+        loop = futures.new_event_loop()
+        processor = type('FakeProcessor', (object,), {'loop': loop})()
+        fut = VSCodeMessageProcessor._load_stack_frames(
+            processor, 'pid_1_id_1', stack, None)
+
+        self.assertIsNone(fut.exc_info())
+        self.assertTrue(stack.complete)
+        self.assertEqual(stack.total_user_frames, 0)
+
+    def test_prefetch_failed(self):
+        stack = SuspendedStack([], 0, lambda f: True)
+        stack.prefetched[2] = None
+        stack.dap_variables.update([
+            ((5, (), None, None, None), 'locals'),
+            (('watch', 3, 'spam'), 'spam'),
+            ((6, (), None, None, None), 'other locals'),
+            (('watch', 4, 'spam'), 'other spam'),
+        ])
+        processor = type('FakeProcessor', (object,), {
+            'stack_traces': {'pid_1_id_1': stack},
+            'stack_traces_lock': threading.Lock(),
+        })()
+        fut = futures.new_event_loop().create_future()
+        try:
+            raise RuntimeError('spam')
+        except RuntimeError:
+            fut.set_exc_info(sys.exc_info())
+        stderr = []
+        sys.__stderr__, orig = type('Writer', (object,), {
+            'write': lambda self, text: stderr.append(text),
+        })(), sys.__stderr__
+        try:
+            VSCodeMessageProcessor._prefetch_done(
+                processor, fut, 3, 5, ('pid_1_id_1', 2, 'FRAME'))
+        finally:
+            sys.__stderr__ = orig
+
+        # The error is reported and the frame's results are dropped.
+        self.assertIn('RuntimeError: spam', ''.join(stderr))
+        self.assertEqual(stack.prefetched, {})
+        self.assertEqual(list(stack.dap_variables.values()),
+                         ['other locals', 'other spam'])
+
+
+class ResolverPagingTests(unittest.TestCase):
+
+    def assert_same_children(self, resolver, var):
+        # The pages together have the same children as get_dictionary().
+        count = resolver.get_indexed_count(var)
+        children = resolver.get_named_dictionary(var)
+        for start in range(0, count, 7):
+            children.update(resolver.get_indexed_range(var, start, 7))
+        self.assertEqual(children, resolver.get_dictionary(var))
+
+    def test_list(self):
+        resolver = pydevd_resolver.tupleResolver
+        var = list(range(100, 150))
+
+        self.assertEqual(resolver.get_indexed_count(var), 50)
+        self.assertEqual(resolver.get_indexed_range(var, 45, 10),
+                         [('45', 145), ('46', 146), ('47', 147),
+                          ('48', 148), ('49', 149)])
+        self.assertEqual(len(resolver.get_indexed_range(var, 5, None)), 45)
+        self.assert_same_children(resolver, var)
+        self.assert_same_children(resolver, tuple(var))
+
+    def test_dict(self):
+        resolver = pydevd_resolver.dictResolver
+        var = dict(('k%d' % i, i) for i in range(50))
+
+        page = resolver.get_indexed_range(var, 10, 5)
+        self.assertEqual([val for _, val in page],
+                         [var[key] for key in list(var)[10:15]])
+        for name, val in page:
+            self.assertIs(resolver.resolve(var, name), val)
+        self.assert_same_children(resolver, var)
+
+    def test_set(self):
+        resolver = pydevd_resolver.setResolver
+        var = set(range(50))
+
+        self.assertEqual(len(resolver.get_indexed_range(var, 40, 20)), 10)
+        self.assert_same_children(resolver, var)
+
+    def test_generator_not_consumed(self):
+        resolver = pydevd_resolver.tupleResolver
+        seen = []
+
+        class Items(list):
+            def __iter__(self):
+                for item in list.__iter__(self):
+                    seen.append(item)
+                    yield item
+
+        var = Items(range(1000))
+        self.assertEqual(resolver.get_indexed_range(var, 500, 2),
+                         [('0500', 500), ('0501', 501)])
+        self.assertLess(len(seen), 600)
+
+
+class ValueFormatTests(unittest.TestCase):
+
+    def get_str(self, value, value_format):
+        provider = SafeReprPresentationProvider()
+        old = pydevd_xml.set_value_format(value_format)
+        try:
+            return provider.get_str(value)
+        finally:
+            pydevd_xml.set_value_format(old)
+
+    def test_default(self):
+        self.assertEqual(self.get_str(10, None), '10')
+
+    def test_hex(self):
+        self.assertEqual(self.get_str(10, {'hex': True}), '0xa')
+
+    def test_split(self):
+        from _pydevd_bundle.pydevd_process_net_command import (
+            _split_value_format)
+
+        self.assertEqual(_split_value_format('{"hex": true}\t1\t2'),
+                         ({'hex': True}, '1\t2'))
+        self.assertEqual(_split_value_format('1\t2'), (None, '1\t2'))
+
+
+class Slow(object):
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __repr__(self):
+        time.sleep(self.delay)
+        return 'slow'
+
+
+class FrameVarsTimeBudgetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.budgets = (pydevd_xml.FRAME_VARS_TIME_BUDGET_SEC,
+                        pydevd_xml.VALUE_TIME_BUDGET_SEC)
+        pydevd_xml.forget_slow_value_types()
+
+    def tearDown(self):
+        (pydevd_xml.FRAME_VARS_TIME_BUDGET_SEC,
+         pydevd_xml.VALUE_TIME_BUDGET_SEC) = self.budgets
+        pydevd_xml.forget_slow_value_types()
+
+    def get_values(self, f_locals, xml=False):
+        if xml:
+            payload = '<xml>{}</xml>'.format(
+                pydevd_xml.frame_vars_to_xml(f_locals))
+        else:
+            payload = {'var': pydevd_xml.frame_vars_to_dicts(f_locals)}
+        return [(v['name'], v.get('value'))
+                for v in parse_pydevd_vars(payload)]
+
+    def test_slow_type(self):
+        pydevd_xml.VALUE_TIME_BUDGET_SEC = 0.01
+
+        values = self.get_values({'a': Slow(0.02), 'b': Slow(0), 'c': 1})
+        later = self.get_values({'a': Slow(0)})
+
+        # The thread is resumed.
+        pydevd_xml.forget_slow_value_types()
+        resumed = self.get_values({'a': Slow(0)})
+
+        self.assertIn('slow', values[0][1])
+        self.assertEqual(values[1:], [('b', DEFAULT_VALUE), ('c', '1')])
+        self.assertEqual(later, [('a', DEFAULT_VALUE)])
+        self.assertEqual(resumed, [('a', 'slow')])
+
+    def test_budget_spent(self):
+        pydevd_xml.FRAME_VARS_TIME_BUDGET_SEC = -1
+        f_locals = {
+            'a': Slow(0),
+            'b': [1, 2],
+            'c': 'spam',
+            'd': list(range(pydevd_xml.SMALL_CONTAINER_SIZE + 1)),
+            RETURN_VALUES_DICT: {'f': Slow(0)},
+        }
+
+        values = self.get_values(f_locals)
+        xml_values = self.get_values(f_locals, xml=True)
+
+        self.assertEqual(xml_values, values)
+        self.assertEqual(values, [
+            ('f', DEFAULT_VALUE),
+            ('a', DEFAULT_VALUE),
+            ('b', '[1, 2]'),
+            ('c', "'spam'"),
+            ('d', DEFAULT_VALUE),
+        ])
+        self.assertEqual(pydevd_xml._slow_value_types, {})
+
+
+@unittest.skipIf(np is None, 'could not import numpy')
+class NdArrayStatsTests(unittest.TestCase):
+
+    def get_children(self, value):
+        from pydevd_plugins.extensions.types import pydevd_plugin_numpy_types
+        self.plugin = pydevd_plugin_numpy_types
+        provider = pydevd_plugin_numpy_types.NDArrayTypeResolveProvider()
+        return provider.get_dictionary(value)
+
+    def test_lazy(self):
+        stats = self.get_children(np.array([1.0, np.nan, 3.0]))['stats']
+
+        self.assertEqual(repr(stats), 'min, max, mean, NaN count')
+        self.assertEqual(stats.compute(),
+                         {'min': 1.0, 'max': 3.0, 'mean': 2.0, 'nan_count': 1})
+
+    def test_too_big(self):
+        value = np.zeros(10)
+        stats = self.get_children(value)['stats']
+        old = self.plugin.STATS_MAX_SIZE
+        self.plugin.STATS_MAX_SIZE = 5
+        try:
+            computed = stats.compute()
+        finally:
+            self.plugin.STATS_MAX_SIZE = old
+
+        self.assertIn('too big', computed['mean'])
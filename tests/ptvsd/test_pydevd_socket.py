@@ -0,0 +1,228 @@
+import threading
+import unittest
+
+from _pydevd_bundle.pydevd_comm import (
+    ReaderThread, WriterThread, NetCommand, CMD_EXIT)
+
+from ptvsd.futures import EventLoop
+from ptvsd.wrapper import (
+    LatencyHistogram, PydevdSocket,
+    PydevdRequestCancelledError, PydevdRequestTimeoutError)
+
+
+class FakeReaderThread(ReaderThread):
+
+    def __init__(self, sock, expected):
+        ReaderThread.__init__(self, sock)
+        self.commands = []
+        self.expected = expected
+        self.done = threading.Event()
+        self.closed = threading.Event()
+
+    def process_command(self, cmd_id, seq, text):
+        self.commands.append((cmd_id, seq, text))
+        if len(self.commands) == self.expected:
+            self.done.set()
+
+    def handle_except(self):
+        self.closed.set()
+
+
+class PydevdSocketTests(unittest.TestCase):
+
+    def new_socket(self, structured=True):
+        self.received = []
+        self.closed = []
+        sock = PydevdSocket(
+            (lambda *args: self.received.append(args)),
+            (lambda: self.closed.append(True)),
+            (lambda: ('localhost', 8888)),
+            (lambda: ('localhost', 8888)),
+            structured=structured,
+        )
+        self.addCleanup(sock.close)
+        return sock
+
+    def test_notify_structured(self):
+        sock = self.new_socket()
+        sock.pydevd_notify(101, u'spam\teggs\u20ac')
+
+        cmd_id, seq, args = sock.recv_command()
+        self.assertEqual((cmd_id, args), (101, u'spam\teggs\u20ac'))
+
+    def test_recv_fallback(self):
+        sock = self.new_socket()
+        sock.pydevd_notify(101, u'spam')
+        sock.pydevd_notify(102, u'eggs')
+
+        data = b''
+        while data.count(b'\n') < 2:
+            data += sock.recv(5)
+        self.assertEqual(data.decode('utf8'),
+                         u'101\t1000000000\tspam\n102\t1000000001\teggs\n')
+
+    def test_makefile_structured(self):
+        sock = self.new_socket()
+        sock.pydevd_notify(101, u'spam\u20ac')
+        sock.pydevd_notify(102, u'eggs')
+
+        rfile = sock.makefile('rb')
+        self.assertEqual(rfile.readline().decode('utf8'),
+                         u'101\t1000000000\tspam\u20ac\n')
+        self.assertEqual(sock.makefile().readline(),
+                         u'102\t1000000001\teggs\n')
+
+    def test_notify_pipe(self):
+        sock = self.new_socket(structured=False)
+        sock.pydevd_notify(101, u'spam')
+
+        data = sock.recv(1024)
+        self.assertEqual(data, b'101\t1000000000\tspam\n')
+
+    def test_send_command(self):
+        sock = self.new_socket()
+        sock.send_command(102, 5, u'<xml>%20</xml>')
+        sock.send(b'103\t6\t%3Cxml%3E%2520%3C/xml%3E\n')
+
+        self.assertEqual(self.received, [
+            (102, 5, u'<xml>%20</xml>'),
+            (103, 6, u'<xml>%20</xml>\n'),
+        ])
+
+    def test_request_response(self):
+        sock = self.new_socket()
+        loop = EventLoop()
+        fut = sock.pydevd_request(loop, 111, u'spam')
+        _, seq, _ = sock.recv_command()
+        sock.send_command(111, seq, u'eggs')
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+
+        self.assertEqual(fut.result(), (111, seq, u'eggs'))
+        self.assertEqual(self.received, [])
+
+    def test_request_timeout(self):
+        sock = self.new_socket()
+        loop = EventLoop()
+        fut = sock.pydevd_request(loop, 9111, u'spam', timeout=0.01)
+        _, seq, _ = sock.recv_command()
+        fut.add_done_callback(lambda _: loop.stop())
+        loop.run_forever()
+        # A late reply is dropped.
+        sock.send_command(9111, seq, u'eggs')
+        stats = sock.request_stats()
+
+        with self.assertRaises(PydevdRequestTimeoutError):
+            fut.result()
+        self.assertEqual(self.received, [])
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['commands'][9111]['timeouts'], 1)
+        self.assertEqual(stats['commands'][9111]['late'], 1)
+        self.assertEqual(stats['commands'][9111]['count'], 0)
+
+    def test_request_cancel(self):
+        sock = self.new_socket()
+        loop = EventLoop()
+        fut = sock.pydevd_request(loop, 9111, u'spam')
+        _, seq, _ = sock.recv_command()
+        cancelled = sock.pydevd_cancel(fut)
+        sock.send_command(9111, seq, u'eggs')
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+
+        self.assertTrue(cancelled)
+        self.assertFalse(sock.pydevd_cancel(fut))
+        with self.assertRaises(PydevdRequestCancelledError):
+            fut.result()
+        self.assertEqual(self.received, [])
+        self.assertEqual(sock.request_stats()['commands'][9111]['cancelled'],
+                         1)
+
+    def test_request_stats(self):
+        sock = self.new_socket()
+        loop = EventLoop()
+        for _ in range(3):
+            sock.pydevd_request(loop, 501, u'spam')
+            _, seq, _ = sock.recv_command()
+            sock.send_command(501, seq, u'eggs')
+        sock.pydevd_request(loop, 501, u'spam')
+        stats = sock.request_stats()
+
+        self.assertEqual(stats['pending'], 1)
+        # Known commands are reported by name.
+        stats = stats['commands']['CMD_VERSION']
+        self.assertEqual(stats['count'], 3)
+        self.assertLessEqual(stats['p50'], stats['p99'])
+        self.assertLessEqual(stats['p99'], stats['max'])
+
+    def test_closed(self):
+        sock = self.new_socket()
+        sock.close()
+
+        self.assertIsNone(sock.recv_command())
+        self.assertIsNone(sock.recv_command())
+        self.assertEqual(sock.recv(10), b'')
+        self.assertEqual(self.closed, [True])
+        with self.assertRaises(EOFError):
+            sock.pydevd_notify(101, u'spam')
+
+    def test_pydevd_threads(self):
+        for structured in (True, False):
+            sock = self.new_socket(structured)
+            reader = FakeReaderThread(sock, 2)
+            writer = WriterThread(sock)
+            reader.start()
+            writer.start()
+
+            sock.pydevd_notify(101, u'spam\u20ac')
+            sock.pydevd_notify(102, u'eggs')
+            reader.done.wait(5)
+            writer.add_command(NetCommand(103, 7, u'<xml a="b c\u20ac" />'))
+            writer.add_command(NetCommand('104', 8, 5))
+            writer.add_command(NetCommand(CMD_EXIT, 9, u''))
+            writer.join(5)
+            sock.close()
+            reader.closed.wait(5)
+
+            self.assertEqual([(c, a) for c, _, a in reader.commands], [
+                (101, u'spam\u20ac'),
+                (102, u'eggs'),
+            ])
+            eol = u'' if structured else u'\n'
+            self.assertEqual(self.received[:2], [
+                (103, 7, u'<xml a="b c\u20ac" />' + eol),
+                (104, 8, u'5' + eol),
+            ])
+
+
+class LatencyHistogramTests(unittest.TestCase):
+
+    def test_percentiles(self):
+        hist = LatencyHistogram()
+        for _ in range(90):
+            hist.add(0.001)
+        for _ in range(9):
+            hist.add(0.1)
+        hist.add(5)
+        stats = hist.stats
+
+        self.assertEqual(stats['count'], 100)
+        self.assertEqual(stats['max'], 5)
+        # Each is the top of its bucket (within a factor of 2).
+        self.assertTrue(0.001 <= stats['p50'] < 0.002)
+        self.assertTrue(0.1 <= stats['p95'] < 0.2)
+        self.assertEqual(stats['p99'], stats['p95'])
+        self.assertEqual(hist.percentile(100), 5)
+
+    def test_empty(self):
+        stats = LatencyHistogram().stats
+
+        self.assertEqual(stats['count'], 0)
+        self.assertIsNone(stats['mean'])
+        self.assertIsNone(stats['p50'])
+
+    def test_overflow(self):
+        hist = LatencyHistogram()
+        hist.add(1e6)
+
+        self.assertEqual(hist.percentile(50), 1e6)
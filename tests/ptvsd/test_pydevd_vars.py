@@ -0,0 +1,250 @@
+import base64
+import re
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+from _pydevd_bundle import pydevd_vars
+from _pydevd_bundle.pydevd_xml import ExceptionOnEvaluate, var_to_xml
+
+
+class CompileExpressionTests(unittest.TestCase):
+
+    def setUp(self):
+        pydevd_vars._compiled_expressions.clear()
+
+    def test_reused(self):
+        code = pydevd_vars.compile_expression('spam.eggs')
+
+        self.assertIs(pydevd_vars.compile_expression('spam.eggs'), code)
+        self.assertIsNot(pydevd_vars.compile_expression('spam.eggs', 'exec'),
+                         code)
+
+    def test_least_recently_used_dropped(self):
+        old = pydevd_vars.COMPILED_EXPRESSIONS_CACHE_SIZE
+        pydevd_vars.COMPILED_EXPRESSIONS_CACHE_SIZE = 2
+        try:
+            first = pydevd_vars.compile_expression('a')
+            pydevd_vars.compile_expression('b')
+            pydevd_vars.compile_expression('a')
+            pydevd_vars.compile_expression('c')
+        finally:
+            pydevd_vars.COMPILED_EXPRESSIONS_CACHE_SIZE = old
+
+        self.assertIs(pydevd_vars.compile_expression('a'), first)
+        self.assertEqual(sorted(key for key, _ in
+                                pydevd_vars._compiled_expressions),
+                         ['a', 'c'])
+
+    def test_eval_in_context(self):
+        result = pydevd_vars.eval_in_context(' x + 1', {'x': 1}, {})
+        error = pydevd_vars.eval_in_context('x +', {'x': 1}, {})
+
+        self.assertEqual(result, 2)
+        self.assertIsInstance(error, ExceptionOnEvaluate)
+        self.assertNotIn(('x +', 'eval'), pydevd_vars._compiled_expressions)
+
+
+@unittest.skipIf(np is None, 'could not import numpy')
+class ArrayToXmlTests(unittest.TestCase):
+
+    def expected(self, window, format):
+        xml = '<arraydata rows="%s" cols="%s"/>' % window.shape
+        for i, row in enumerate(window):
+            xml += '<row index="%s"/>' % i
+            xml += ''.join(var_to_xml(format % value, '') for value in row)
+        return xml
+
+    def test_text_cells(self):
+        array = np.arange(600.0).reshape(20, 30) / 7
+        ints = np.arange(-50, 50).reshape(10, 10)
+
+        for value, format, window in [
+            (array[2:7, 3:9], '%.5f', (array, 2, 3, 5, 6)),
+            (array[:1, :4], '%e', (array[0], 0, 0, 1, 4)),
+            (array[3:6, :1], '%.2f', (array, 3, 0, 3, 1)),
+            (array[0, :3].reshape(1, 3), '%s', (array[0], 0, 0, 1, 3)),
+            (ints[1:, 2:], '%d', (ints, 1, 2, 100, 100)),
+            (np.array([[True, False]]), '%s',
+             (np.array([True, False]), 0, 0, 1, 2)),
+        ]:
+            xml = pydevd_vars.array_to_xml(*(window + (format,)))
+
+            self.assertEqual(xml, self.expected(value, format))
+
+    def test_slicing(self):
+        # The text cells are the same as before for the windows the old
+        # code handled (it formatted each cell with var_to_xml()).  It
+        # failed on a 1x1 window of a 2-D array.
+        for window, rows in [
+            ((np.arange(12).reshape(3, 4), 1, 1, 2, 2, '%d'),
+             [['5', '6'], ['9', '10']]),
+            # 1-D, as a row or as a column
+            ((np.arange(5.0) / 4, 0, 1, 1, 3, '%.2f'),
+             [['0.25', '0.50', '0.75']]),
+            ((np.arange(5), 2, 0, 3, 1, '%d'),
+             [['2'], ['3'], ['4']]),
+            # A single row or column of a 2-D array
+            ((np.arange(6).reshape(1, 6), 0, 2, 1, 3, '%d'),
+             [['2', '3', '4']]),
+            ((np.arange(6).reshape(6, 1), 1, 0, 3, 1, '%d'),
+             [['1'], ['2'], ['3']]),
+            # 1x1
+            ((np.arange(5), 3, 0, 1, 1, '%d'),
+             [['3']]),
+            ((np.arange(12).reshape(3, 4), 1, 2, 1, 1, '%d'),
+             [['6']]),
+            ((np.array([[7.5]]), 0, 0, 1, 1, '%.1f'),
+             [['7.5']]),
+        ]:
+            expected = '<arraydata rows="%s" cols="%s"/>' % (len(rows),
+                                                             len(rows[0]))
+            for i, row in enumerate(rows):
+                expected += '<row index="%s"/>' % i
+                expected += ''.join(var_to_xml(text, '') for text in row)
+
+            xml = pydevd_vars.array_to_xml(*window)
+
+            self.assertEqual(xml, expected)
+
+    def test_base64_cells(self):
+        array = np.arange(600, dtype='int32').reshape(20, 30)
+
+        xml = pydevd_vars.array_to_xml(array, 2, 3, 5, 6, '%d',
+                                       base64_cells=True)
+        match = re.match(
+            r'<arraydata rows="5" cols="6" dtype="(.+)">(.*)</arraydata>$',
+            xml)
+        cells = np.frombuffer(base64.b64decode(match.group(2)),
+                              dtype=match.group(1)).reshape(5, 6)
+
+        self.assertEqual(cells.tolist(), array[2:7, 3:9].tolist())
+
+    def test_base64_cells_not_numeric(self):
+        array = np.array([['a', 'b'], ['c', 'd']])
+
+        xml = pydevd_vars.array_to_xml(array, 0, 0, 2, 2, '%s',
+                                       base64_cells=True)
+
+        self.assertEqual(xml, self.expected(array, '%s'))
+
+
+@unittest.skipIf(np is None, 'could not import numpy')
+class TableWindowTests(unittest.TestCase):
+
+    def test_ndarray(self):
+        array = np.arange(20, dtype='int64').reshape(4, 5)
+
+        window = pydevd_vars.table_window(array, 1, 2, 3, 10)
+
+        self.assertEqual(window, {
+            'rows': 4,
+            'columns': 5,
+            'startRow': 1,
+            'startColumn': 3,
+            'rowLabels': ['1', '2'],
+            'columnHeaders': [{'label': '3', 'type': 'int64'},
+                              {'label': '4', 'type': 'int64'}],
+            'cells': [['8', '9'], ['13', '14']],
+        })
+
+    def test_ndarray_1d(self):
+        array = np.array([0.5, np.nan, 2.5])
+
+        window = pydevd_vars.table_window(array, stats=True)
+
+        self.assertEqual(window['cells'], [['0.5'], ['nan'], ['2.5']])
+        self.assertEqual(window['columnHeaders'][0]['stats'], {
+            'count': 2,
+            'nulls': 1,
+            'min': 0.5,
+            'max': 2.5,
+            'mean': 1.5,
+            'std': 1.4142135623730951,
+        })
+
+    def test_window_limited(self):
+        array = np.zeros((5000, 500))
+
+        window = pydevd_vars.table_window(array, 10, 5000, 0, 500)
+
+        self.assertEqual(len(window['cells']), pydevd_vars.MAX_SLICE_SIZE)
+        self.assertEqual(len(window['columnHeaders']),
+                         pydevd_vars.MAXIMUM_ARRAY_SIZE)
+
+    def test_formats(self):
+        array = np.array([[10, 1], [255, 2]])
+        floats = np.array([1.0 / 3])
+
+        ints = pydevd_vars.table_window(array, hex_ints=True)
+        fixed = pydevd_vars.table_window(floats, float_format='%.2f')
+        bad = pydevd_vars.table_window(floats, float_format='%d %d')
+
+        self.assertEqual(ints['cells'], [['0xa', '0x1'], ['0xff', '0x2']])
+        self.assertEqual(fixed['cells'], [['0.33']])
+        self.assertEqual(bad['cells'], [[str(1.0 / 3)]])
+
+    def test_long_cell(self):
+        array = np.array(['x' * 1000], dtype=object)
+
+        window = pydevd_vars.table_window(array)
+
+        text = window['cells'][0][0]
+        self.assertEqual(len(text), pydevd_vars.TABLE_CELL_MAX_LENGTH)
+        self.assertTrue(text.endswith('...'))
+
+    def test_not_a_table(self):
+        with self.assertRaises(ValueError):
+            pydevd_vars.table_window([1, 2, 3])
+        with self.assertRaises(ValueError):
+            pydevd_vars.table_window(np.zeros((2, 2, 2)))
+
+    @unittest.skipIf(pd is None, 'could not import pandas')
+    def test_dataframe(self):
+        df = pd.DataFrame({
+            'a': [1, 2, 3],
+            'b': [1.5, None, 3.0],
+            'c': ['x', 'y', 'z'],
+        }, index=['r1', 'r2', 'r3'])
+        df.columns = pd.MultiIndex.from_tuples(
+            [('n', 'a'), ('n', 'b'), ('s', 'c')])
+
+        window = pydevd_vars.table_window(df, 1, 5, 0, 3, stats=True)
+
+        self.assertEqual(window['rows'], 3)
+        self.assertEqual(window['columns'], 3)
+        self.assertEqual(window['rowLabels'], ['r2', 'r3'])
+        self.assertEqual(window['cells'],
+                         [['2', 'nan', 'y'], ['3', '3.0', 'z']])
+        headers = window['columnHeaders']
+        self.assertEqual([header['label'] for header in headers],
+                         ['n/a', 'n/b', 's/c'])
+        self.assertEqual(headers[0]['stats'], {
+            'count': 3,
+            'nulls': 0,
+            'min': 1,
+            'max': 3,
+            'mean': 2.0,
+            'std': 1.0,
+        })
+        self.assertEqual(headers[1]['stats']['nulls'], 1)
+        self.assertEqual(headers[1]['stats']['mean'], 2.25)
+        self.assertEqual(headers[2]['stats'], {'count': 3, 'nulls': 0})
+
+    @unittest.skipIf(pd is None, 'could not import pandas')
+    def test_series(self):
+        series = pd.Series([True, False], name='flag')
+
+        window = pydevd_vars.table_window(series, stats=True)
+
+        self.assertEqual(window['rowLabels'], ['0', '1'])
+        self.assertEqual(window['cells'], [['True'], ['False']])
+        self.assertEqual(window['columnHeaders'][0]['label'], 'flag')
+        self.assertEqual(window['columnHeaders'][0]['stats']['mean'], 0.5)
@@ -1,11 +1,16 @@
 import collections
 import sys
+import time
 import unittest
 
 try:
     import numpy as np
 except ImportError:
     np = None
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
 
 from ptvsd.safe_repr import SafeRepr
 
@@ -108,6 +113,44 @@ class SafeReprTests(TestBase):
 
         self.assertLess(len(text), 8192)
 
+    def test_maxtotal(self):
+        self.saferepr.maxtotal = 100
+        value = ['a' * 20] * 10
+
+        safe = self.saferepr(value)
+
+        self.assertTrue(safe.endswith('...'))
+        self.assertLess(len(safe), 140)
+
+    def test_maxtime(self):
+        class Slow(object):
+            def __repr__(self):
+                time.sleep(0.02)
+                return 'Slow'
+        self.saferepr.maxtime = 0.05
+        value = [Slow() for _ in range(10)]
+
+        safe = self.saferepr(value)
+
+        self.assertTrue(safe.startswith('[Slow, Slow'))
+        self.assertTrue(safe.endswith('...'))
+        self.assertLess(safe.count('Slow'), 10)
+
+    def test_maxtotal_raw_value(self):
+        self.saferepr.maxtotal = 10
+        self.saferepr.raw_value = True
+
+        self.assert_saferepr('a' * 20, 'a' * 20)
+
+    def test_type_info_cache_size(self):
+        saferepr = self.saferepr
+        for i in range(saferepr._type_info_cache_size + 10):
+            cls = type('TestClass{}'.format(i), (list,), {})
+            self.assertEqual(saferepr(cls([i])), '[{}]'.format(i))
+
+        self.assertLessEqual(len(saferepr._type_info_cache),
+                             saferepr._type_info_cache_size)
+
 
 class StringTests(TestBase):
 
@@ -590,3 +633,41 @@ class NumpyTests(TestBase):
         value = np.zeros(SafeRepr.maxcollection[0] + 1)
 
         self.assert_unchanged(value, repr(value))
+
+    def test_large_array(self):
+        value = np.arange(SafeRepr.maxarray + 1, dtype=np.int64)
+
+        self.assert_shortened(
+            value,
+            'ndarray(shape=(1001,), dtype=int64): '
+            '[0, 1, 2, 3, 4, 5, 6, 7, 8, ...]')
+
+    def test_large_array_nested(self):
+        value = [np.zeros((100, 100))]
+
+        self.assert_shortened(
+            value,
+            '[ndarray(shape=(100, 100), dtype=float64): [...]]')
+
+
+@unittest.skipIf(pd is None, 'could not import pandas')
+class PandasTests(TestBase):
+
+    def test_small_dataframe(self):
+        value = pd.DataFrame({'a': [1, 2], 'b': [3, 4]})
+
+        self.assert_unchanged(value, repr(value))
+
+    def test_large_dataframe(self):
+        value = pd.DataFrame({'a': range(1000), 'b': range(1000)})
+
+        self.assert_shortened(value,
+                              "DataFrame(shape=(1000, 2)): ['a', 'b']")
+
+    def test_large_series(self):
+        value = pd.Series(range(2000), dtype='int64')
+
+        self.assert_shortened(
+            value,
+            'Series(shape=(2000,), dtype=int64): '
+            '[0, 1, 2, 3, 4, 5, 6, 7, 8, ...]')
@@ -0,0 +1,14 @@
+import time
+
+
+class Slow(object):
+
+    def __repr__(self):
+        time.sleep(0.2)
+        return 'slow'
+
+
+a = Slow()
+b = Slow()
+c = 1
+print('done')
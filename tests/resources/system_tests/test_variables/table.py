@@ -0,0 +1,3 @@
+import numpy as np
+a = np.arange(12).reshape(3, 4) * 1.5
+print(a)
@@ -1,5 +1,11 @@
 import os
 import os.path
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from tests.helpers.debugsession import Awaitable
 from tests.helpers.resource import TestResources
@@ -166,6 +172,483 @@ class VariableTests(LifecycleTestsBase):
             'result': '1',
         })
 
+    def test_variable_paging(self):
+        filename = TEST_FILES.resolve('simple.py')
+        cwd = os.path.dirname(filename)
+        self.run_test_variable_paging(DebugInfo(filename=filename, cwd=cwd))
+
+    def run_test_variable_paging(self, debug_info):
+        bp_line = 3
+        breakpoints = [{
+            'source': {
+                'path': debug_info.filename
+            },
+            'breakpoints': [{
+                'line': bp_line
+            }]
+        }]
+
+        with self.start_debugging(debug_info) as dbg:
+            session = dbg.session
+            with session.wait_for_event('stopped') as result:
+                (_, req_launch_attach, _, _, _, _,
+                 ) = lifecycle_handshake(session, debug_info.starttype,
+                                         breakpoints=breakpoints)
+                req_launch_attach.wait()
+            event = result['msg']
+            tid = event.body['threadId']
+
+            req_stacktrace = session.send_request(
+                'stackTrace',
+                threadId=tid,
+            )
+            req_stacktrace.wait()
+            frames = req_stacktrace.resp.body['stackFrames']
+            frame_id = frames[0]['id']
+            req_evaluate = session.send_request(
+                'evaluate',
+                expression='b',
+                frameId=frame_id,
+            )
+            req_evaluate.wait()
+            var_b = req_evaluate.resp.body
+            var_b_ref = var_b['variablesReference']
+
+            req_indexed = session.send_request(
+                'variables',
+                variablesReference=var_b_ref,
+                filter='indexed',
+                start=1,
+                count=1,
+            )
+            req_named = session.send_request(
+                'variables',
+                variablesReference=var_b_ref,
+                filter='named',
+            )
+            Awaitable.wait_all(req_indexed, req_named)
+            indexed = req_indexed.resp.body['variables']
+            named = req_named.resp.body['variables']
+
+            session.send_request('continue', threadId=tid)
+
+        self.assertEqual(var_b['indexedVariables'], 2)
+        self.assertEqual(len(indexed), 1)
+        self.assert_is_subset(indexed, [{
+            'type': 'int',
+            'value': '2',
+            'evaluateName': "b['two']"
+        }])
+        self.assert_is_subset(named, [{
+            'name': '__len__',
+            'type': 'int',
+            'value': '2',
+            'evaluateName': 'b.__len__'
+        }])
+        ints = [v['name'] for v in named if v['type'] == 'int']
+        self.assertEqual(ints, ['__len__'])
+
+    def test_variables_cache(self):
+        filename = TEST_FILES.resolve('simple.py')
+        cwd = os.path.dirname(filename)
+        self.run_test_variables_cache(DebugInfo(filename=filename, cwd=cwd))
+
+    def run_test_variables_cache(self, debug_info):
+        bp_line = 3
+        breakpoints = [{
+            'source': {
+                'path': debug_info.filename
+            },
+            'breakpoints': [{
+                'line': bp_line
+            }]
+        }]
+
+        def get_a(session, variables_reference):
+            req_variables = session.send_request(
+                'variables',
+                variablesReference=variables_reference,
+            )
+            req_variables.wait()
+            variables = req_variables.resp.body['variables']
+            return next(v for v in variables if v['name'] == 'a')
+
+        with self.start_debugging(debug_info) as dbg:
+            session = dbg.session
+            with session.wait_for_event('stopped') as result:
+                (_, req_launch_attach, _, _, _, _,
+                 ) = lifecycle_handshake(session, debug_info.starttype,
+                                         breakpoints=breakpoints)
+                req_launch_attach.wait()
+            event = result['msg']
+            tid = event.body['threadId']
+
+            req_stacktrace = session.send_request(
+                'stackTrace',
+                threadId=tid,
+            )
+            req_stacktrace.wait()
+            frames = req_stacktrace.resp.body['stackFrames']
+            frame_id = frames[0]['id']
+            req_scopes = session.send_request(
+                'scopes',
+                frameId=frame_id,
+            )
+            req_scopes.wait()
+            scopes = req_scopes.resp.body['scopes']
+            variables_reference = scopes[0]['variablesReference']
+
+            var_a = get_a(session, variables_reference)
+            var_a_again = get_a(session, variables_reference)
+
+            req_set = session.send_request(
+                'setVariable',
+                variablesReference=variables_reference,
+                name='a',
+                value='5',
+            )
+            req_set.wait()
+            var_a_set = get_a(session, variables_reference)
+
+            req_evaluate = session.send_request(
+                'evaluate',
+                expression='a = 7',
+                frameId=frame_id,
+                context='repl',
+            )
+            req_evaluate.wait()
+            var_a_repl = get_a(session, variables_reference)
+
+            req_stats = session.send_request('ptvsd_stats')
+            req_stats.wait()
+            stats = req_stats.resp.body['variables']
+
+            session.send_request('continue', threadId=tid)
+
+        self.assertEqual(var_a['value'], '1')
+        self.assertEqual(var_a_again, var_a)
+        self.assertEqual(var_a_set['value'], '5')
+        self.assertEqual(var_a_repl['value'], '7')
+        # The locals are fetched along with the scopes, so the first
+        # request is a hit too.
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_prefetch_locals(self):
+        filename = TEST_FILES.resolve('simple.py')
+        cwd = os.path.dirname(filename)
+        self.run_test_prefetch_locals(DebugInfo(filename=filename, cwd=cwd))
+
+    def run_test_prefetch_locals(self, debug_info):
+        bp_line = 3
+        breakpoints = [{
+            'source': {
+                'path': debug_info.filename
+            },
+            'breakpoints': [{
+                'line': bp_line
+            }]
+        }]
+        options = {'debugOptions': ['PrefetchLocals']}
+
+        with self.start_debugging(debug_info) as dbg:
+            session = dbg.session
+            with session.wait_for_event('stopped') as result:
+                (_, req_launch_attach, _, _, _, _,
+                 ) = lifecycle_handshake(session, debug_info.starttype,
+                                         options=options,
+                                         breakpoints=breakpoints)
+                req_launch_attach.wait()
+            tid = result['msg'].body['threadId']
+
+            req_stacktrace = session.send_request(
+                'stackTrace',
+                threadId=tid,
+            )
+            req_stacktrace.wait()
+            frame_id = req_stacktrace.resp.body['stackFrames'][0]['id']
+            req_scopes = session.send_request('scopes', frameId=frame_id)
+            req_scopes.wait()
+            scopes = req_scopes.resp.body['scopes']
+            req_variables = session.send_request(
+                'variables',
+                variablesReference=scopes[0]['variablesReference'],
+            )
+            req_variables.wait()
+            variables = req_variables.resp.body['variables']
+
+            req_stats = session.send_request('ptvsd_stats')
+            req_stats.wait()
+            stats = req_stats.resp.body
+
+            session.send_request('continue', threadId=tid)
+
+        var_a = next(v for v in variables if v['name'] == 'a')
+        self.assertEqual(var_a['value'], '1')
+        # The locals came with the "stopped" event.
+        self.assertEqual(stats['variables']['hits'], 1)
+        self.assertEqual(stats['variables']['misses'], 0)
+        commands = stats.get('pydevdRequests', {}).get('commands', {})
+        self.assertNotIn('CMD_GET_FRAME', commands)
+        self.assertNotIn('CMD_GET_VARIABLE_BATCH', commands)
+
+    def test_watch_prefetch(self):
+        filename = TEST_FILES.resolve('loop.py')
+        cwd = os.path.dirname(filename)
+        self.run_test_watch_prefetch(DebugInfo(filename=filename, cwd=cwd))
+
+    def run_test_watch_prefetch(self, debug_info):
+        bp_line = 2
+        breakpoints = [{
+            'source': {
+                'path': debug_info.filename
+            },
+            'breakpoints': [{
+                'line': bp_line
+            }]
+        }]
+
+        def evaluate_watch(session, tid):
+            req_stacktrace = session.send_request(
+                'stackTrace',
+                threadId=tid,
+            )
+            req_stacktrace.wait()
+            frame_id = req_stacktrace.resp.body['stackFrames'][0]['id']
+            session.send_request('scopes', frameId=frame_id).wait()
+            results = []
+            # Only the first one has no side effects, so only it is
+            # fetched with the scopes.
+            for expr in ['i', 'i * 10']:
+                req_evaluate = session.send_request(
+                    'evaluate',
+                    expression=expr,
+                    frameId=frame_id,
+                    context='watch',
+                )
+                req_evaluate.wait()
+                results.append(req_evaluate.resp.body['result'])
+            return results
+
+        with self.start_debugging(debug_info) as dbg:
+            session = dbg.session
+            with session.wait_for_event('stopped') as result:
+                (_, req_launch_attach, _, _, _, _,
+                 ) = lifecycle_handshake(session, debug_info.starttype,
+                                         breakpoints=breakpoints)
+                req_launch_attach.wait()
+            tid = result['msg'].body['threadId']
+            first = evaluate_watch(session, tid)
+
+            with session.wait_for_event('stopped') as result:
+                session.send_request('continue', threadId=tid)
+            tid = result['msg'].body['threadId']
+            # It is fetched with the scopes this time.
+            second = evaluate_watch(session, tid)
+
+            req_stats = session.send_request('ptvsd_stats')
+            req_stats.wait()
+            stats = req_stats.resp.body['variables']
+
+            session.send_request('continue', threadId=tid)
+
+        self.assertEqual(first, ['0', '0'])
+        self.assertEqual(second, ['1', '10'])
+        self.assertEqual(stats['hits'], 1)
+
+    def test_hover_cache(self):
+        filename = TEST_FILES.resolve('simple.py')
+        cwd = os.path.dirname(filename)
+        self.run_test_hover_cache(DebugInfo(filename=filename, cwd=cwd))
+
+    def run_test_hover_cache(self, debug_info):
+        bp_line = 3
+        breakpoints = [{
+            'source': {
+                'path': debug_info.filename
+            },
+            'breakpoints': [{
+                'line': bp_line
+            }]
+        }]
+
+        with self.start_debugging(debug_info) as dbg:
+            session = dbg.session
+            with session.wait_for_event('stopped') as result:
+                (_, req_launch_attach, _, _, _, _,
+                 ) = lifecycle_handshake(session, debug_info.starttype,
+                                         breakpoints=breakpoints)
+                req_launch_attach.wait()
+            tid = result['msg'].body['threadId']
+
+            req_stacktrace = session.send_request(
+                'stackTrace',
+                threadId=tid,
+            )
+            req_stacktrace.wait()
+            frame_id = req_stacktrace.resp.body['stackFrames'][0]['id']
+            req_scopes = session.send_request('scopes', frameId=frame_id)
+            req_scopes.wait()
+            variables_reference = \
+                req_scopes.resp.body['scopes'][0]['variablesReference']
+
+            def hover(expression):
+                req_evaluate = session.send_request(
+                    'evaluate',
+                    expression=expression,
+                    frameId=frame_id,
+                    context='hover',
+                )
+                req_evaluate.wait()
+                return req_evaluate.resp.body['result']
+
+            hovered = [hover('a'), hover('a'), hover('b.keys'), hover('a')]
+            session.send_request(
+                'setVariable',
+                variablesReference=variables_reference,
+                name='a',
+                value='5',
+            ).wait()
+            hovered.append(hover('a'))
+            # Only names and attribute chains are cached.
+            hovered.append(hover('a + 1'))
+
+            req_stats = session.send_request('ptvsd_stats')
+            req_stats.wait()
+            stats = req_stats.resp.body['variables']
+
+            session.send_request('continue', threadId=tid)
+
+        self.assertEqual(hovered[:2], ['1', '1'])
+        self.assertIn('keys', hovered[2])
+        self.assertEqual(hovered[3:], ['1', '5', '6'])
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 3)
+
+    def test_lazy_variables(self):
+        filename = TEST_FILES.resolve('slow_repr.py')
+        cwd = os.path.dirname(filename)
+        self.run_test_lazy_variables(DebugInfo(filename=filename, cwd=cwd))
+
+    def run_test_lazy_variables(self, debug_info):
+        bp_line = 14
+        breakpoints = [{
+            'source': {
+                'path': debug_info.filename
+            },
+            'breakpoints': [{
+                'line': bp_line
+            }]
+        }]
+
+        with self.start_debugging(debug_info) as dbg:
+            session = dbg.session
+            with session.wait_for_event('stopped') as result:
+                (_, req_launch_attach, _, _, _, _,
+                 ) = lifecycle_handshake(session, debug_info.starttype,
+                                         breakpoints=breakpoints)
+                req_launch_attach.wait()
+            tid = result['msg'].body['threadId']
+
+            req_stacktrace = session.send_request(
+                'stackTrace',
+                threadId=tid,
+            )
+            req_stacktrace.wait()
+            frame_id = req_stacktrace.resp.body['stackFrames'][0]['id']
+            req_scopes = session.send_request('scopes', frameId=frame_id)
+            req_scopes.wait()
+            variables_reference = \
+                req_scopes.resp.body['scopes'][0]['variablesReference']
+            req_variables = session.send_request(
+                'variables',
+                variablesReference=variables_reference,
+            )
+            req_variables.wait()
+            variables = dict((v['name'], v)
+                             for v in req_variables.resp.body['variables'])
+            req_lazy = session.send_request(
+                'variables',
+                variablesReference=variables['b']['variablesReference'],
+            )
+            req_lazy.wait()
+
+            session.send_request('continue', threadId=tid)
+
+        # The values of a type that took too long are loaded on demand.
+        self.assertIn('slow', variables['a']['value'])
+        self.assertNotIn('presentationHint', variables['a'])
+        self.assertEqual(variables['b']['presentationHint'], {'lazy': True})
+        self.assertEqual(variables['c']['value'], '1')
+        lazy = req_lazy.resp.body['variables']
+        self.assertEqual(len(lazy), 1)
+        self.assertEqual(lazy[0]['name'], 'b')
+        self.assertIn('slow', lazy[0]['value'])
+        self.assertEqual(lazy[0]['evaluateName'], 'b')
+
+    @unittest.skipIf(np is None, 'could not import numpy')
+    def test_table_window(self):
+        filename = TEST_FILES.resolve('table.py')
+        cwd = os.path.dirname(filename)
+        self.run_test_table_window(DebugInfo(filename=filename, cwd=cwd))
+
+    def run_test_table_window(self, debug_info):
+        bp_line = 3
+        breakpoints = [{
+            'source': {
+                'path': debug_info.filename
+            },
+            'breakpoints': [{
+                'line': bp_line
+            }]
+        }]
+
+        with self.start_debugging(debug_info) as dbg:
+            session = dbg.session
+            with session.wait_for_event('stopped') as result:
+                (_, req_launch_attach, _, _, _, _,
+                 ) = lifecycle_handshake(session, debug_info.starttype,
+                                         breakpoints=breakpoints)
+                req_launch_attach.wait()
+            tid = result['msg'].body['threadId']
+
+            req_stacktrace = session.send_request(
+                'stackTrace',
+                threadId=tid,
+            )
+            req_stacktrace.wait()
+            frame_id = req_stacktrace.resp.body['stackFrames'][0]['id']
+
+            req_window = session.send_request(
+                'ptvsd_tableWindow',
+                frameId=frame_id,
+                expression='a',
+                startRow=1,
+                rowCount=1,
+                startColumn=2,
+                stats=True,
+            )
+            req_window.wait()
+            req_error = session.send_request(
+                'ptvsd_tableWindow',
+                frameId=frame_id,
+                expression='b',
+            )
+            req_error.wait()
+
+            session.send_request('continue', threadId=tid)
+
+        window = req_window.resp.body
+        self.assertEqual(window['rows'], 3)
+        self.assertEqual(window['columns'], 4)
+        self.assertEqual(window['rowLabels'], ['1'])
+        self.assertEqual(window['cells'], [['9.0', '10.5']])
+        self.assertEqual(
+            [header['stats']['max'] for header in window['columnHeaders']],
+            [15.0, 16.5])
+        self.assertFalse(req_error.resp.success)
+        self.assertIn('NameError', req_error.resp.message)
+
     def test_variable_sorting(self):
         filename = TEST_FILES.resolve('for_sorting.py')
         cwd = os.path.dirname(filename)